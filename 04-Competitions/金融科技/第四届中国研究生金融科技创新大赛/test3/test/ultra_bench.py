@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ultra_server.py 并发压测
+
+用 asyncio 在本机模拟多个保持连接的客户端，按权重混合调用全部接口（GET/POST），
+逐级提高并发数，统计每一级的吞吐量、延迟分位数和错误率（整体和按接口）。
+结果可保存为基线 JSON，修改服务方式（线程池大小、压缩、快照等）后再跑一次与基线对比。
+
+- 默认在空闲端口上启动 ultra_server.py 子进程（--server-args 传 --data 等参数），压测完停止；
+  --url 压测已经在运行的服务器
+- 只用标准库：客户端自己实现 HTTP/1.1（保持连接、Content-Length 和分块响应）
+- 请求组合默认为 DEFAULT_MIX，--mix 指定 JSON 文件：
+  [{"method": "GET", "path": "/stats", "weight": 5},
+   {"method": "POST", "path": "/api/v1/carbon/valuation", "body": {"type": "cer"}}]
+- 压测客户端本身也在一个 Python 进程里，client_cpu_percent 接近 100 时瓶颈可能在客户端
+
+用法：
+    python ultra_bench.py --concurrency 1 8 32 64 --duration 10 --save .cache/bench/baseline.json
+    python ultra_bench.py --server-args "--data .cache/snapshots" --compare .cache/bench/baseline.json
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import os
+import platform
+import random
+import shlex
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from urllib.parse import quote, urlparse
+
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ultra_server.py')
+DEFAULT_CONCURRENCY = (1, 4, 16, 64)
+DEFAULT_DURATION = 5  # 每一级并发的压测时长（秒）
+DEFAULT_WARMUP = 1  # 每一级开始计时前的预热时长（秒），不计入结果
+DEFAULT_TIMEOUT = 10  # 单个请求的超时（秒），超时计为错误
+STARTUP_TIMEOUT = 60  # 等待子进程服务器就绪的最长时间（秒），载入大规模快照时较慢
+
+ESG_ITEM = {"company_id": 3, "environmental_score": 80, "social_score": 75, "governance_score": 85}
+CARBON_ITEM = {"type": "ccer", "amount": 10000, "project_years": 10}
+
+# 默认请求组合：覆盖全部路由，权重大致按前端页面的调用频率
+DEFAULT_MIX = [
+    {"method": "GET", "path": "/", "weight": 1},
+    {"method": "GET", "path": "/health", "weight": 4},
+    {"method": "GET", "path": "/stats", "weight": 10},
+    {"method": "GET", "path": "/api/v1/companies?page=1&page_size=50", "weight": 10},
+    {"method": "GET", "path": "/api/v1/companies?page=2&page_size=20&industry=新能源", "weight": 4},
+    {"method": "GET", "path": "/api/v1/companies/3", "weight": 8},
+    {"method": "GET", "path": "/api/v1/blockchain/transactions?page=1&page_size=100", "weight": 8},
+    {"method": "GET", "path": "/api/v1/blockchain/transactions?page_size=50&status=confirmed", "weight": 3},
+    {"method": "GET", "path": "/api/v1/carbon-assets?page=1&page_size=100", "weight": 4},
+    {"method": "GET", "path": "/api/v1/esg/history?limit=10", "weight": 4},
+    {"method": "GET", "path": "/api/system/status", "weight": 3},
+    {"method": "GET", "path": "/metrics", "weight": 1},
+    {"method": "GET", "path": "/api/system/metrics?period=5m", "weight": 2},
+    {"method": "GET", "path": "/api/system/alerts", "weight": 2},
+    {"method": "POST", "path": "/api/v1/esg/evaluate", "body": ESG_ITEM, "weight": 8},
+    {"method": "POST", "path": "/api/v1/carbon/valuation", "body": CARBON_ITEM, "weight": 6},
+    {"method": "POST", "path": "/api/v1/esg/evaluate:batch", "body": [ESG_ITEM] * 100, "weight": 1},
+    {"method": "POST", "path": "/api/v1/carbon/valuation:batch", "body": [CARBON_ITEM] * 100, "weight": 1},
+    {"method": "POST", "path": "/api/v1/cache/invalidate", "body": {"dataset": "stats"}, "weight": 1},
+]
+
+class Request:
+    """请求组合中的一项：编码好的请求报文，name 用于按接口汇总"""
+
+    def __init__(self, method, path, body=None, weight=1, host='localhost', accept_encoding=''):
+        self.method = method.upper()
+        self.path = path
+        self.weight = weight
+        self.name = f"{self.method} {path.split('?')[0]}"
+
+        target = quote(path, safe="/?=&:,%")
+        payload = json.dumps(body, ensure_ascii=False).encode('utf-8') if body is not None else b''
+        lines = [f"{self.method} {target} HTTP/1.1", f"Host: {host}"]
+        if accept_encoding:
+            lines.append(f"Accept-Encoding: {accept_encoding}")
+        if self.method == 'POST':
+            lines += ["Content-Type: application/json", f"Content-Length: {len(payload)}"]
+        self.raw = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + payload
+
+class Connection:
+    """保持连接的 HTTP/1.1 客户端连接，断开后下次请求时自动重连"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, raw):
+        """发送编码好的请求，读完整个响应，返回 (状态码, 响应体字节数)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(raw)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("服务器关闭了连接")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        size = 0
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                chunk = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(chunk + 2)
+                if chunk == 0:
+                    break
+                size += chunk
+        elif 'content-length' in headers:
+            size = int(headers['content-length'])
+            await self.reader.readexactly(size)
+
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, size
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+class LevelStats:
+    """一级并发的结果：每个接口的延迟列表、状态码分布和错误数"""
+
+    def __init__(self):
+        self.latencies = {}  # 接口 -> [秒]
+        self.statuses = {}
+        self.errors = {}  # 接口 -> 错误数（状态码 >= 400、超时、连接错误）
+        self.bytes = 0
+
+    def observe(self, name, seconds, status, size):
+        self.latencies.setdefault(name, []).append(seconds)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.bytes += size
+        if status >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def fail(self, name, reason):
+        self.statuses[reason] = self.statuses.get(reason, 0) + 1
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+def summarize(latencies, errors, seconds):
+    """请求数、吞吐量、错误率和延迟分位数（毫秒）"""
+    latencies = sorted(latencies)
+    count = len(latencies) + errors
+
+    def percentile(q):
+        return round(latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000, 3)
+
+    result = {
+        "requests": count,
+        "errors": errors,
+        "error_rate": round(errors / count, 4) if count else 0.0,
+        "requests_per_second": round(count / seconds, 1),
+    }
+    if latencies:
+        result["latency_ms"] = {
+            "avg": round(sum(latencies) / len(latencies) * 1000, 3),
+            "p50": percentile(0.50),
+            "p90": percentile(0.90),
+            "p95": percentile(0.95),
+            "p99": percentile(0.99),
+            "max": round(latencies[-1] * 1000, 3),
+        }
+    return result
+
+async def run_level(host, port, mix, concurrency, duration, warmup, timeout, seed):
+    """concurrency 个客户端同时按权重随机发请求，预热 warmup 秒后统计 duration 秒"""
+    cumulative = []
+    total = 0
+    for request in mix:
+        total += request.weight
+        cumulative.append(total)
+
+    stats = LevelStats()
+    started = time.perf_counter()
+    measure_from = started + warmup
+    deadline = measure_from + duration
+
+    async def client(index):
+        rng = random.Random(seed * 100003 + index)  # 同一种子每次发送的请求序列相同
+        conn = Connection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                request = mix[bisect.bisect_right(cumulative, rng.random() * total)]
+                start = time.perf_counter()
+                try:
+                    status, size = await asyncio.wait_for(conn.request(request.raw), timeout)
+                except asyncio.TimeoutError:
+                    result = 'timeout'
+                except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                    result = 'connection_error'
+                else:
+                    result = None
+                end = time.perf_counter()
+                if result is not None:
+                    conn.close()  # 出错后连接状态未知，重新建立
+                if end < measure_from:
+                    continue
+                if result is None:
+                    stats.observe(request.name, end - start, status, size)
+                else:
+                    stats.fail(request.name, result)
+        finally:
+            conn.close()
+
+    cpu_start = time.process_time()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - measure_from
+    cpu = time.process_time() - cpu_start
+
+    all_latencies = [s for values in stats.latencies.values() for s in values]
+    result = {"concurrency": concurrency, "duration": round(elapsed, 3)}
+    result.update(summarize(all_latencies, sum(stats.errors.values()), elapsed))
+    result["bytes_per_second"] = round(stats.bytes / elapsed)
+    result["statuses"] = {str(k): v for k, v in sorted(stats.statuses.items(), key=str)}
+    result["client_cpu_percent"] = round(cpu / (time.perf_counter() - started) * 100, 1)
+    result["routes"] = {
+        request.name: summarize(stats.latencies.get(request.name, []),
+                                stats.errors.get(request.name, 0), elapsed)
+        for request in mix
+    }
+    return result
+
+def load_mix(path, host, accept_encoding):
+    """读取并检查请求组合，返回 (原始条目, [Request])；格式不对时抛出 ValueError"""
+    entries = DEFAULT_MIX
+    if path:
+        with open(path, encoding='utf-8') as f:
+            entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError("请求组合应为 JSON 数组")
+
+    mix = []
+    for i, e in enumerate(entries):
+        if not isinstance(e, dict) or not isinstance(e.get('path'), str) or not e['path'].startswith('/'):
+            raise ValueError(f"第 {i + 1} 项应为带 path（以 / 开头）的对象")
+        if str(e.get('method', '')).upper() not in ('GET', 'POST'):
+            raise ValueError(f"第 {i + 1} 项的 method 应为 GET 或 POST")
+        weight = e.get('weight', 1)
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or weight < 0:
+            raise ValueError(f"第 {i + 1} 项的 weight 应为非负数")
+        if weight > 0:
+            mix.append(Request(e['method'], e['path'], e.get('body'), weight, host, accept_encoding))
+    if not mix:
+        raise ValueError("请求组合为空")
+    return entries, mix
+
+def uncovered_routes(mix):
+    """ultra_server.py 中没有被请求组合覆盖的路由（提示用）"""
+    sys.path.insert(0, os.path.dirname(SERVER_SCRIPT))
+    from ultra_server import ROUTES
+
+    covered = set()
+    for request in mix:
+        routes, _ = ROUTES.match(request.path.split('?')[0])
+        if routes and request.method in routes:
+            covered.add(id(routes[request.method]))
+    return [f"{r.method} {r.pattern}" for r in ROUTES.routes() if id(r) not in covered]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(port, server_args):
+    """启动 ultra_server.py 子进程，/health 返回 200 后返回进程"""
+    # 服务器每个请求都往 stderr 写一行日志，写入管道不读取会在缓冲区写满后卡住，所以写到临时文件
+    log = tempfile.TemporaryFile()
+    proc = subprocess.Popen([sys.executable, SERVER_SCRIPT, '--port', str(port)] + server_args,
+                            cwd=os.path.dirname(SERVER_SCRIPT),
+                            stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            log.seek(0)
+            raise RuntimeError("ultra_server.py 启动失败:\n" + log.read().decode('utf-8', 'replace'))
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1) as sock:
+                sock.sendall(b"GET /health HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+                if sock.recv(12).startswith(b'HTTP/1.1 200'):
+                    return proc
+        except OSError:
+            pass
+        time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError(f"ultra_server.py 在 {STARTUP_TIMEOUT} 秒内没有就绪")
+
+def stop_server(proc):
+    # SIGTERM 触发服务器的优雅停止
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+def print_levels(levels, per_route=False):
+    print(f"{'并发':>6} {'请求数':>8} {'req/s':>9} {'avg':>8} {'p50':>8} {'p95':>8} "
+          f"{'p99':>8} {'max':>9} {'错误率':>7} {'客户端CPU':>9}")
+    for level in levels:
+        latency = level.get("latency_ms", {})
+        print(f"{level['concurrency']:>6} {level['requests']:>8} {level['requests_per_second']:>9} "
+              f"{latency.get('avg', '-'):>8} {latency.get('p50', '-'):>8} {latency.get('p95', '-'):>8} "
+              f"{latency.get('p99', '-'):>8} {latency.get('max', '-'):>9} "
+              f"{level['error_rate']:>7.2%} {level['client_cpu_percent']:>8}%")
+        if per_route:
+            for name, route in level["routes"].items():
+                latency = route.get("latency_ms", {})
+                print(f"{'':>6} {route['requests']:>8} {route['requests_per_second']:>9} "
+                      f"{latency.get('avg', '-'):>8} {latency.get('p50', '-'):>8} "
+                      f"{latency.get('p95', '-'):>8} {latency.get('p99', '-'):>8} "
+                      f"{latency.get('max', '-'):>9} {route['error_rate']:>7.2%}  {name}")
+
+def print_comparison(baseline, levels):
+    """与基线按并发数逐级对比吞吐量和延迟（变化百分比，延迟为负表示变快）"""
+    def change(new, old):
+        return f"{(new - old) / old:+.1%}" if old else "-"
+
+    old_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    if not any(level["concurrency"] in old_levels for level in levels):
+        print(f"\n基线中没有相同的并发数（基线为 {' '.join(map(str, old_levels))}），无法对比")
+        return
+    label = " ".join(filter(None, [baseline.get('created'), baseline.get('label')]))
+    print(f"\n与基线对比（{label}）:")
+    print(f"{'并发':>6} {'req/s':>18} {'p50':>18} {'p99':>18} {'错误率':>16}")
+    for level in levels:
+        old = old_levels.get(level["concurrency"])
+        if old is None:
+            continue
+        new_latency, old_latency = level.get("latency_ms", {}), old.get("latency_ms", {})
+        columns = [f"{level['requests_per_second']} ({change(level['requests_per_second'], old['requests_per_second'])})"]
+        for q in ("p50", "p99"):
+            if q in new_latency and q in old_latency:
+                columns.append(f"{new_latency[q]} ({change(new_latency[q], old_latency[q])})")
+            else:
+                columns.append("-")
+        columns.append(f"{level['error_rate']:.2%} ({old['error_rate']:.2%})")
+        print(f"{level['concurrency']:>6} " + " ".join(f"{c:>18}" for c in columns[:3]) + f" {columns[3]:>16}")
+
+def main():
+    parser = argparse.ArgumentParser(description="ultra_server.py 并发压测")
+    parser.add_argument('--url', help="压测已在运行的服务器，如 http://localhost:8018（不传时自动启动）")
+    parser.add_argument('--server-args', default='',
+                        help='自动启动服务器时传给 ultra_server.py 的参数，如 "--data .cache/snapshots"')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=list(DEFAULT_CONCURRENCY),
+                        help=f"逐级压测的并发连接数（默认 {' '.join(map(str, DEFAULT_CONCURRENCY))}）")
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION,
+                        help=f"每一级的压测时长，秒（默认 {DEFAULT_DURATION}）")
+    parser.add_argument('--warmup', type=float, default=DEFAULT_WARMUP,
+                        help=f"每一级的预热时长，秒（默认 {DEFAULT_WARMUP}）")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT,
+                        help=f"单个请求的超时，秒（默认 {DEFAULT_TIMEOUT}）")
+    parser.add_argument('--mix', help="请求组合 JSON 文件（默认覆盖全部路由的内置组合）")
+    parser.add_argument('--accept-encoding', default='gzip',
+                        help="请求带的 Accept-Encoding（默认 gzip，传空字符串不压缩）")
+    parser.add_argument('--seed', type=int, default=42, help="请求序列的随机种子（默认 42）")
+    parser.add_argument('--label', default='', help="写入结果的说明，如 \"MAX_WORKERS=64\"")
+    parser.add_argument('--save', metavar='FILE', help="把结果保存为基线 JSON")
+    parser.add_argument('--compare', metavar='FILE', help="与之前保存的基线 JSON 对比")
+    parser.add_argument('--per-route', action='store_true', help="同时输出每个接口的结果")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    if args.url:
+        url = urlparse(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = '127.0.0.1', None
+
+    # 先检查请求组合再启动服务器，出错时不会留下子进程
+    try:
+        entries, mix = load_mix(args.mix, host, args.accept_encoding)
+    except (OSError, ValueError) as e:
+        parser.error(f"请求组合无效: {e}")
+    missing = uncovered_routes(mix)
+    if missing:
+        print("提示：以下路由不在请求组合中: " + ", ".join(missing))
+
+    proc = None
+    if port is None:
+        port = free_port()
+        proc = start_server(port, shlex.split(args.server_args))
+
+    levels = []
+    loop = asyncio.new_event_loop()
+    try:
+        for concurrency in args.concurrency:
+            print(f"并发 {concurrency}: 预热 {args.warmup}s，压测 {args.duration}s ...", flush=True)
+            levels.append(loop.run_until_complete(
+                run_level(host, port, mix, concurrency, args.duration, args.warmup, args.timeout, args.seed)))
+    finally:
+        loop.close()
+        if proc is not None:
+            stop_server(proc)
+
+    print()
+    print_levels(levels, args.per_route)
+    if baseline is not None:
+        print_comparison(baseline, levels)
+
+    if args.save:
+        result = {
+            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "label": args.label,
+            "target": args.url or f"ultra_server.py {args.server_args}".strip(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "accept_encoding": args.accept_encoding,
+            "seed": args.seed,
+            "mix": entries,
+            "levels": levels,
+        }
+        if os.path.dirname(args.save):
+            os.makedirs(os.path.dirname(args.save), exist_ok=True)
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存到 {args.save}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,528 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+可复现的大规模数据生成与快照
+
+用固定种子的 NumPy 向量化生成企业、区块链交易、碳资产和 ESG 评价历史（10^3 ~ 10^7 行），
+按列写入快照，ultra_server.py --data 启动时以内存映射方式打开：
+请求只读取需要的那一页，并且只在返回时才把这几行转换成 JSON 对象。
+
+- 列只存数字和类别编码（名称、日期、哈希等在转换时拼出），10^7 行的表也只有几百 MB
+- 安装 pyarrow 时写 Arrow IPC 文件（<表名>.arrow，零拷贝映射，也可直接用 pandas/DuckDB 读取），
+  否则每列一个 .npy 文件（<表名>/<列名>.npy）
+- 区块链交易另外导入快照目录下的 blockchain.db（SQLite，带时间/类型/状态索引）
+
+用法：
+    python ultra_data.py --scale 1000000 --seed 42
+    python ultra_server.py --data .cache/snapshots
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # pyarrow 为可选依赖：未安装时快照存为 .npy
+    pa = None
+
+SNAPSHOT_VERSION = 1
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'snapshots')
+DEFAULT_SEED = 42
+# 生成数据的"当前时间"，固定下来保证同一种子每次生成的数据完全相同
+REFERENCE_TIME = np.datetime64('2025-09-01T00:00:00', 's')
+REFERENCE_DAY = REFERENCE_TIME.astype('datetime64[D]')
+TABLES = ('companies', 'transactions', 'carbon_assets', 'esg_history')
+
+# ==================== 取值表 ====================
+
+INDUSTRIES = ["环保技术", "新能源", "制造业", "金融业", "农业科技", "建筑工程",
+              "信息技术", "新能源汽车", "咨询服务", "生物医药", "金融科技", "化工材料"]
+INDUSTRY_BASE_SCORES = [68, 71, 58, 63, 61, 55, 64, 69, 62, 66, 67, 52]
+NAME_PREFIXES = ["中", "华", "国", "民", "天", "地", "东", "南", "西", "北", "上", "海"]
+NAME_MIDDLES = ["华", "创", "绿", "清", "新", "智"]
+NAME_SUFFIXES = ["科技", "集团", "控股", "股份", "有限", "投资", "发展", "建设", "能源"]
+CITIES = ["北京", "上海", "深圳", "广州", "杭州", "南京", "武汉", "成都", "西安", "重庆"]
+CITY_SUFFIXES = ["市", "区"]
+CONTACTS = ["张经理", "李总", "王主任"]
+
+TRANSACTION_TYPES = ["ESG评价记录", "碳资产交易", "企业信息更新", "数据验证", "智能合约执行",
+                     "碳信用发行", "资产抵押", "数据共享授权", "审计记录", "合规检查"]
+TX_ESG, TX_CARBON = 0, 1
+ASSET_TYPES = ["CER", "CCER", "VER", "GCER"]
+TRADE_LOCATIONS = ["内蒙古", "新疆", "江苏", "广东", "四川"]
+
+PROJECT_TYPES = ["风力发电", "光伏发电", "林业碳汇", "甲烷回收", "生物质能", "水力发电", "地热能", "节能改造"]
+# 各碳信用标准可选的项目类型（PROJECT_TYPES 下标）、基准价格和数量范围，顺序同 ASSET_TYPES
+ASSET_PROJECTS = [[0, 1, 5, 6], [2, 1, 4, 3, 7], [2, 3, 7, 4], [0, 1, 2, 4]]
+ASSET_PRICES = [[58.9, 62.3, 55.7, 59.8], [45.2, 42.8, 48.6, 44.1],
+                [28.5, 32.1, 25.8, 30.7], [68.4, 72.1, 65.8, 70.3]]
+ASSET_AMOUNTS = [(15000, 85000), (8000, 60000), (3000, 35000), (5000, 45000)]
+PROVINCES = ["内蒙古", "新疆", "甘肃", "青海", "江苏", "广东", "四川", "云南"]
+ASSET_STATUSES = ["active", "pending", "expired"]
+METHODOLOGIES = ["AMS-I.D.", "AMS-III.D.", "ACM0002"]
+DEVELOPERS = ["中节能", "国电投", "华能", "大唐", "华电"]
+
+HISTORY_INDUSTRIES = ["环保技术", "新能源", "制造业", "金融业", "农业科技"]
+RISK_LEVELS = ["低", "中", "高"]
+# 评价等级：分数下限从低到高
+GRADE_BOUNDS = [60, 70, 80, 90]
+GRADES = ["C", "B", "B+", "A", "A+"]
+
+# ==================== 向量化生成 ====================
+
+def _rng(seed, table):
+    """每张表独立的随机数流：改变一张表的行数不影响其他表"""
+    return np.random.default_rng([seed, TABLES.index(table)])
+
+def _pick(rng, choices, n):
+    return rng.integers(0, len(choices), n, dtype=np.uint8)
+
+def generate_companies(n, seed=DEFAULT_SEED):
+    rng = _rng(seed, 'companies')
+    industry = _pick(rng, INDUSTRIES, n)
+    base = np.array(INDUSTRY_BASE_SCORES, dtype=np.int16)[industry]
+    capital = rng.integers(1000, 100001, n, dtype=np.int32)
+    green = np.isin(industry, [INDUSTRIES.index("新能源"), INDUSTRIES.index("环保技术")])
+    return {
+        "id": np.arange(1, n + 1, dtype=np.int32),
+        "prefix": _pick(rng, NAME_PREFIXES, n),
+        "middle": _pick(rng, NAME_MIDDLES, n),
+        "suffix": _pick(rng, NAME_SUFFIXES, n),
+        "registration_a": rng.integers(100000, 1000000, n, dtype=np.int32),
+        "registration_b": rng.integers(10000000, 100000000, n, dtype=np.int32),
+        "industry": industry,
+        "esg_score": np.clip(base + rng.integers(-15, 16, n, dtype=np.int16), 35, 92).astype(np.int8),
+        "established_years": rng.integers(3, 26, n, dtype=np.int16),
+        "capital": capital,
+        "employees": rng.integers(50, 5001, n, dtype=np.int32),
+        "is_active": (rng.random(n) < 0.75).astype(np.uint8),
+        "city": _pick(rng, CITIES, n),
+        "city_suffix": _pick(rng, CITY_SUFFIXES, n),
+        "last_evaluation_days": rng.integers(1, 121, n, dtype=np.int16),
+        "annual_revenue": capital * rng.uniform(0.5, 3.0, n) * 10000,
+        "carbon_assets": rng.integers(0, np.where(green, 51, 21), dtype=np.int16),
+        "contact": _pick(rng, CONTACTS, n),
+        "phone_a": rng.integers(3, 10, n, dtype=np.uint8),
+        "phone_b": rng.integers(100000000, 1000000000, n, dtype=np.int32),
+    }
+
+def generate_transactions(n, seed=DEFAULT_SEED):
+    """按时间顺序排列，id 从 1 开始递增（与 TransactionStore 的顺序一致）"""
+    rng = _rng(seed, 'transactions')
+    span = 60 * 24 * 3600  # 最近 60 天
+    seconds = np.sort(rng.integers(0, span, n, dtype=np.int64)) - span
+    tx_type = _pick(rng, TRANSACTION_TYPES, n)
+    trade = np.char.find(np.array(TRANSACTION_TYPES), "交易")[tx_type] >= 0
+    gas_used = rng.integers(21000, 150001, n, dtype=np.int64)
+    gas_price = rng.integers(10000000000, 50000000001, n, dtype=np.int64)
+    ids = np.arange(1, n + 1, dtype=np.int64)
+    return {
+        "id": ids,
+        "seconds": seconds,  # 相对 REFERENCE_TIME 的秒数
+        "type": tx_type,
+        "hash_hi": rng.integers(0, 2**64, n, dtype=np.uint64),
+        "hash_lo": rng.integers(0, 2**64, n, dtype=np.uint64),
+        "from_address": rng.integers(0, 2**64, n, dtype=np.uint64),
+        "to_address": rng.integers(0, 2**64, n, dtype=np.uint64),
+        "amount": np.where(trade, rng.integers(0, 1000001, n), 0).astype(np.int32),
+        "gas_used": gas_used,
+        "gas_price": gas_price,
+        "pending": (rng.random(n) < 0.08).astype(np.uint8),
+        # ESG评价记录 / 碳资产交易 的附加数据，其他类型不使用
+        "company_id": rng.integers(1, 501, n, dtype=np.int16),
+        "esg_score_x10": rng.integers(450, 851, n, dtype=np.int16),
+        "confidence_x100": rng.integers(75, 96, n, dtype=np.int8),
+        "asset_type": _pick(rng, ASSET_TYPES, n),
+        "quantity": rng.integers(100, 50001, n, dtype=np.int32),
+        "price_cents": rng.integers(2500, 12001, n, dtype=np.int32),
+        "trade_location": _pick(rng, TRADE_LOCATIONS, n),
+    }
+
+def generate_carbon_assets(n, seed=DEFAULT_SEED):
+    rng = _rng(seed, 'carbon_assets')
+    asset = _pick(rng, ASSET_TYPES, n)
+    counts = np.array([len(p) for p in ASSET_PROJECTS])
+    projects = np.full((len(ASSET_PROJECTS), counts.max()), -1, dtype=np.int8)
+    for i, choices in enumerate(ASSET_PROJECTS):
+        projects[i, :len(choices)] = choices
+    project = projects[asset, rng.integers(0, counts[asset])].astype(np.uint8)
+    base_price = np.array(ASSET_PRICES)[asset, rng.integers(0, 4, n)]
+    low, high = np.array(ASSET_AMOUNTS).T
+    amount = rng.integers(low[asset], high[asset] + 1).astype(np.int32)
+    price = np.round(base_price * (1 + rng.uniform(-0.15, 0.20, n)), 2)
+    return {
+        "id": np.arange(1, n + 1, dtype=np.int32),
+        "asset_type": asset,
+        "project_type": project,
+        "province": _pick(rng, PROVINCES, n),
+        "project_id": rng.integers(10000, 100000, n, dtype=np.int32),
+        "amount": amount,
+        "current_price": price,
+        "total_value": np.round(amount * price, 2),
+        "project_years": rng.integers(7, 26, n, dtype=np.int16),
+        "certified_days_ago": rng.integers(30, 365 * 5 + 1, n, dtype=np.int16),
+        "owner_id": rng.integers(1, 501, n, dtype=np.int16),
+        "status": _pick(rng, ASSET_STATUSES, n),
+        "methodology": _pick(rng, METHODOLOGIES, n),
+        "developer": _pick(rng, DEVELOPERS, n),
+    }
+
+def generate_esg_history(n, companies, seed=DEFAULT_SEED):
+    """按评价日期倒序排列，company_id 取自 1..companies"""
+    rng = _rng(seed, 'esg_history')
+    overall = rng.integers(420, 911, n, dtype=np.int16)
+    return {
+        "id": np.arange(1, n + 1, dtype=np.int32),
+        "days_ago": np.sort(rng.integers(0, 365 * 2 + 1, n, dtype=np.int16)),
+        "company_id": rng.integers(1, companies + 1, n, dtype=np.int32),
+        "industry": _pick(rng, HISTORY_INDUSTRIES, n),
+        "overall_x10": overall,
+        "grade": np.searchsorted(np.array(GRADE_BOUNDS) * 10, overall, side='right').astype(np.uint8),
+        "environmental_x10": rng.integers(600, 981, n, dtype=np.int16),
+        "social_x10": rng.integers(620, 961, n, dtype=np.int16),
+        "governance_x10": rng.integers(680, 991, n, dtype=np.int16),
+        "confidence_x100": rng.integers(75, 100, n, dtype=np.int8),
+        "risk": _pick(rng, RISK_LEVELS, n),
+    }
+
+# ==================== 转换成 JSON 对象 ====================
+
+def _days_before(days):
+    return np.datetime_as_string(REFERENCE_DAY - days.astype('timedelta64[D]')).tolist()
+
+def _lookup(choices, codes):
+    return np.array(choices, dtype=object)[codes].tolist()
+
+def render_companies(c):
+    ids = c["id"].tolist()
+    names = [f"{p}{m}{i:03d}{s}有限公司" for p, m, i, s in zip(
+        _lookup(NAME_PREFIXES, c["prefix"]), _lookup(NAME_MIDDLES, c["middle"]), ids,
+        _lookup(NAME_SUFFIXES, c["suffix"]))]
+    columns = zip(
+        ids, names, _lookup(INDUSTRIES, c["industry"]),
+        c["registration_a"].tolist(), c["registration_b"].tolist(), c["is_active"].tolist(),
+        _days_before(c["established_years"] * 365), c["capital"].tolist(), c["employees"].tolist(),
+        _lookup(CITIES, c["city"]), _lookup(CITY_SUFFIXES, c["city_suffix"]), c["esg_score"].tolist(),
+        _days_before(c["last_evaluation_days"]), c["annual_revenue"].tolist(), c["carbon_assets"].tolist(),
+        _lookup(CONTACTS, c["contact"]), c["phone_a"].tolist(), c["phone_b"].tolist())
+    return [{
+        "id": i,
+        "name": name,
+        "industry": industry,
+        "registration_code": f"91{reg_a}{reg_b}",
+        "is_active": bool(active),
+        "established_date": established,
+        "registered_capital": capital * 10000,
+        "employees": employees,
+        "location": city + city_suffix,
+        "esg_score": score,
+        "last_evaluation": last_evaluation,
+        "annual_revenue": revenue,
+        "carbon_assets": carbon,
+        "contact_person": contact,
+        "contact_phone": f"1{phone_a}{phone_b}"
+    } for (i, name, industry, reg_a, reg_b, active, established, capital, employees, city, city_suffix,
+           score, last_evaluation, revenue, carbon, contact, phone_a, phone_b) in columns]
+
+def render_transactions(c):
+    timestamps = np.datetime_as_string(REFERENCE_TIME + c["seconds"].astype('timedelta64[s]'))
+    rows = []
+    columns = zip(
+        c["id"].tolist(), timestamps.tolist(), c["type"].tolist(),
+        c["hash_hi"].tolist(), c["hash_lo"].tolist(), c["from_address"].tolist(), c["to_address"].tolist(),
+        c["amount"].tolist(), c["gas_used"].tolist(), c["gas_price"].tolist(), c["pending"].tolist(),
+        c["company_id"].tolist(), c["esg_score_x10"].tolist(), c["confidence_x100"].tolist(),
+        c["asset_type"].tolist(), c["quantity"].tolist(), c["price_cents"].tolist(), c["trade_location"].tolist())
+    for (i, timestamp, tx_type, hash_hi, hash_lo, from_address, to_address, amount, gas_used, gas_price,
+         pending, company_id, score, confidence, asset_type, quantity, price, location) in columns:
+        if tx_type == TX_ESG:
+            data = {"company_id": company_id, "esg_score": score / 10, "confidence_level": confidence / 100}
+        elif tx_type == TX_CARBON:
+            data = {"asset_type": ASSET_TYPES[asset_type], "quantity": quantity,
+                    "price_per_ton": price / 100, "project_location": TRADE_LOCATIONS[location]}
+        else:
+            data = {}
+        rows.append({
+            "id": i,
+            "transaction_hash": f"0x{hash_hi:016x}{hash_lo:016x}",
+            "block_number": 1000 + i,
+            "transaction_type": TRANSACTION_TYPES[tx_type],
+            "from_address": f"0x{from_address:016x}",
+            "to_address": f"0x{to_address:016x}",
+            "amount": amount,
+            "gas_used": gas_used,
+            "gas_price": gas_price,
+            "gas_fee": gas_used * gas_price,
+            "timestamp": timestamp + "Z",
+            "status": "pending" if pending else "confirmed",
+            "data": data
+        })
+    return rows
+
+def render_carbon_assets(c):
+    certified = REFERENCE_DAY - c["certified_days_ago"].astype('timedelta64[D]')
+    expiry = certified + (c["project_years"].astype(np.int32) * 365).astype('timedelta64[D]')
+    columns = zip(
+        c["id"].tolist(), _lookup(ASSET_TYPES, c["asset_type"]), _lookup(PROJECT_TYPES, c["project_type"]),
+        _lookup(PROVINCES, c["province"]), c["project_id"].tolist(), c["amount"].tolist(),
+        c["current_price"].tolist(), c["total_value"].tolist(), c["project_years"].tolist(),
+        np.datetime_as_string(certified).tolist(), np.datetime_as_string(expiry).tolist(),
+        c["owner_id"].tolist(), _lookup(ASSET_STATUSES, c["status"]),
+        _lookup(METHODOLOGIES, c["methodology"]), _lookup(DEVELOPERS, c["developer"]))
+    return [{
+        "id": i,
+        "asset_name": f"{project}减排量",
+        "project_name": f"{province}{project}项目{i:03d}",
+        "project_id": f"PRJ{project_id}",
+        "asset_type": asset_type,
+        "amount": amount,
+        "current_price": price,
+        "total_value": value,
+        "project_years": years,
+        "certification_date": certified_date,
+        "expiry_date": expiry_date,
+        "location": province,
+        "owner_id": owner,
+        "status": status,
+        "methodology": methodology,
+        "project_developer": developer
+    } for (i, asset_type, project, province, project_id, amount, price, value, years, certified_date,
+           expiry_date, owner, status, methodology, developer) in columns]
+
+def render_esg_history(c):
+    columns = zip(
+        c["id"].tolist(), c["company_id"].tolist(), _lookup(HISTORY_INDUSTRIES, c["industry"]),
+        _days_before(c["days_ago"]), c["overall_x10"].tolist(), c["environmental_x10"].tolist(),
+        c["social_x10"].tolist(), c["governance_x10"].tolist(), _lookup(GRADES, c["grade"]),
+        c["confidence_x100"].tolist(), _lookup(RISK_LEVELS, c["risk"]))
+    return [{
+        "id": i,
+        "company_id": company_id,
+        "company_name": f"企业{company_id:03d}",
+        "industry": industry,
+        "evaluation_date": evaluation_date,
+        "overall_score": overall / 10,
+        "environmental_score": environmental / 10,
+        "social_score": social / 10,
+        "governance_score": governance / 10,
+        "grade": grade,
+        "confidence_level": confidence / 100,
+        "risk_level": risk
+    } for (i, company_id, industry, evaluation_date, overall, environmental, social, governance,
+           grade, confidence, risk) in columns]
+
+RENDERERS = {
+    'companies': render_companies,
+    'transactions': render_transactions,
+    'carbon_assets': render_carbon_assets,
+    'esg_history': render_esg_history,
+}
+
+# ==================== 列式表 ====================
+
+class ColumnTable:
+    """按列存储的表（NumPy 数组或内存映射的快照），按下标/切片取行时才转换成 dict"""
+
+    def __init__(self, name, columns):
+        self.name = name
+        self.columns = columns
+        self._render = RENDERERS[name]
+        self._length = len(columns["id"])
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.rows(slice(*index.indices(self._length)))
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError(index)
+        return self.rows(slice(index, index + 1))[0]
+
+    def rows(self, selector):
+        """selector 为切片或下标数组"""
+        return self._render({name: column[selector] for name, column in self.columns.items()})
+
+    def take(self, indices):
+        return TableView(self, indices)
+
+    def sum(self, column):
+        return float(self.columns[column].sum())
+
+class TableView:
+    """ColumnTable 中按下标选出的行（如筛选结果），同样在切片时才转换"""
+
+    def __init__(self, table, indices):
+        self.table = table
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.table.rows(self.indices[index])
+        return self.table[int(self.indices[index])]
+
+class CompanyTable:
+    """快照中的企业数据，接口与 ultra_server.CompanyStore 相同（只读，不监视文件）"""
+
+    def __init__(self, table):
+        self.table = table
+        self.version = 1
+        self._filters = {}  # (行业, 所在地) -> TableView
+        # 所在地 = 城市 + 后缀，编码为 city * len(CITY_SUFFIXES) + city_suffix
+        self._locations = [city + suffix for city in CITIES for suffix in CITY_SUFFIXES]
+
+    def reload(self):
+        return False
+
+    def watch(self, interval=None):
+        pass
+
+    def all(self):
+        return self.table
+
+    def get(self, company_id):
+        # id 从 1 开始连续编号
+        if isinstance(company_id, int) and 1 <= company_id <= len(self.table):
+            return self.table[company_id - 1]
+        return None
+
+    def filter(self, industry=None, location=None):
+        """按行业和所在地筛选（所在地可以只写开头），同样的条件只计算一次"""
+        if not industry and not location:
+            return self.table
+        key = (industry, location)
+        if key not in self._filters:
+            columns = self.table.columns
+            mask = np.ones(len(self.table), dtype=bool)
+            if industry:
+                code = INDUSTRIES.index(industry) if industry in INDUSTRIES else -1
+                mask &= columns["industry"] == code
+            if location:
+                codes = [i for i, name in enumerate(self._locations) if name.startswith(location)]
+                mask &= np.isin(columns["city"].astype(np.int16) * len(CITY_SUFFIXES)
+                                + columns["city_suffix"], codes)
+            self._filters[key] = self.table.take(np.flatnonzero(mask))
+        return self._filters[key]
+
+    def industry_summary(self):
+        """[(行业, 企业数, 平均 ESG 分数)]，按企业数从多到少"""
+        columns = self.table.columns
+        counts = np.bincount(columns["industry"], minlength=len(INDUSTRIES))
+        totals = np.bincount(columns["industry"], weights=columns["esg_score"], minlength=len(INDUSTRIES))
+        summary = [(INDUSTRIES[i], int(counts[i]), float(totals[i] / counts[i]))
+                   for i in range(len(INDUSTRIES)) if counts[i]]
+        return sorted(summary, key=lambda item: -item[1])
+
+# ==================== 快照读写 ====================
+
+def generate(scale, seed=DEFAULT_SEED, companies=None, transactions=None, carbon_assets=None,
+             esg_history=None):
+    """生成四张表的列；各表行数默认为 scale（碳资产为 scale // 10）"""
+    companies = companies or scale
+    return {
+        'companies': generate_companies(companies, seed),
+        'transactions': generate_transactions(transactions or scale, seed),
+        'carbon_assets': generate_carbon_assets(carbon_assets or max(1, scale // 10), seed),
+        'esg_history': generate_esg_history(esg_history or scale, companies, seed),
+    }
+
+def save_snapshots(directory, tables, seed):
+    os.makedirs(directory, exist_ok=True)
+    for name, columns in tables.items():
+        if pa is not None:
+            # 整张表写成一个 record batch，读取时每列都能零拷贝映射成 NumPy 数组
+            table = pa.table(columns)
+            with pa.OSFile(os.path.join(directory, name + '.arrow'), 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table, max_chunksize=len(table) or None)
+        else:
+            os.makedirs(os.path.join(directory, name), exist_ok=True)
+            for column, values in columns.items():
+                np.save(os.path.join(directory, name, column + '.npy'), values)
+
+    meta = {
+        "version": SNAPSHOT_VERSION,
+        "seed": seed,
+        "reference_time": str(REFERENCE_TIME),
+        "format": "arrow" if pa is not None else "npy",
+        "tables": {name: len(columns["id"]) for name, columns in tables.items()},
+    }
+    with open(os.path.join(directory, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, indent=2)
+    return meta
+
+def load_snapshots(directory):
+    """内存映射打开快照，返回 (meta, {表名: ColumnTable})"""
+    with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"快照版本 {meta.get('version')} 与当前版本 {SNAPSHOT_VERSION} 不一致，请重新生成")
+
+    tables = {}
+    for name in meta["tables"]:
+        if meta["format"] == "arrow":
+            if pa is None:
+                raise RuntimeError("快照为 Arrow 格式，需要安装 pyarrow（pip install pyarrow）")
+            source = pa.memory_map(os.path.join(directory, name + '.arrow'), 'r')
+            table = pa.ipc.open_file(source).read_all()
+            columns = {column: table.column(column).chunk(0).to_numpy(zero_copy_only=True)
+                       for column in table.column_names}
+        else:
+            folder = os.path.join(directory, name)
+            columns = {file[:-4]: np.load(os.path.join(folder, file), mmap_mode='r')
+                       for file in sorted(os.listdir(folder)) if file.endswith('.npy')}
+        tables[name] = ColumnTable(name, columns)
+    return meta, tables
+
+def ledger_source(meta):
+    """交易账本的数据来源标识，ultra_server 据此确认账本与快照一致"""
+    return f"snapshot:v{meta['version']}:seed={meta['seed']}:rows={meta['tables']['transactions']}"
+
+def build_ledger(path, table, source, chunk=100000):
+    """把交易表导入 SQLite 账本（ultra_server.TransactionStore），全部导入后才记录数据来源"""
+    from ultra_server import TransactionStore
+
+    if os.path.exists(path):
+        os.remove(path)
+    store = TransactionStore(path, source)
+    for start in range(0, len(table), chunk):
+        store.insert(table[start:start + chunk])
+    store.mark_source()
+    return store
+
+def main():
+    parser = argparse.ArgumentParser(description="生成可复现的大规模数据快照")
+    parser.add_argument('--scale', type=int, default=100000, help="各表的默认行数（默认 100000，碳资产为 1/10）")
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help=f"随机种子（默认 {DEFAULT_SEED}）")
+    parser.add_argument('--companies', type=int, help="企业数量")
+    parser.add_argument('--transactions', type=int, help="区块链交易数量")
+    parser.add_argument('--carbon-assets', type=int, help="碳资产数量")
+    parser.add_argument('--esg-history', type=int, help="ESG 评价记录数量")
+    parser.add_argument('--output', default=DEFAULT_DIR, help="快照目录（默认 .cache/snapshots）")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    tables = generate(args.scale, args.seed, args.companies, args.transactions,
+                      args.carbon_assets, args.esg_history)
+    print(f"生成完成: {time.perf_counter() - started:.1f}s")
+
+    meta = save_snapshots(args.output, tables, args.seed)
+    print(f"快照已写入 {args.output}（{meta['format']}）: {meta['tables']}")
+
+    started = time.perf_counter()
+    _, loaded = load_snapshots(args.output)
+    build_ledger(os.path.join(args.output, 'blockchain.db'), loaded['transactions'], ledger_source(meta))
+    print(f"区块链账本已导入: {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -1,137 +1,1512 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import argparse
+import http.client
 import http.server
 import socketserver
+import bisect
+import collections
+import hashlib
+import io
 import json
+import os
+import re
+import shutil
+import signal
+import socket
+import sqlite3
+import sys
 import threading
 import time
 import webbrowser
 import random
+import zlib
 from datetime import datetime, timedelta
-from urllib.parse import urlparse
+from urllib.parse import parse_qs, unquote, urlparse
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖：未安装时批量接口逐条计算
+    np = None
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块
+    resource = None
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖：未安装时用标准库 json 编码
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli 为可选依赖：未安装时只支持 gzip 压缩
+    brotli = None
 
 PORT = 8018  # 使用8018端口
+CACHE_TTL = 300  # 生成的数据集和预编码响应的有效期（秒）
+MAX_CACHED_PAGES = 4096  # 缓存的响应条数上限（键由查询参数决定），超出时淘汰最久未使用的
+MAX_WORKERS = 32  # 同时处理的请求数上限，超出的请求排队等待；空闲的保持连接不占名额
+MAX_CONNECTIONS = 1024  # 同时打开的连接数上限，超出时新连接直接返回 503
+REQUEST_TIMEOUT = 15  # 读取请求/保持连接空闲的超时（秒），超时后关闭连接释放线程
+SHUTDOWN_GRACE = 10  # 停止服务时等待处理中请求完成的最长时间（秒）
+COMPANIES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'companies_data.json')
+RELOAD_INTERVAL = 2  # 检查企业数据文件是否修改的间隔（秒）
+# 区块链交易账本（SQLite），删除后下次请求时重新生成
+TRANSACTIONS_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'blockchain.db')
+
+BATCH_CHUNK = 512  # 批量接口每计算完这么多条就发送一次
+MAX_BATCH_ITEMS = 100000  # 单次批量请求的条数上限
+MAX_BATCH_BYTES = 64 * 1024 * 1024  # 批量请求体的字节数上限，超过时不读取请求体直接返回 413
+MAX_PAGE_SIZE = 1000  # 分页接口 page_size 的上限
+
+DATA_SEED = 42  # 生成示例数据的随机种子
+SAMPLE_LEDGER_VERSION = 2  # 示例交易的生成规则变化时递增，已有的账本会按新规则重新生成
+DATA_REFERENCE_TIME = datetime(2025, 9, 1)  # 生成示例数据时的"当前时间"，保证数据可复现
+MAX_CACHED_LIST_ITEMS = 100000  # 超过这么多条的列表（大规模快照）不缓存整个响应
+
+MIN_COMPRESS_SIZE = 1024  # 小于这个字节数的响应不压缩
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # 兼顾压缩率和速度，适合动态响应
+STREAM_MIN_ITEMS = 1000  # 未缓存的列表超过这么多条时边编码边分块发送
+STREAM_CHUNK = 256  # 分块发送列表时每块的条数
+
+# ESG 评分权重
+ESG_WEIGHTS = {'environmental': 0.35, 'social': 0.30, 'governance': 0.35}
+
+# 行业调整 (降低调整系数，使分数更现实)
+INDUSTRY_ADJUSTMENTS = {
+    '环保技术': 0.95, '新能源': 0.93, '制造业': 0.88, '金融业': 0.90,
+    '农业科技': 0.92, '建筑工程': 0.87, '信息技术': 0.91,
+    '新能源汽车': 0.94, '咨询服务': 0.90, '生物医药': 0.93
+}
+
+# 评价等级：(分数下限, 等级, 建议)，按分数从高到低
+ESG_GRADES = [
+    (90, "A+", "优秀表现，建议继续保持并发挥行业领导作用"),
+    (80, "A", "良好表现，建议在薄弱环节加强改进"),
+    (70, "B+", "中等偏上，建议重点改进环境和社会责任"),
+    (60, "B", "中等水平，需要全面提升ESG管理"),
+    (float('-inf'), "C", "需要立即改进ESG管理体系"),
+]
+
+# 碳资产基准价格（元/吨），未列出的类型按 40.0 计
+CARBON_BASE_PRICES = {'cer': 45.2, 'ccer': 35.8, 'ver': 25.5}
+
+# companies_data.json 加载失败时使用的示例数据
+SAMPLE_COMPANIES = [
+    {
+        "id": 1,
+        "name": "氢能源有限责任公司",
+        "industry": "新能源",
+        "registration_code": "91322872227500",
+        "is_active": True,
+        "established_date": "2015-01-11",
+        "registered_capital": 157390000,
+        "employees": 280,
+        "location": "武汉市洪山区",
+        "esg_score": 82,
+        "last_evaluation": "2025-07-19"
+    }
+]
+
+def dumps(data):
+    """编码为 UTF-8 JSON 字节；安装了 orjson 时用它编码（快数倍，输出不带多余空格）"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+# 支持的压缩方式，按优先级排列
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def choose_encoding(accept_encoding):
+    """按 Accept-Encoding（含 q 值）选择压缩方式，都不接受时返回 None"""
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # wbits=31：gzip 格式，头部不含时间戳，同样的内容压缩结果相同
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(body) + compressor.flush()
+
+class StreamCompressor:
+    """分块发送时的增量压缩：每块压缩后立即 flush，客户端收到一块就能解压一块"""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+class DataCache:
+    """生成数据集和预编码 JSON 响应的内存缓存
+
+    数据集按名称缓存并带版本号，过期或被 invalidate() 后重新生成；
+    响应按 (数据集, 版本, 参数) 缓存编码好的字节和 ETag，数据集更新后旧版本的响应自动失效，
+    翻页时不会混用新旧两份数据；响应的 gzip/br 压缩结果也按 ETag 缓存，只压缩一次。
+    响应的键由客户端参数决定，按 LRU 最多保留 max_pages 条，过期的响应在读写时清除。
+    """
+
+    def __init__(self, ttl=CACHE_TTL, max_pages=MAX_CACHED_PAGES):
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+        self._datasets = {}  # 名称 -> (版本, 过期时间, 数据)
+        self._pages = collections.OrderedDict()  # 键 -> (过期时间, 响应字节, ETag)，按最近使用排序
+        self._etags = collections.Counter()  # ETag -> 引用它的响应条数
+        self._variants = {}  # ETag -> {压缩方式: 压缩后的字节}
+        self._version = 0
+
+    def dataset(self, name, factory):
+        """返回 (版本, 数据)；不存在或已过期时调用 factory() 重新生成"""
+        now = time.time()
+        with self._lock:
+            entry = self._datasets.get(name)
+            if entry and entry[1] > now:
+                return entry[0], entry[2]
+
+        # 生成较慢，放在锁外；并发请求同时生成时以先写入的为准
+        data = factory()
+        with self._lock:
+            entry = self._datasets.get(name)
+            if entry and entry[1] > now:
+                return entry[0], entry[2]
+            self._version += 1
+            self._datasets[name] = (self._version, now + self.ttl, data)
+            self._drop_pages(name)
+            return self._version, data
+
+    def page(self, key, build):
+        """返回 (响应字节, ETag)；key 的第一项为数据集名称，build() 返回要编码的对象"""
+        cached = self.get_page(key)
+        if cached:
+            return cached
+        return self.put_page(key, dumps(build()))
+
+    def get_page(self, key):
+        """已缓存且未过期的 (响应字节, ETag)，没有时返回 None"""
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                self._remove_page(key)
+                return None
+            self._pages.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put_page(self, key, body):
+        """缓存编码好的响应，返回 (响应字节, ETag)"""
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        now = time.time()
+        with self._lock:
+            self._remove_page(key)
+            self._pages[key] = (now + self.ttl, body, etag)
+            self._etags[etag] += 1
+            # 从最久未使用的一端清除已过期的响应，再按条数上限淘汰
+            while self._pages:
+                oldest, entry = next(iter(self._pages.items()))
+                if entry[0] > now and len(self._pages) <= self.max_pages:
+                    break
+                self._remove_page(oldest)
+        return body, etag
+
+    def compressed(self, body, etag, encoding):
+        """缓存响应的压缩版本（同一 ETag 的同一压缩方式只压缩一次）"""
+        with self._lock:
+            data = self._variants.get(etag, {}).get(encoding)
+        if data is None:
+            data = compress(body, encoding)
+            with self._lock:
+                if etag in self._etags:
+                    self._variants.setdefault(etag, {})[encoding] = data
+        return data
+
+    def invalidate(self, name=None):
+        """清除指定数据集（None 表示全部）及其响应，返回被清除的数据集名称"""
+        with self._lock:
+            names = list(self._datasets) if name is None else [name]
+            for n in names:
+                self._datasets.pop(n, None)
+            if name is None:
+                self._pages.clear()
+                self._etags.clear()
+                self._variants.clear()
+            else:
+                self._drop_pages(name)
+            return names
+
+    def _drop_pages(self, name):
+        for key in [k for k in self._pages if k[0] == name]:
+            self._remove_page(key)
+
+    def _remove_page(self, key):
+        """删除一条响应；没有其他响应引用它的 ETag 时一并删除压缩版本"""
+        entry = self._pages.pop(key, None)
+        if entry is None:
+            return
+        etag = entry[2]
+        self._etags[etag] -= 1
+        if self._etags[etag] <= 0:
+            del self._etags[etag]
+            self._variants.pop(etag, None)
+
+CACHE = DataCache()
+
+# 可以通过 /api/v1/cache/invalidate 清除的数据集
+DATASETS = ('companies', 'blockchain', 'carbon_assets', 'esg_history', 'stats')
+
+class CompanyStore:
+    """企业数据：启动时加载一次并按 id/行业/所在地建立索引
+
+    后台线程每 RELOAD_INTERVAL 秒检查一次文件的 mtime，变化时重新加载并整体替换索引，
+    请求处理中只做内存查找，不读磁盘。
+    """
+
+    def __init__(self, path=COMPANIES_FILE):
+        self.path = path
+        self.version = 0
+        self._mtime = None
+        # (企业列表, id 索引, 行业索引, 所在地索引)，整体替换，读取时无需加锁
+        self._snapshot = ([], {}, {}, {})
+        self._reload_lock = threading.Lock()
+        self.reload()
+
+    def reload(self):
+        """文件 mtime 变化时重新加载，返回是否重新加载"""
+        with self._reload_lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                mtime = None
+            if self.version and mtime == self._mtime:
+                return False
+
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    companies = json.load(f)
+            except Exception as e:
+                print(f"加载真实企业数据失败: {e}")
+                if self.version:
+                    self._mtime = mtime  # 保留上一次成功加载的数据，文件再次修改时重试
+                    return False
+                # 如果加载失败，使用少量示例数据
+                companies = SAMPLE_COMPANIES
+
+            by_id, by_industry, by_location = {}, {}, {}
+            for company in companies:
+                by_id[company['id']] = company
+                by_industry.setdefault(company.get('industry'), []).append(company)
+                by_location.setdefault(company.get('location'), []).append(company)
+
+            self._snapshot = (companies, by_id, by_industry, by_location)
+            self._mtime = mtime
+            self.version += 1
+            CACHE.invalidate('companies')
+            CACHE.invalidate('stats')
+            return True
+
+    def watch(self, interval=RELOAD_INTERVAL):
+        """启动后台线程，定期检查文件是否修改"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                if self.reload():
+                    print(f"企业数据已重新加载: {len(self.all())} 家")
+
+        threading.Thread(target=loop, name='companies-reload', daemon=True).start()
+
+    def all(self):
+        return self._snapshot[0]
+
+    def get(self, company_id):
+        return self._snapshot[1].get(company_id)
+
+    def filter(self, industry=None, location=None):
+        """按行业和所在地筛选（所在地也可以只写开头，如 "武汉"）"""
+        companies, _, by_industry, by_location = self._snapshot
+        if location:
+            if location in by_location:
+                matched = by_location[location]
+            else:
+                matched = [c for loc, group in by_location.items()
+                           if loc and loc.startswith(location) for c in group]
+                matched.sort(key=lambda c: c['id'])
+            if industry:
+                matched = [c for c in matched if c.get('industry') == industry]
+            return matched
+        if industry:
+            return by_industry.get(industry, [])
+        return companies
+
+    def industry_summary(self):
+        """[(行业, 企业数, 平均 ESG 分数)]，按企业数从多到少"""
+        summary = []
+        for industry, group in self._snapshot[2].items():
+            scores = [c.get('esg_score') or 0 for c in group]
+            summary.append((industry, len(group), sum(scores) / len(scores)))
+        return sorted(summary, key=lambda item: -item[1])
+
+COMPANIES = CompanyStore()
+
+def parse_timestamp(value):
+    """"2025-08-01" 或 "2025-08-01T08:30:00Z" -> 与交易 timestamp 相同格式的字符串"""
+    value = value.strip()
+    if value.endswith('Z'):
+        value = value[:-1]
+    for fmt in ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%dT%H:%M:%SZ')
+        except ValueError:
+            pass
+    raise ValueError(value)
+
+def parse_cursor(value):
+    """游标 "<timestamp>,<id>" -> (timestamp, id)"""
+    timestamp, _, tx_id = value.rpartition(',')
+    return parse_timestamp(timestamp), int(tx_id)
+
+class TransactionStore:
+    """区块链交易账本：持久化到 SQLite，首次使用时生成一次，重启后直接读取
+
+    交易按 (timestamp, id) 排序，时间、交易类型、状态都有联合索引；
+    after=<timestamp,id> 游标从上一页最后一条之后继续（keyset 分页），
+    筛选和翻页都是在索引上定位一次再顺序读取 page_size 行，账本增长到百万行也不变慢。
+    """
+
+    INDEXES = {
+        'idx_tx_time': 'timestamp, id',
+        'idx_tx_type': 'transaction_type, timestamp, id',
+        'idx_tx_status': 'status, timestamp, id',
+        'idx_tx_type_status': 'transaction_type, status, timestamp, id',
+    }
+
+    def __init__(self, path=TRANSACTIONS_DB, source=f"sample:v{SAMPLE_LEDGER_VERSION}:seed={DATA_SEED}:{DATA_REFERENCE_TIME:%Y-%m-%d}"):
+        self.path = path
+        self.source = source  # 数据来源（生成规则版本和随机种子），记录在 meta 表中
+        self.version = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._seeded = False
+
+    def _connect(self):
+        """首次访问时打开数据库并建表（需持有 _lock）"""
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS transactions (
+                    id INTEGER PRIMARY KEY,
+                    timestamp TEXT NOT NULL,
+                    transaction_type TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    body TEXT NOT NULL
+                )"""
+            )
+            for name, columns in self.INDEXES.items():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON transactions ({columns})")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def seed(self, factory):
+        """账本为空或不是由 self.source 生成时（如旧版本、其他种子），清空后写入 factory() 生成的交易"""
+        if self._seeded:
+            return
+        with self._lock:
+            conn = self._connect()
+            if (self._recorded_source(conn) != self.source
+                    or conn.execute("SELECT 1 FROM transactions LIMIT 1").fetchone() is None):
+                conn.execute("DELETE FROM transactions")
+                self._insert(factory())
+                self._record_source(conn)
+            self._seeded = True
+
+    def recorded_source(self):
+        """账本中记录的数据来源，没有记录（旧版本的账本）时为 None"""
+        with self._lock:
+            return self._recorded_source(self._connect())
+
+    def mark_source(self):
+        """记录账本由 self.source 生成（分批 insert() 导入完成后调用）"""
+        with self._lock:
+            self._record_source(self._connect())
+
+    @staticmethod
+    def _recorded_source(conn):
+        row = conn.execute("SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return row[0] if row else None
+
+    def _record_source(self, conn):
+        conn.execute("INSERT OR REPLACE INTO meta VALUES ('source', ?)", (self.source,))
+        conn.commit()
+
+    def insert(self, transactions):
+        """追加交易（按时间顺序分配 id），返回写入的条数"""
+        with self._lock:
+            return self._insert(transactions)
+
+    def _insert(self, transactions):
+        conn = self._connect()
+        next_id = (conn.execute("SELECT MAX(id) FROM transactions").fetchone()[0] or 0) + 1
+        rows = []
+        for offset, tx in enumerate(sorted(transactions, key=lambda tx: tx['timestamp'])):
+            tx = dict(tx, id=next_id + offset)
+            rows.append((tx['id'], tx['timestamp'], tx['transaction_type'], tx['status'],
+                         json.dumps(tx, ensure_ascii=False)))
+        conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        self.version += 1
+        CACHE.invalidate('blockchain')
+        return len(rows)
+
+    @staticmethod
+    def _where(transaction_type=None, status=None, start_time=None, end_time=None):
+        clauses, params = [], []
+        for clause, value in (("transaction_type = ?", transaction_type), ("status = ?", status),
+                              ("timestamp >= ?", start_time), ("timestamp < ?", end_time)):
+            if value is not None:
+                clauses.append(clause)
+                params.append(value)
+        return clauses, params
+
+    def query(self, after=None, offset=0, limit=100, **filters):
+        """按时间倒序返回一页交易；after 为上一页最后一条的 (timestamp, id)"""
+        clauses, params = self._where(**filters)
+        if after is not None:
+            clauses.append("(timestamp, id) < (?, ?)")
+            params.extend(after)
+        sql = "SELECT body FROM transactions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY timestamp DESC, id DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            rows = self._connect().execute(sql, params + [limit, offset]).fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def count(self, **filters):
+        clauses, params = self._where(**filters)
+        sql = "SELECT COUNT(*) FROM transactions"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            return self._connect().execute(sql, params).fetchone()[0]
+
+TRANSACTIONS = TransactionStore()
+
+# --data 载入的快照表（ultra_data.ColumnTable），有快照时代替按请求生成的数据集
+SNAPSHOTS = {}
+
+def use_snapshots(directory):
+    """载入 ultra_data.py 生成的快照（内存映射，不读入内存），返回各表的行数"""
+    global COMPANIES, TRANSACTIONS
+    import ultra_data  # 依赖 NumPy，只在使用快照时导入
+
+    meta, tables = ultra_data.load_snapshots(directory)
+    ledger = os.path.join(directory, 'blockchain.db')
+    if not os.path.exists(ledger):
+        raise FileNotFoundError(f"快照目录中没有交易账本 {ledger}，请用 ultra_data.py 重新生成")
+
+    # 交易账本已由 ultra_data.py 导入快照目录下的 SQLite，不再生成示例交易
+    store = TransactionStore(ledger, ultra_data.ledger_source(meta))
+    if store.recorded_source() != store.source:
+        raise ValueError(f"交易账本 {ledger} 与快照不一致（导入未完成或来自其他快照），请用 ultra_data.py 重新生成")
+    store.seed(list)
+
+    COMPANIES = ultra_data.CompanyTable(tables['companies'])
+    TRANSACTIONS = store
+    SNAPSHOTS['carbon_assets'] = tables['carbon_assets']
+    SNAPSHOTS['esg_history'] = tables['esg_history']
+    CACHE.invalidate()
+    return meta['tables']
+
+def esg_grade(score):
+    """评分 -> (等级, 建议)"""
+    for threshold, grade, suggestion in ESG_GRADES:
+        if score >= threshold:
+            return grade, suggestion
+
+def evaluate_esg_batch(items):
+    """批量 ESG 评价，/api/v1/esg/evaluate 单条评价也调用这里（只传一项）
+
+    items 为请求对象列表；安装了 NumPy 时加权、行业调整、随机波动和定级一次向量化完成。
+    返回与 items 一一对应的结果：{"index", "success", "data"} 或 {"index", "success", "error"}。
+    """
+    results = [None] * len(items)
+    rows = []  # (序号, company_id, 企业名, 行业, 环境, 社会, 治理)
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {"index": i, "success": False, "error": "每一项应为 JSON 对象"}
+            continue
+        try:
+            company_id = int(item.get('company_id', random.randint(1, 156)))
+            environmental = float(item.get('environmental_score', random.uniform(45, 75)))
+            social = float(item.get('social_score', random.uniform(40, 70)))
+            governance = float(item.get('governance_score', random.uniform(50, 80)))
+        except (TypeError, ValueError) as e:
+            results[i] = {"index": i, "success": False, "error": f"参数无效: {e}"}
+            continue
+        company_info = COMPANIES.get(company_id)
+        if company_info:
+            company_name = company_info.get('name', f'企业{company_id:03d}')
+            industry = company_info.get('industry', random.choice(['环保技术', '新能源', '制造业', '金融业']))
+        else:
+            company_name = f'企业{company_id:03d}'
+            industry = random.choice(['环保技术', '新能源', '制造业', '金融业'])
+        rows.append((i, company_id, company_name, industry, environmental, social, governance))
+
+    if not rows:
+        return results
+
+    n = len(rows)
+    factors = [INDUSTRY_ADJUSTMENTS.get(row[3], 1.0) for row in rows]
+    if np is not None:
+        scores = np.array([row[4:7] for row in rows], dtype=np.float64)
+        weights = np.array([ESG_WEIGHTS['environmental'], ESG_WEIGHTS['social'], ESG_WEIGHTS['governance']])
+        adjusted = np.minimum(scores @ weights * np.array(factors), 100)
+        volatility = np.random.uniform(-2, 2, n)
+        final = np.clip(adjusted + volatility, 0, 100)
+        # 分数下限升序排列后 searchsorted 得到等级下标
+        thresholds = np.array([g[0] for g in ESG_GRADES[-2::-1]])
+        grade_index = len(ESG_GRADES) - 1 - np.searchsorted(thresholds, final, side='right')
+        shifted = (scores + volatility[:, None]).tolist()
+        final, volatility, grade_index = final.tolist(), volatility.tolist(), grade_index.tolist()
+        confidence = np.random.uniform(0.85, 0.98, n).tolist()
+        eval_offsets = np.random.randint(1, 1000, n).tolist()
+    else:
+        final, shifted, grade_index, confidence, eval_offsets = [], [], [], [], []
+        for row, factor in zip(rows, factors):
+            environmental, social, governance = row[4:7]
+            overall = (environmental * ESG_WEIGHTS['environmental'] +
+                       social * ESG_WEIGHTS['social'] +
+                       governance * ESG_WEIGHTS['governance'])
+            volatility = random.uniform(-2, 2)
+            score = max(0, min(100, min(overall * factor, 100) + volatility))
+            final.append(score)
+            shifted.append([environmental + volatility, social + volatility, governance + volatility])
+            grade_index.append(next(k for k, g in enumerate(ESG_GRADES) if score >= g[0]))
+            confidence.append(random.uniform(0.85, 0.98))
+            eval_offsets.append(random.randint(1, 999))
+
+    calculation_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for k, (i, company_id, company_name, industry, *_) in enumerate(rows):
+        _, grade, suggestion = ESG_GRADES[grade_index[k]]
+        results[i] = {"index": i, "success": True, "data": {
+            "company_id": company_id,
+            "company_name": company_name,
+            "industry": industry,
+            "evaluation_id": 1000 + company_id + eval_offsets[k],
+            "overall_score": round(final[k], 1),
+            "environmental_score": round(shifted[k][0], 1),
+            "social_score": round(shifted[k][1], 1),
+            "governance_score": round(shifted[k][2], 1),
+            "evaluation_grade": grade,
+            "confidence_level": round(confidence[k], 2),
+            "suggestion": suggestion,
+            "industry_factor": factors[k],
+            "evaluation_method": "federated_learning_with_homomorphic_encryption",
+            "data_encryption_used": True,
+            "calculation_time": calculation_time
+        }}
+    return results
+
+def value_carbon_batch(items):
+    """批量碳资产估值，/api/v1/carbon/valuation 也调用这里，返回格式同 evaluate_esg_batch"""
+    results = [None] * len(items)
+    rows = []  # (序号, 类型, 数量, 年限, 基准价)
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            results[i] = {"index": i, "success": False, "error": "每一项应为 JSON 对象"}
+            continue
+        try:
+            carbon_type = str(item.get('type', 'cer'))
+            amount = float(item.get('amount', 1000))
+            project_years = int(item.get('project_years', 10))
+        except (TypeError, ValueError) as e:
+            results[i] = {"index": i, "success": False, "error": f"参数无效: {e}"}
+            continue
+        rows.append((i, carbon_type, amount, project_years, CARBON_BASE_PRICES.get(carbon_type, 40.0)))
+
+    if not rows:
+        return results
+
+    n = len(rows)
+    if np is not None:
+        amounts = np.array([row[2] for row in rows])
+        years = np.array([row[3] for row in rows])
+        base = np.array([row[4] for row in rows])
+        quantity = np.select([amounts >= 10000, amounts >= 5000, amounts < 100], [1.02, 1.01, 0.97], 1.0)
+        years_factor = 1.0 + (years - 10) * 0.02
+        market = np.round(base * quantity * years_factor, 2)
+        quantity, years_factor, market = quantity.tolist(), years_factor.tolist(), market.tolist()
+        growth = np.random.uniform(5, 15, n).tolist()
+    else:
+        quantity, years_factor, market, growth = [], [], [], []
+        for _, _, amount, project_years, base_price in rows:
+            factor = 1.0
+            if amount >= 10000: factor = 1.02
+            elif amount >= 5000: factor = 1.01
+            elif amount < 100: factor = 0.97
+            quantity.append(factor)
+            years_factor.append(1.0 + (project_years - 10) * 0.02)
+            market.append(round(base_price * factor * years_factor[-1], 2))
+            growth.append(random.uniform(5, 15))
+
+    calculation_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    for k, (i, carbon_type, amount, project_years, base_price) in enumerate(rows):
+        results[i] = {"index": i, "success": True, "data": {
+            "asset_type": carbon_type.upper(),
+            "amount": amount,
+            "project_years": project_years,
+            "market_price": market[k],
+            "total_value": round(amount * market[k], 2),
+            "base_price": base_price,
+            "quantity_factor": quantity[k],
+            "years_factor": years_factor[k],
+            "growth_rate": round(growth[k], 1),
+            "risk_level": "低" if base_price > 40 else "中",
+            "valuation_method": "market_based_with_adjustments",
+            "calculation_time": calculation_time
+        }}
+    return results
+
+def parse_batch_items(body, content_type=''):
+    """解析批量请求体：JSON 数组、{"items": [...]} 或 NDJSON（每行一个对象）
+
+    返回 (条目列表, 是否为 NDJSON)；格式错误时抛出 ValueError。
+    """
+    try:
+        text = body.decode('utf-8')
+    except UnicodeDecodeError:
+        text = body.decode('gbk', errors='ignore')
+
+    if 'ndjson' not in content_type:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None  # 可能是多行 NDJSON
+        if isinstance(data, list):
+            return data, False
+        if isinstance(data, dict):
+            if isinstance(data.get('items'), list):
+                return data['items'], False
+            return [data], False
+
+    items = []
+    for line_no, line in enumerate(text.splitlines(), 1):
+        if line.strip():
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                raise ValueError(f"第 {line_no} 行不是有效的 JSON")
+    return items, True
+
+# 延迟直方图的分桶上界（秒）：Prometheus 默认分桶，缓存命中的接口多在 1ms 内，再补几个小分桶
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+METRICS_RETENTION = 24 * 60  # 按分钟保留的指标（分钟），/api/system/metrics?period= 最长 24h
+CPU_SAMPLE_INTERVAL = 1  # 两次 CPU 使用率采样的最短间隔（秒）
+
+# /api/system/status 中各服务对应的路由
+SERVICE_ROUTES = [
+    ("ESG评价服务", ('POST', '/api/v1/esg/evaluate')),
+    ("碳资产估值服务", ('POST', '/api/v1/carbon/valuation')),
+    ("区块链服务", ('GET', '/api/v1/blockchain/transactions')),
+    ("数据处理服务", ('GET', '/api/v1/esg/history')),
+]
+
+class LatencyStats:
+    """一组请求的调用数、错误数（状态码 >= 400）和延迟直方图"""
+    __slots__ = ('calls', 'errors', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # 最后一个为 +Inf
+
+    def observe(self, latency, error):
+        self.calls += 1
+        self.errors += error
+        self.total += latency
+        self.max = max(self.max, latency)
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.buckets = [a + b for a, b in zip(self.buckets, other.buckets)]
+        return self
+
+    def percentile(self, q):
+        """由直方图估算分位数：在所在分桶内按线性插值"""
+        rank = q * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            if count and seen + count >= rank:
+                lower = LATENCY_BUCKETS[i - 1] if i else 0.0
+                upper = min(LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return 0.0
+
+    def summary(self):
+        calls = self.calls or 1
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "error_rate": round(self.errors / calls, 4),
+            "avg_response_time": round(self.total / calls, 4),
+            "p50_response_time": round(self.percentile(0.50), 4),
+            "p95_response_time": round(self.percentile(0.95), 4),
+            "p99_response_time": round(self.percentile(0.99), 4),
+            "max_response_time": round(self.max, 4),
+        }
+
+def read_rss():
+    """进程常驻内存（字节）；没有 /proc 时退回 getrusage 的峰值，都不可用时返回 None"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024  # macOS 单位为字节，Linux 为 KB
+
+def physical_memory():
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+class Metrics:
+    """请求指标：按 (方法, 路由) 统计调用数、错误数和延迟直方图，并采样进程 CPU/内存
+
+    累计值从启动开始计算（Prometheus 格式输出这一份）；另外按分钟分桶保留最近
+    METRICS_RETENTION 分钟，供 period=5m/1h/24h 这类时间窗口查询。
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._routes = {}                     # (方法, 路由) -> LatencyStats
+        self._minutes = collections.deque()   # (分钟序号, {(方法, 路由): LatencyStats})
+        self.bytes_sent = 0
+        self.bytes_recv = 0
+        self._cpu_sample = (time.monotonic(), self.cpu_seconds())
+        self._cpu_percent = 0.0
+
+    def observe(self, method, route, status, latency):
+        key = (method, route)
+        error = status >= 400
+        minute = int(time.time() // 60)
+        with self._lock:
+            self._routes.setdefault(key, LatencyStats()).observe(latency, error)
+            if not self._minutes or self._minutes[-1][0] != minute:
+                self._minutes.append((minute, {}))
+                while self._minutes[0][0] <= minute - METRICS_RETENTION:
+                    self._minutes.popleft()
+            self._minutes[-1][1].setdefault(key, LatencyStats()).observe(latency, error)
+
+    def add_bytes(self, sent, recv):
+        with self._lock:
+            self.bytes_sent += sent
+            self.bytes_recv += recv
+
+    def routes(self, seconds=None):
+        """{(方法, 路由): LatencyStats}；seconds 为 None 时返回启动以来的累计值，否则为最近 seconds 秒"""
+        result = {}
+        with self._lock:
+            if seconds is None:
+                for key, stats in self._routes.items():
+                    result[key] = LatencyStats().merge(stats)
+                return result
+            first = int(time.time() // 60) - max(1, -(-int(seconds) // 60)) + 1
+            for minute, routes in reversed(self._minutes):
+                if minute < first:
+                    break
+                for key, stats in routes.items():
+                    result.setdefault(key, LatencyStats()).merge(stats)
+        return result
+
+    @staticmethod
+    def cpu_seconds():
+        t = os.times()
+        return t.user + t.system
+
+    def process(self):
+        """进程资源：CPU 使用率（相对上一次采样，单核满载为 100）、常驻内存"""
+        now, cpu = time.monotonic(), self.cpu_seconds()
+        with self._lock:
+            last_wall, last_cpu = self._cpu_sample
+            if now - last_wall >= CPU_SAMPLE_INTERVAL:
+                self._cpu_percent = (cpu - last_cpu) / (now - last_wall) * 100
+                self._cpu_sample = (now, cpu)
+            cpu_percent = self._cpu_percent
+
+        rss, total = read_rss(), physical_memory()
+        return {
+            "cpu_percent": round(cpu_percent, 1),
+            "cpu_seconds": round(cpu, 3),
+            "rss_bytes": rss,
+            "memory_percent": round(rss / total * 100, 2) if rss and total else None,
+            "threads": threading.active_count(),
+            "uptime_seconds": round(time.time() - self.started, 1),
+        }
+
+    def prometheus(self, in_flight, connections):
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        routes = self.routes()
+        process = self.process()
+        lines = [
+            '# HELP esg_http_requests_total 请求数',
+            '# TYPE esg_http_requests_total counter',
+        ]
+        labels = {key: 'method="%s",route="%s"' % key for key in routes}
+        for key, stats in sorted(routes.items()):
+            lines.append('esg_http_requests_total{%s} %d' % (labels[key], stats.calls))
+        lines += ['# HELP esg_http_request_errors_total 状态码 >= 400 的请求数',
+                  '# TYPE esg_http_request_errors_total counter']
+        for key, stats in sorted(routes.items()):
+            lines.append('esg_http_request_errors_total{%s} %d' % (labels[key], stats.errors))
+        lines += ['# HELP esg_http_request_duration_seconds 请求处理时间',
+                  '# TYPE esg_http_request_duration_seconds histogram']
+        for key, stats in sorted(routes.items()):
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + (float('inf'),), stats.buckets):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('esg_http_request_duration_seconds_bucket{%s,le="%s"} %d'
+                             % (labels[key], le, cumulative))
+            lines.append('esg_http_request_duration_seconds_sum{%s} %.6f' % (labels[key], stats.total))
+            lines.append('esg_http_request_duration_seconds_count{%s} %d' % (labels[key], stats.calls))
+
+        gauges = [
+            ('esg_http_requests_in_flight', 'gauge', '处理中的请求数', in_flight),
+            ('esg_http_connections', 'gauge', '打开的连接数', connections),
+            ('esg_http_response_bytes_total', 'counter', '发送的字节数', self.bytes_sent),
+            ('esg_http_request_bytes_total', 'counter', '接收的字节数', self.bytes_recv),
+            ('process_cpu_seconds_total', 'counter', '进程 CPU 时间（秒）', process['cpu_seconds']),
+            ('process_resident_memory_bytes', 'gauge', '进程常驻内存（字节）', process['rss_bytes']),
+            ('process_start_time_seconds', 'gauge', '进程启动时间（Unix 时间戳）', self.started),
+        ]
+        for name, kind, help_text, value in gauges:
+            if value is None:
+                continue
+            lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s %s' % (name, kind),
+                      '%s %s' % (name, value)]
+        return '\n'.join(lines) + '\n'
+
+METRICS = Metrics()
+
+class CountingFile:
+    """包装 rfile/wfile，统计读写的字节数"""
+
+    def __init__(self, f):
+        self._f = f
+        self.count = 0
+
+    def read(self, *args):
+        data = self._f.read(*args)
+        self.count += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self._f.readline(*args)
+        self.count += len(data)
+        return data
+
+    def write(self, data):
+        self.count += len(data)
+        return self._f.write(data)
+
+    def __getattr__(self, name):
+        return getattr(self._f, name)
+
+def parse_period(period):
+    """"5m" / "1h" / "1d" -> 秒数，格式不对时返回 None"""
+    match = re.fullmatch(r'(\d+)([smhd])', period or '')
+    if not match:
+        return None
+    return int(match.group(1)) * {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}[match.group(2)]
+
+def format_uptime(seconds):
+    minutes = int(seconds // 60)
+    return f"{minutes // 1440}天 {minutes // 60 % 24}小时 {minutes % 60}分钟"
+
+class Param:
+    """查询参数：名称、类型（int/float/str 或任意转换函数）、默认值和取值范围，hint 为出错时的格式说明
+
+    同名参数出现多次时取最后一个；类型或范围不对时 parse() 抛出 ValueError，由路由返回 400。
+    """
+    TYPE_NAMES = {int: '整数', float: '数字'}
+
+    def __init__(self, name, type=str, default=None, min=None, max=None, choices=None, hint=None):
+        self.name = name
+        self.type = type
+        self.hint = hint
+        self.default = default
+        self.min = min
+        self.max = max
+        self.choices = choices
+
+    def parse(self, values):
+        if not values:
+            return self.default
+        raw = values[-1]
+        try:
+            value = self.type(raw)
+        except ValueError:
+            hint = self.hint or self.TYPE_NAMES.get(self.type, '有效值')
+            raise ValueError(f"参数 {self.name} 应为{hint}: {raw!r}")
+        if self.min is not None and value < self.min:
+            raise ValueError(f"参数 {self.name} 不能小于 {self.min}")
+        if self.max is not None and value > self.max:
+            raise ValueError(f"参数 {self.name} 不能大于 {self.max}")
+        if self.choices and value not in self.choices:
+            raise ValueError(f"参数 {self.name} 应为 {'/'.join(self.choices)} 之一")
+        return value
+
+class Route:
+    __slots__ = ('method', 'pattern', 'handler', 'params')
+
+    def __init__(self, method, pattern, handler, params=()):
+        self.method = method
+        self.pattern = pattern
+        self.handler = handler
+        self.params = tuple(params)
+
+    def parse_query(self, query):
+        """查询字符串 -> {参数名: 值}；未声明的参数忽略"""
+        values = parse_qs(query, keep_blank_values=True) if query else {}
+        return {param.name: param.parse(values.get(param.name)) for param in self.params}
+
+# 路径参数的类型：{company_id:int}
+PATH_TYPES = {'str': str, 'int': int}
+_PARAM = object()   # 前缀树节点中路径参数子节点的键
+_ROUTES = object()  # 前缀树节点中 {方法: Route} 的键
+
+class Router:
+    """路由表：固定路径直接查 dict，带 {参数} 的路径按 "/" 分段查前缀树
+
+    查找时间与路由数量无关，未知路径一次查找即可交给静态文件处理；
+    同一路径下固定段优先于参数段。
+    """
+
+    def __init__(self):
+        self._exact = {}  # 路径 -> {方法: Route}
+        self._trie = {}   # 段 -> 子节点；_PARAM -> (参数名, 类型, 子节点)；_ROUTES -> {方法: Route}
+
+    def add(self, method, pattern, handler, params=()):
+        route = Route(method, pattern, handler, params)
+        if '{' not in pattern:
+            self._exact.setdefault(pattern, {})[method] = route
+            return route
+
+        node = self._trie
+        for segment in pattern.strip('/').split('/'):
+            if segment.startswith('{') and segment.endswith('}'):
+                name, _, kind = segment[1:-1].partition(':')
+                entry = node.setdefault(_PARAM, (name, PATH_TYPES[kind or 'str'], {}))
+                if entry[0] != name:
+                    raise ValueError(f"路由 {pattern} 与已有路由的参数名冲突: {entry[0]}")
+                node = entry[2]
+            else:
+                node = node.setdefault(segment, {})
+        node.setdefault(_ROUTES, {})[method] = route
+        return route
+
+    def route(self, method, pattern, *params):
+        """装饰器：把函数注册为 method pattern 的处理函数"""
+        def decorator(handler):
+            self.add(method, pattern, handler, params)
+            return handler
+        return decorator
+
+    def get(self, pattern, *params):
+        return self.route('GET', pattern, *params)
+
+    def post(self, pattern, *params):
+        return self.route('POST', pattern, *params)
+
+    def match(self, path):
+        """返回 ({方法: Route}, 路径参数)；路径不存在时返回 (None, None)"""
+        routes = self._exact.get(path)
+        if routes is not None:
+            return routes, {}
+
+        node, args = self._trie, {}
+        for segment in path.strip('/').split('/'):
+            child = node.get(segment)
+            if child is None:
+                param = node.get(_PARAM)
+                if param is None:
+                    return None, None
+                name, kind, child = param
+                try:
+                    args[name] = kind(unquote(segment))
+                except ValueError:
+                    return None, None
+            node = child
+        routes = node.get(_ROUTES)
+        return (routes, args) if routes else (None, None)
+
+    def routes(self):
+        """所有路由（调试、压测时列出可用接口）"""
+        result = [r for routes in self._exact.values() for r in routes.values()]
+        stack = [self._trie]
+        while stack:
+            node = stack.pop()
+            result.extend(node.get(_ROUTES, {}).values())
+            stack.extend(child for key, child in node.items() if isinstance(key, str))
+            if _PARAM in node:
+                stack.append(node[_PARAM][2])
+        return result
+
+ROUTES = Router()
+
+class UltraESGHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """多线程 HTTP 服务器：每个连接一个线程，同时处理的请求数不超过 max_workers，支持优雅停止
+
+    连接线程只在处理请求时占用名额，在保持连接上等待下一个请求时不占，
+    空闲或很慢的客户端不会让其他连接排不上队；请求超过 max_workers 个时排队等待名额。
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, server_address, handler_class, max_workers=MAX_WORKERS,
+                 max_connections=MAX_CONNECTIONS):
+        super().__init__(server_address, handler_class)
+        self.max_connections = max_connections
+        self.stopping = False
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._connections = set()
+        self._in_flight = 0
+        self._idle = threading.Condition()
+
+    def process_request(self, request, client_address):
+        """每个连接一个线程；连接数已满时直接返回 503 并关闭"""
+        with self._idle:
+            full = len(self._connections) >= self.max_connections
+            if not full:
+                self._connections.add(request)
+        if full:
+            try:
+                request.sendall(b'HTTP/1.1 503 Service Unavailable\r\n'
+                                b'Content-Length: 0\r\nConnection: close\r\n\r\n')
+            except OSError:
+                pass
+            super().shutdown_request(request)
+            return
+        super().process_request(request, client_address)
+
+    def shutdown_request(self, request):
+        with self._idle:
+            self._connections.discard(request)
+            self._idle.notify_all()
+        super().shutdown_request(request)
+
+    def request_started(self):
+        """读完请求行和请求头后调用：等待一个处理名额（排队的请求也计入处理中）"""
+        with self._idle:
+            self._in_flight += 1
+        self._slots.acquire()
+
+    def request_finished(self):
+        self._slots.release()
+        with self._idle:
+            self._in_flight -= 1
+            self._idle.notify_all()
+
+    def in_flight(self):
+        with self._idle:
+            return self._in_flight
+
+    def connections(self):
+        with self._idle:
+            return len(self._connections)
+
+    def graceful_shutdown(self, grace=SHUTDOWN_GRACE):
+        """停止接受新连接，等待处理中的请求完成（最多 grace 秒），再关闭空闲的长连接
+
+        需要在 serve_forever() 所在线程之外调用。
+        """
+        self.stopping = True
+        self.shutdown()
+        deadline = time.monotonic() + grace
+        with self._idle:
+            while self._in_flight and time.monotonic() < deadline:
+                self._idle.wait(deadline - time.monotonic())
+            connections = list(self._connections)
+        # 唤醒还在等待下一个请求的保持连接，等它们的线程退出
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        deadline = time.monotonic() + 1
+        with self._idle:
+            while self._connections and time.monotonic() < deadline:
+                self._idle.wait(deadline - time.monotonic())
+        self.server_close()
 
 class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
+    # HTTP/1.1 保持连接：所有响应都带 Content-Length
+    protocol_version = 'HTTP/1.1'
+    timeout = REQUEST_TIMEOUT
+    # 响应头和响应体分两次发送，开着 Nagle 算法时响应体要等客户端的延迟确认（约 40ms）
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        self.rfile = CountingFile(self.rfile)
+        self.wfile = CountingFile(self.wfile)
+
+    def parse_request(self):
+        # 从读到请求行开始计时，不含保持连接上等待下一个请求的空闲时间
+        self._started = time.perf_counter()
+        ok = super().parse_request()
+        if ok:
+            self._counted = True
+            self.server.request_started()
+        return ok
+
+    def send_response(self, code, message=None):
+        self._status = code
+        super().send_response(code, message)
+
+    def handle_one_request(self):
+        self._counted = False
+        self._status = None
+        # 未匹配路由的请求（静态文件、404）统一记为 "other"，避免指标标签无限增长
+        self.matched_route = 'other'
+        try:
+            super().handle_one_request()
+        except Exception:
+            self._status = 500
+            raise
+        finally:
+            if self._counted:
+                self.server.request_finished()
+                METRICS.observe(self.command, self.matched_route, self._status or 500,
+                                time.perf_counter() - self._started)
+            METRICS.add_bytes(self.wfile.count, self.rfile.count)
+            self.wfile.count = self.rfile.count = 0
+
+    def end_headers(self):
+        # 服务器正在停止时，处理完当前请求就关闭连接
+        if getattr(self.server, 'stopping', False):
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        super().end_headers()
+
     def add_cors_headers(self):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type, Authorization')
 
-    def do_OPTIONS(self):
+    def response_encoding(self, size):
+        """按 Accept-Encoding 选择压缩方式；小响应不压缩"""
+        if size < MIN_COMPRESS_SIZE:
+            return None
+        return choose_encoding(self.headers.get('Accept-Encoding', ''))
+
+    def send_json(self, data, status=200):
+        """编码并发送 JSON 响应（客户端支持时压缩）"""
+        body = dumps(data)
+        encoding = self.response_encoding(len(body))
+        if encoding:
+            body = compress(body, encoding)
+        self.send_response(status)
+        self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.add_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_cached_json(self, body, etag):
+        """发送缓存的 JSON；客户端 If-None-Match 命中时返回 304
+
+        压缩后的响应使用单独的 ETag（"<sha1>-gzip"），压缩结果缓存在 CACHE 中。
+        """
+        encoding = self.response_encoding(len(body))
+        if encoding:
+            body = CACHE.compressed(body, etag, encoding)
+            own_tags = (etag, etag[:-1] + '-' + encoding + '"')
+        else:
+            own_tags = (etag,)
+        etag = own_tags[-1]
+
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            tags = [t.strip() for t in if_none_match.split(',')]
+            tags = [t[2:] if t.startswith('W/') else t for t in tags]
+            if '*' in tags or any(t in tags for t in own_tags):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')
+                self.send_header('Vary', 'Accept-Encoding')
+                self.add_cors_headers()
+                self.end_headers()
+                return
+
+        self.send_response(200)
+        self.send_header('Content-type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('ETag', etag)
+        # 每次都向服务器确认，未变化时只返回 304
+        self.send_header('Cache-Control', 'no-cache')
+        self.add_cors_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json_list(self, key, items):
+        """发送 {"success": true, "data": items, "total": n}
+
+        已缓存时直接发送（带 ETag，可返回 304）；未缓存且超过 STREAM_MIN_ITEMS 条时边编码边分块发送，
+        客户端不用等整个数组编码完，编码结果同时写入缓存供之后的请求使用。
+        """
+        cached = CACHE.get_page(key)
+        if cached is None and len(items) >= STREAM_MIN_ITEMS:
+            # 超过 MAX_CACHED_LIST_ITEMS 条（大规模快照）时整个响应可能有几百 MB，只发送不缓存
+            keep = len(items) <= MAX_CACHED_LIST_ITEMS
+            parts = []
+
+            def send(data):
+                if keep:
+                    parts.append(data)
+                self.write_chunk(data)
+
+            self.start_chunked('application/json; charset=utf-8')
+            send(b'{"success": true, "data": [')
+            for start in range(0, len(items), STREAM_CHUNK):
+                chunk = b', '.join(dumps(item) for item in items[start:start + STREAM_CHUNK])
+                send(b', ' + chunk if start else chunk)
+            send(b'], "total": %d}' % len(items))
+            self.end_chunked()
+            if keep:
+                CACHE.put_page(key, b''.join(parts))
+            return
+
+        body, etag = cached or CACHE.page(
+            key, lambda: {"success": True, "data": items[:], "total": len(items)})
+        self.send_cached_json(body, etag)
+
+    def send_prometheus(self):
+        body = METRICS.prometheus(self.server.in_flight(), self.server.connections()).encode('utf-8')
         self.send_response(200)
+        self.send_header('Content-type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
         self.add_cors_headers()
         self.end_headers()
+        self.wfile.write(body)
 
-    def do_GET(self):
-        if self.path == '/' or self.path == '/health':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
-            self.end_headers()
-            response = {
-                "message": "双碳比赛系统 Ultra API",
-                "version": "2.0.0",
-                "status": "running",
-                "service": "超大规模ESG评价与碳金融服务平台",
-                "data_scale": {
-                    "companies": 156,
-                    "blockchain_txs": 1247,
-                    "carbon_assets": 187,
-                    "esg_history": 2156
-                }
-            }
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+    def start_chunked(self, content_type):
+        """开始分块传输的响应，之后用 write_chunk() 逐块发送、end_chunked() 结束
 
-        elif self.path == '/stats':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
-            self.end_headers()
+        客户端支持时逐块压缩（总大小未知，按需要压缩处理）。
+        """
+        encoding = self.response_encoding(MIN_COMPRESS_SIZE)
+        self._compressor = StreamCompressor(encoding) if encoding else None
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Transfer-Encoding', 'chunked')
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.add_cors_headers()
+        self.end_headers()
 
-            # 生成动态的行业数据，确保总和为156
-            industries_data = []
-            industries = [
-                "环保技术", "新能源", "制造业", "金融业", "农业科技", "建筑工程",
-                "信息技术", "新能源汽车", "咨询服务", "生物医药", "金融科技", "化工材料"
-            ]
+    def write_chunk(self, data):
+        if data and self._compressor:
+            data = self._compressor.compress(data)
+        if data:
+            self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+
+    def end_chunked(self):
+        if self._compressor:
+            tail, self._compressor = self._compressor.finish(), None
+            if tail:
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(tail), tail))
+        self.wfile.write(b'0\r\n\r\n')
+
+    def stream_batch(self, items, batch, ndjson):
+        """每计算完 BATCH_CHUNK 条就发送一次
+
+        NDJSON：每行一条结果；JSON：{"success": true, "data": [...], "total": n}。
+        """
+        if ndjson:
+            self.start_chunked('application/x-ndjson; charset=utf-8')
+        else:
+            self.start_chunked('application/json; charset=utf-8')
+            self.write_chunk(b'{"success": true, "data": [')
+
+        for start in range(0, len(items), BATCH_CHUNK):
+            results = batch(items[start:start + BATCH_CHUNK])
+            for result in results:
+                result["index"] += start
+            if ndjson:
+                self.write_chunk(b''.join(dumps(r) + b'\n' for r in results))
+            else:
+                self.write_chunk((b', ' if start else b'') + b', '.join(dumps(r) for r in results))
 
-            # 为每个行业分配基准数量，确保总和为156
-            base_distribution = {
-                "环保技术": 18, "新能源": 16, "制造业": 15, "金融业": 12,
-                "农业科技": 14, "建筑工程": 11, "信息技术": 17, "新能源汽车": 13,
-                "咨询服务": 10, "生物医药": 12, "金融科技": 8, "化工材料": 10
-            }
+        if not ndjson:
+            self.write_chunk(b'], "total": %d}' % len(items))
+        self.end_chunked()
 
-            total_allocated = 0
-            for i, industry in enumerate(industries):
-                if i == len(industries) - 1:
-                    # 最后一个行业分配剩余的数量，确保总和为156
-                    count = 156 - total_allocated
-                else:
-                    # 其他行业在基准数量上小幅随机调整
-                    base_count = base_distribution.get(industry, 10)
-                    count = base_count + random.randint(-3, 3)
-                    count = max(5, count)  # 确保至少有5家企业
-
-                total_allocated += count
-
-                base_score = {
-                    "环保技术": 72, "新能源": 75, "制造业": 62, "金融业": 68,
-                    "农业科技": 65, "建筑工程": 58, "信息技术": 69,
-                    "新能源汽车": 74, "生物医药": 70, "金融科技": 71, "化工材料": 55
-                }.get(industry, 65)
-
-                avg_score = base_score + random.randint(-10, 15)
-                avg_score = max(40, min(92, avg_score))
-
-                industries_data.append({
-                    "name": industry,
-                    "count": count,
-                    "avg_esg_score": round(avg_score, 1)
-                })
+    def do_OPTIONS(self):
+        self.send_response(200)
+        self.add_cors_headers()
+        self.send_header('Content-Length', '0')
+        self.end_headers()
 
-            response = {
-                "total_companies": 156,
-                "total_esg_evaluations": 3847,
-                "total_carbon_assets": 187,
-                "total_transactions": 1247,
-                "total_carbon_value": 287450000,
-                "system_status": "operational",
-                "industries": industries_data,
-                "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+    def do_GET(self):
+        if not self.dispatch('GET'):
+            super().do_GET()
 
-        elif self.path.startswith('/api/v1/companies'):
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
+    def do_POST(self):
+        if not self.dispatch('POST'):
+            self.discard_body()
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
             self.end_headers()
 
-            # 解析分页参数
-            page = 1
-            page_size = 50
-            if '?' in self.path:
-                params = self.path.split('?')[1]
-                for param in params.split('&'):
-                    if '=' in param:
-                        key, value = param.split('=', 1)
-                        if key == 'page':
-                            page = int(value)
-                        elif key == 'page_size':
-                            page_size = int(value)
-
-            # 加载真实的企业数据
-            companies = self.load_real_companies()
+    def dispatch(self, method):
+        """按路由表分发：解析并校验查询参数后调用路由函数，返回是否找到对应路径"""
+        url = urlparse(self.path)
+        routes, args = ROUTES.match(url.path)
+        if routes is None:
+            return False
+
+        route = routes.get(method)
+        if route is None:
+            self.matched_route = next(iter(routes.values())).pattern
+            self.discard_body()
+            self.send_response(405)
+            self.send_header('Allow', ', '.join(sorted(routes) + ['OPTIONS']))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return True
 
+        self.matched_route = route.pattern
+        try:
+            args.update(route.parse_query(url.query))
+        except ValueError as e:
+            self.discard_body()
+            self.send_json({"success": False, "error": str(e)}, status=400)
+            return True
+        route.handler(self, **args)
+        return True
+
+    def read_json(self):
+        """读取 JSON 请求体（空请求体为 {}），格式不对时抛出 ValueError"""
+        try:
+            content_length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            # 不知道请求体有多长，保持连接上的下一个请求无法定位，只能关闭连接
+            self.close_connection = True
+            raise ValueError("Content-Length 无效")
+        post_data = self.rfile.read(content_length) if content_length > 0 else b''
+        if not post_data.strip():
+            return {}
+        try:
+            text = post_data.decode('utf-8')
+        except UnicodeDecodeError:
+            text = post_data.decode('gbk', errors='ignore')
+        try:
+            return json.loads(text)
+        except ValueError:
+            raise ValueError("请求体不是有效的 JSON")
+
+    def discard_body(self):
+        # 读掉未处理的请求体，否则保持连接上的下一个请求会读错位置
+        content_length = int(self.headers.get('Content-Length') or 0)
+        if content_length:
+            self.rfile.read(content_length)
+
+    @ROUTES.get('/')
+    @ROUTES.get('/health')
+    def health(self):
+        body, etag = CACHE.page(('health',), lambda: {
+            "message": "双碳比赛系统 Ultra API",
+            "version": "2.0.0",
+            "status": "running",
+            "service": "超大规模ESG评价与碳金融服务平台",
+            "data_scale": {
+                "companies": 156,
+                "blockchain_txs": 1247,
+                "carbon_assets": 187,
+                "esg_history": 2156
+            }
+        })
+        self.send_cached_json(body, etag)
+
+    @ROUTES.get('/stats')
+    def stats(self):
+        version, stats = CACHE.dataset('stats', self.generate_stats)
+        body, etag = CACHE.page(('stats', version), lambda: stats)
+        self.send_cached_json(body, etag)
+
+    @ROUTES.get('/api/v1/companies',
+                Param('page', int, 1, min=1),
+                Param('page_size', int, 50, min=1, max=MAX_PAGE_SIZE),
+                Param('industry'),
+                Param('location'))
+    def list_companies(self, page, page_size, industry, location):
+        # 企业数据已在内存中按行业/所在地建立索引
+        version = COMPANIES.version
+        companies = COMPANIES.filter(industry, location)
+
+        def build():
             # 分页处理
             start_idx = (page - 1) * page_size
             end_idx = start_idx + page_size
             page_companies = companies[start_idx:end_idx]
 
-            response = {
+            return {
                 "success": True,
                 "data": page_companies,
                 "pagination": {
@@ -141,368 +1516,341 @@ class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
                     "total_pages": (len(companies) + page_size - 1) // page_size
                 }
             }
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
 
-        elif self.path.startswith('/api/v1/blockchain/transactions'):
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
-            self.end_headers()
-
-            # 解析分页参数
-            page = 1
-            page_size = 100
-            if '?' in self.path:
-                params = self.path.split('?')[1]
-                for param in params.split('&'):
-                    if '=' in param:
-                        key, value = param.split('=', 1)
-                        if key == 'page':
-                            page = int(value)
-                        elif key == 'page_size':
-                            page_size = int(value)
-
-            # 生成超大规模区块链数据
-            transactions = self.generate_ultra_blockchain_data()
+        body, etag = CACHE.page(('companies', version, page, page_size, industry, location), build)
+        self.send_cached_json(body, etag)
+
+    @ROUTES.get('/api/v1/companies/{company_id:int}')
+    def company_detail(self, company_id):
+        company = COMPANIES.get(company_id)
+        if company is None:
+            self.send_json({"success": False, "error": f"企业 {company_id} 不存在"}, status=404)
+            return
+        body, etag = CACHE.page(('companies', COMPANIES.version, 'detail', company_id),
+                                lambda: {"success": True, "data": company})
+        self.send_cached_json(body, etag)
+
+    @ROUTES.get('/api/v1/blockchain/transactions',
+                Param('page', int, 1, min=1),
+                Param('page_size', int, 100, min=1, max=MAX_PAGE_SIZE),
+                Param('after', parse_cursor, hint='<timestamp>,<id>，如 2025-08-01T08:30:00Z,1024'),
+                Param('transaction_type'),
+                Param('status'),
+                Param('start_time', parse_timestamp, hint='时间，如 2025-08-01 或 2025-08-01T08:30:00Z'),
+                Param('end_time', parse_timestamp, hint='时间，如 2025-08-01 或 2025-08-01T08:30:00Z'))
+    def list_transactions(self, page, page_size, after, **filters):
+        # 交易账本持久化在 SQLite 中，首次请求时生成
+        TRANSACTIONS.seed(self.generate_ultra_blockchain_data)
+        version = TRANSACTIONS.version
+
+        def build():
+            # 多取一条判断是否还有下一页；带 after 时按游标翻页，不再计算总数
+            if after is not None:
+                rows = TRANSACTIONS.query(after=after, limit=page_size + 1, **filters)
+            else:
+                rows = TRANSACTIONS.query(offset=(page - 1) * page_size, limit=page_size + 1, **filters)
+            page_transactions = rows[:page_size]
+            has_more = len(rows) > page_size
+            last = page_transactions[-1] if page_transactions else None
+            pagination = {
+                "page_size": page_size,
+                "has_more": has_more,
+                "next_cursor": f"{last['timestamp']},{last['id']}" if has_more else None
+            }
+            if after is None:
+                total = TRANSACTIONS.count(**filters)
+                pagination.update({
+                    "page": page,
+                    "total": total,
+                    "total_pages": (total + page_size - 1) // page_size
+                })
 
-            # 分页处理
+            return {"success": True, "data": page_transactions, "pagination": pagination}
+
+        key = ('blockchain', version, page, page_size, after, tuple(sorted(filters.items())))
+        body, etag = CACHE.page(key, build)
+        self.send_cached_json(body, etag)
+
+    @ROUTES.get('/api/v1/carbon-assets',
+                Param('page', int, min=1),
+                Param('page_size', int, 100, min=1, max=MAX_PAGE_SIZE),
+                Param('limit', int, min=1))
+    def list_carbon_assets(self, page, page_size, limit):
+        version, carbon_assets = self.dataset('carbon_assets', self.generate_ultra_carbon_assets)
+        self.send_list('carbon_assets', version, carbon_assets, page, page_size, limit)
+
+    @ROUTES.get('/api/v1/esg/history',
+                Param('page', int, min=1),
+                Param('page_size', int, 100, min=1, max=MAX_PAGE_SIZE),
+                Param('limit', int, min=1))
+    def list_esg_history(self, page, page_size, limit):
+        version, esg_history = self.dataset('esg_history', self.generate_ultra_esg_history)
+        self.send_list('esg_history', version, esg_history, page, page_size, limit)
+
+    def dataset(self, name, generate):
+        """(版本, 数据)：有 --data 快照时用快照，否则按需生成并缓存"""
+        if name in SNAPSHOTS:
+            return 0, SNAPSHOTS[name]
+        return CACHE.dataset(name, generate)
+
+    def send_list(self, name, version, items, page, page_size, limit):
+        """不带参数时返回整个列表；limit 只取前 N 条；page 按 page_size 分页"""
+        if page is None:
+            if limit is not None:
+                items = items[:limit]
+            self.send_json_list((name, version, limit), items)
+            return
+
+        def build():
             start_idx = (page - 1) * page_size
-            end_idx = start_idx + page_size
-            page_transactions = transactions[start_idx:end_idx]
-
-            response = {
+            return {
                 "success": True,
-                "data": page_transactions,
+                "data": items[start_idx:start_idx + page_size],
                 "pagination": {
                     "page": page,
                     "page_size": page_size,
-                    "total": len(transactions),
-                    "total_pages": (len(transactions) + page_size - 1) // page_size
+                    "total": len(items),
+                    "total_pages": (len(items) + page_size - 1) // page_size
                 }
             }
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
-
-        elif self.path == '/api/v1/carbon-assets':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
-            self.end_headers()
-
-            carbon_assets = self.generate_ultra_carbon_assets()
-            response = {"success": True, "data": carbon_assets, "total": len(carbon_assets)}
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
-
-        elif self.path.startswith('/api/v1/esg/history'):
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
-            self.end_headers()
-
-            esg_history = self.generate_ultra_esg_history()
-            response = {"success": True, "data": esg_history, "total": len(esg_history)}
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
 
-        elif self.path == '/api/system/status':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
-            self.end_headers()
-
-            # 生成动态系统监控数据
-            cpu_usage = random.uniform(25, 85)
-            memory_usage = random.uniform(40, 90)
-            disk_usage = random.uniform(30, 70)
-
-            response = {
-                "status": "operational",
-                "uptime": "30天 15小时 42分钟",
-                "version": "2.0.0",
-                "system_resources": {
-                    "cpu_percent": round(cpu_usage, 1),
-                    "memory_percent": round(memory_usage, 1),
-                    "disk_percent": round(disk_usage, 1),
-                    "network_io": {
-                        "bytes_sent": random.randint(1000000, 5000000),
-                        "bytes_recv": random.randint(2000000, 8000000)
-                    }
+        body, etag = CACHE.page((name, version, page, page_size), build)
+        self.send_cached_json(body, etag)
+
+    @ROUTES.get('/api/system/status')
+    def system_status(self):
+        # 进程资源和最近一小时的请求指标，均为实测值
+        process = METRICS.process()
+        routes = METRICS.routes(3600)
+        total = LatencyStats()
+        for stats in routes.values():
+            total.merge(stats)
+        try:
+            disk = shutil.disk_usage(os.path.dirname(COMPANIES_FILE))
+            disk_percent = round(disk.used / disk.total * 100, 1)
+        except OSError:
+            disk_percent = None
+
+        services = []
+        for name, key in SERVICE_ROUTES:
+            stats = routes.get(key, LatencyStats())
+            summary = stats.summary()
+            services.append({
+                "name": name,
+                "status": "healthy" if summary["error_rate"] < 0.05 else "degraded",
+                "response_time": summary["avg_response_time"],
+                "p95_response_time": summary["p95_response_time"],
+                "calls_last_hour": stats.calls
+            })
+
+        summary = total.summary()
+        response = {
+            "status": "operational",
+            "uptime": format_uptime(time.time() - METRICS.started),
+            "version": "2.0.0",
+            "system_resources": {
+                "cpu_percent": process["cpu_percent"],
+                "memory_percent": process["memory_percent"],
+                "memory_rss_bytes": process["rss_bytes"],
+                "disk_percent": disk_percent,
+                "threads": process["threads"],
+                "network_io": {
+                    "bytes_sent": METRICS.bytes_sent,
+                    "bytes_recv": METRICS.bytes_recv
+                }
+            },
+            "performance_metrics": {
+                "total_calls_last_hour": total.calls,
+                "avg_response_time": summary["avg_response_time"],
+                "p95_response_time": summary["p95_response_time"],
+                "error_rate": summary["error_rate"],
+                "active_connections": self.server.connections(),
+                "in_flight_requests": self.server.in_flight()
+            },
+            "services": services
+        }
+        self.send_json(response)
+
+    @ROUTES.get('/metrics')
+    def prometheus_metrics(self):
+        self.send_prometheus()
+
+    @ROUTES.get('/api/system/metrics',
+                Param('period', str, '1h'),
+                Param('format', str, 'json', choices=('json', 'prometheus')))
+    def system_metrics(self, period, format):
+        if format == 'prometheus':
+            self.send_prometheus()
+            return
+
+        seconds = parse_period(period)
+        if seconds is None or seconds > METRICS_RETENTION * 60:
+            self.send_json({"success": False,
+                            "error": "period 格式应为 30s/5m/1h/1d，最长 %dh" % (METRICS_RETENTION // 60)},
+                           status=400)
+            return
+
+        routes = METRICS.routes(seconds)
+        total = LatencyStats()
+        endpoints = {}
+        for (method, route), stats in sorted(routes.items()):
+            total.merge(stats)
+            endpoints[f"{method} {route}"] = stats.summary()
+
+        summary = total.summary()
+        response = {
+            "period": period,
+            "total_calls": summary["calls"],
+            "total_errors": summary["errors"],
+            "error_rate": summary["error_rate"],
+            "avg_response_time": summary["avg_response_time"],
+            "p50_response_time": summary["p50_response_time"],
+            "p95_response_time": summary["p95_response_time"],
+            "p99_response_time": summary["p99_response_time"],
+            "in_flight_requests": self.server.in_flight(),
+            "active_connections": self.server.connections(),
+            "process": METRICS.process(),
+            "endpoints": endpoints
+        }
+        self.send_json(response)
+
+    @ROUTES.get('/api/system/alerts')
+    def system_alerts(self):
+        # 生成动态告警数据
+        alerts = []
+        if random.random() > 0.7:  # 30%概率有告警
+            alert_types = [
+                {
+                    "type": "性能告警",
+                    "level": "warning",
+                    "message": f"API响应时间异常: {random.uniform(1.5, 3.0):.2f}s",
+                    "metric": "response_time",
+                    "threshold": 2.0
                 },
-                "performance_metrics": {
-                    "total_calls_last_hour": random.randint(800, 2500),
-                    "avg_response_time": round(random.uniform(0.1, 0.5), 3),
-                    "error_rate": round(random.uniform(0.001, 0.025), 4),
-                    "active_connections": random.randint(15, 45)
+                {
+                    "type": "资源告警",
+                    "level": "warning" if random.random() > 0.3 else "error",
+                    "message": f"CPU使用率较高: {random.uniform(75, 95):.1f}%",
+                    "metric": "cpu_usage",
+                    "threshold": 80.0
                 },
-                "services": [
-                    {"name": "ESG评价服务", "status": "healthy", "response_time": 0.245},
-                    {"name": "碳资产估值服务", "status": "healthy", "response_time": 0.189},
-                    {"name": "区块链服务", "status": "healthy", "response_time": 0.156},
-                    {"name": "数据处理服务", "status": "healthy", "response_time": 0.298}
-                ]
-            }
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
-
-        elif self.path.startswith('/api/system/metrics'):
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
-            self.end_headers()
-
-            period = "1h"
-            if '?' in self.path:
-                params = self.path.split('?')[1]
-                if 'period=' in params:
-                    period = params.split('period=')[1].split('&')[0]
-
-            response = {
-                "period": period,
-                "total_calls": random.randint(1200, 3500),
-                "total_errors": random.randint(5, 45),
-                "error_rate": round(random.uniform(0.002, 0.015), 4),
-                "avg_response_time": round(random.uniform(0.15, 0.45), 3),
-                "p95_response_time": round(random.uniform(0.8, 2.5), 3),
-                "endpoints": {
-                    "/api/v1/esg/evaluate": {
-                        "calls": random.randint(300, 800),
-                        "errors": random.randint(1, 8),
-                        "error_rate": round(random.uniform(0.005, 0.020), 4),
-                        "avg_response_time": round(random.uniform(0.3, 0.8), 3)
-                    },
-                    "/api/v1/companies": {
-                        "calls": random.randint(500, 1200),
-                        "errors": random.randint(2, 15),
-                        "error_rate": round(random.uniform(0.002, 0.012), 4),
-                        "avg_response_time": round(random.uniform(0.1, 0.3), 3)
-                    },
-                    "/api/v1/carbon/valuation": {
-                        "calls": random.randint(200, 600),
-                        "errors": random.randint(1, 6),
-                        "error_rate": round(random.uniform(0.003, 0.018), 4),
-                        "avg_response_time": round(random.uniform(0.2, 0.6), 3)
-                    },
-                    "/api/v1/blockchain/transactions": {
-                        "calls": random.randint(100, 400),
-                        "errors": 0,
-                        "error_rate": 0.0,
-                        "avg_response_time": round(random.uniform(0.1, 0.4), 3)
-                    }
+                {
+                    "type": "业务告警",
+                    "level": "info",
+                    "message": f"批量处理任务完成: {random.randint(100, 1000)}条记录",
+                    "metric": "batch_processing",
+                    "threshold": 0
                 }
-            }
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
-
-        elif self.path == '/api/system/alerts':
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
-            self.end_headers()
-
-            # 生成动态告警数据
-            alerts = []
-            if random.random() > 0.7:  # 30%概率有告警
-                alert_types = [
-                    {
-                        "type": "性能告警",
-                        "level": "warning",
-                        "message": f"API响应时间异常: {random.uniform(1.5, 3.0):.2f}s",
-                        "metric": "response_time",
-                        "threshold": 2.0
-                    },
-                    {
-                        "type": "资源告警",
-                        "level": "warning" if random.random() > 0.3 else "error",
-                        "message": f"CPU使用率较高: {random.uniform(75, 95):.1f}%",
-                        "metric": "cpu_usage",
-                        "threshold": 80.0
-                    },
-                    {
-                        "type": "业务告警",
-                        "level": "info",
-                        "message": f"批量处理任务完成: {random.randint(100, 1000)}条记录",
-                        "metric": "batch_processing",
-                        "threshold": 0
-                    }
-                ]
-                alerts = [random.choice(alert_types) for _ in range(random.randint(1, 3))]
-
-            self.wfile.write(json.dumps(alerts, ensure_ascii=False).encode('utf-8'))
-
-        else:
-            super().do_GET()
-
-    def do_POST(self):
-        if self.path == '/api/v1/esg/evaluate':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            try:
-                request_data = json.loads(post_data.decode('utf-8'))
-            except UnicodeDecodeError:
-                request_data = json.loads(post_data.decode('gbk', errors='ignore'))
-
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
-            self.end_headers()
+            ]
+            alerts = [random.choice(alert_types) for _ in range(random.randint(1, 3))]
 
-            # 获取输入参数
-            company_id = request_data.get('company_id', random.randint(1, 156))
+        self.send_json(alerts)
 
-            # 根据company_id获取真实企业信息
-            companies = self.load_real_companies()
-            company_info = None
-            for company in companies:
-                if company['id'] == company_id:
-                    company_info = company
-                    break
-
-            if company_info:
-                company_name = company_info.get('name', f'企业{company_id:03d}')
-                industry = company_info.get('industry', random.choice(['环保技术', '新能源', '制造业', '金融业']))
-            else:
-                company_name = f'企业{company_id:03d}'
-                industry = random.choice(['环保技术', '新能源', '制造业', '金融业'])
-            environmental_score = float(request_data.get('environmental_score', random.uniform(45, 75)))
-            social_score = float(request_data.get('social_score', random.uniform(40, 70)))
-            governance_score = float(request_data.get('governance_score', random.uniform(50, 80)))
-
-            # 根据输入数据计算ESG评分
-            weights = {'environmental': 0.35, 'social': 0.30, 'governance': 0.35}
-            overall_score = (
-                environmental_score * weights['environmental'] +
-                social_score * weights['social'] +
-                governance_score * weights['governance']
-            )
+    @ROUTES.post('/api/v1/esg/evaluate')
+    def evaluate_esg(self):
+        self.send_single(evaluate_esg_batch)
 
-            # 行业调整 (降低调整系数，使分数更现实)
-            industry_adjustments = {
-                '环保技术': 0.95, '新能源': 0.93, '制造业': 0.88, '金融业': 0.90,
-                '农业科技': 0.92, '建筑工程': 0.87, '信息技术': 0.91,
-                '新能源汽车': 0.94, '咨询服务': 0.90, '生物医药': 0.93
-            }
-            industry_factor = industry_adjustments.get(industry, 1.0)
-            adjusted_overall_score = min(overall_score * industry_factor, 100)
+    @ROUTES.post('/api/v1/carbon/valuation')
+    def value_carbon(self):
+        self.send_single(value_carbon_batch)
 
-            # 添加随机波动
-            volatility = random.uniform(-2, 2)
-            final_overall = max(0, min(100, adjusted_overall_score + volatility))
-
-            # 确定评价等级
-            if final_overall >= 90:
-                evaluation_grade = "A+"
-                suggestion = "优秀表现，建议继续保持并发挥行业领导作用"
-            elif final_overall >= 80:
-                evaluation_grade = "A"
-                suggestion = "良好表现，建议在薄弱环节加强改进"
-            elif final_overall >= 70:
-                evaluation_grade = "B+"
-                suggestion = "中等偏上，建议重点改进环境和社会责任"
-            elif final_overall >= 60:
-                evaluation_grade = "B"
-                suggestion = "中等水平，需要全面提升ESG管理"
+    def send_single(self, batch):
+        """单条评价/估值：与批量接口用同一套计算规则，请求体或参数无效时返回 400"""
+        try:
+            item = self.read_json()
+        except (ValueError, TypeError) as e:
+            self.send_json({"success": False, "error": str(e)}, status=400)
+            return
+        if not isinstance(item, dict):
+            self.send_json({"success": False, "error": "请求体应为 JSON 对象"}, status=400)
+            return
+        result = batch([item])[0]
+        if not result["success"]:
+            self.send_json({"success": False, "error": result["error"]}, status=400)
+            return
+        self.send_json({"success": True, "data": result["data"]})
+
+    @ROUTES.post('/api/v1/esg/evaluate:batch')
+    @ROUTES.post('/api/v1/carbon/valuation:batch')
+    def run_batch(self):
+        try:
+            content_length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            content_length = -1
+        if content_length < 0 or content_length > MAX_BATCH_BYTES:
+            # 不读取请求体，保持连接上无法定位下一个请求，响应后关闭连接
+            self.close_connection = True
+            if content_length < 0:
+                self.send_json({"success": False, "error": "Content-Length 无效"}, status=400)
             else:
-                evaluation_grade = "C"
-                suggestion = "需要立即改进ESG管理体系"
-
-            response = {
-                "success": True,
-                "data": {
-                    "company_id": company_id,
-                    "company_name": company_name,
-                    "industry": industry,
-                    "evaluation_id": 1000 + company_id + random.randint(1, 999),
-                    "overall_score": round(final_overall, 1),
-                    "environmental_score": round(environmental_score + volatility, 1),
-                    "social_score": round(social_score + volatility, 1),
-                    "governance_score": round(governance_score + volatility, 1),
-                    "evaluation_grade": evaluation_grade,
-                    "confidence_level": round(random.uniform(0.85, 0.98), 2),
-                    "suggestion": suggestion,
-                    "industry_factor": industry_factor,
-                    "evaluation_method": "federated_learning_with_homomorphic_encryption",
-                    "data_encryption_used": True,
-                    "calculation_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-            }
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
-
-        elif self.path == '/api/v1/carbon/valuation':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            try:
-                request_data = json.loads(post_data.decode('utf-8'))
-            except UnicodeDecodeError:
-                request_data = json.loads(post_data.decode('gbk', errors='ignore'))
-
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json; charset=utf-8')
-            self.add_cors_headers()
-            self.end_headers()
-
-            carbon_type = request_data.get('type', 'cer')
-            amount = float(request_data.get('amount', 1000))
-            project_years = int(request_data.get('project_years', 10))
-
-            base_prices = {'cer': 45.2, 'ccer': 35.8, 'ver': 25.5}
-            base_price = base_prices.get(carbon_type, 40.0)
-
-            # 动态价格计算
-            quantity_factor = 1.0
-            if amount >= 10000: quantity_factor = 1.02
-            elif amount >= 5000: quantity_factor = 1.01
-            elif amount < 100: quantity_factor = 0.97
-
-            years_factor = 1.0 + (project_years - 10) * 0.02
-            market_price = round(base_price * quantity_factor * years_factor, 2)
-            total_value = amount * market_price
-
-            response = {
-                "success": True,
-                "data": {
-                    "asset_type": carbon_type.upper(),
-                    "amount": amount,
-                    "project_years": project_years,
-                    "market_price": market_price,
-                    "total_value": round(total_value, 2),
-                    "base_price": base_price,
-                    "quantity_factor": quantity_factor,
-                    "years_factor": years_factor,
-                    "growth_rate": round(random.uniform(5, 15), 1),
-                    "risk_level": "低" if base_price > 40 else "中",
-                    "valuation_method": "market_based_with_adjustments",
-                    "calculation_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                }
-            }
-            self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+                self.send_json({"success": False, "error": f"请求体不能超过 {MAX_BATCH_BYTES} 字节"}, status=413)
+            return
+        post_data = self.rfile.read(content_length) if content_length else b''
+        try:
+            items, ndjson = parse_batch_items(post_data, self.headers.get('Content-Type', ''))
+        except ValueError as e:
+            self.send_json({"success": False, "error": str(e)}, status=400)
+            return
+        if len(items) > MAX_BATCH_ITEMS:
+            self.send_json({"success": False, "error": f"单次最多 {MAX_BATCH_ITEMS} 条"}, status=413)
+            return
+
+        batch = evaluate_esg_batch if self.path.startswith('/api/v1/esg') else value_carbon_batch
+        ndjson = ndjson or 'ndjson' in self.headers.get('Accept', '')
+        self.stream_batch(items, batch, ndjson)
+
+    @ROUTES.post('/api/v1/cache/invalidate')
+    def invalidate_cache(self):
+        # 主动失效缓存：{"dataset": "blockchain"}，不传时清除全部
+        try:
+            request_data = self.read_json()
+        except ValueError as e:
+            self.send_json({"success": False, "error": str(e)}, status=400)
+            return
+        if not isinstance(request_data, dict):
+            self.send_json({"success": False, "error": "请求体应为 JSON 对象"}, status=400)
+            return
+        dataset = request_data.get('dataset')
+        if dataset is not None and dataset not in DATASETS:
+            self.send_json({"success": False, "error": f"dataset 应为 {'/'.join(DATASETS)} 之一"}, status=400)
+            return
+
+        invalidated = CACHE.invalidate(dataset)
+
+        response = {"success": True, "invalidated": invalidated}
+        self.send_json(response)
+
+    def generate_stats(self):
+        """统计数据：由企业、交易、碳资产和 ESG 历史的实际数据汇总（数据不变时结果不变）"""
+        TRANSACTIONS.seed(self.generate_ultra_blockchain_data)
+        _, carbon_assets = self.dataset('carbon_assets', self.generate_ultra_carbon_assets)
+        _, esg_history = self.dataset('esg_history', self.generate_ultra_esg_history)
+
+        industries_data = [
+            {"name": industry, "count": count, "avg_esg_score": round(avg_score, 1)}
+            for industry, count, avg_score in COMPANIES.industry_summary()
+        ]
 
+        if hasattr(carbon_assets, 'sum'):
+            total_carbon_value = carbon_assets.sum('total_value')
         else:
-            self.send_response(404)
-            self.end_headers()
-
-    def load_real_companies(self):
-        """加载真实的企业数据"""
-        try:
-            with open('companies_data.json', 'r', encoding='utf-8') as f:
-                companies = json.load(f)
-                return companies
-        except Exception as e:
-            print(f"加载真实企业数据失败: {e}")
-            # 如果加载失败，返回少量示例数据
-            return [
-                {
-                    "id": 1,
-                    "name": "氢能源有限责任公司",
-                    "industry": "新能源",
-                    "registration_code": "91322872227500",
-                    "is_active": True,
-                    "established_date": "2015-01-11",
-                    "registered_capital": 157390000,
-                    "employees": 280,
-                    "location": "武汉市洪山区",
-                    "esg_score": 82,
-                    "last_evaluation": "2025-07-19"
-                }
-            ]
+            total_carbon_value = sum(asset['total_value'] for asset in carbon_assets)
+
+        response = {
+            "total_companies": len(COMPANIES.all()),
+            "total_esg_evaluations": len(esg_history),
+            "total_carbon_assets": len(carbon_assets),
+            "total_transactions": TRANSACTIONS.count(),
+            "total_carbon_value": round(total_carbon_value, 2),
+            "system_status": "operational",
+            "industries": industries_data,
+            "last_updated": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+        return response
 
     def generate_ultra_companies(self):
         """生成超大规模企业数据"""
+        rng = random.Random(f"{DATA_SEED}:companies")
         companies = []
         industries = [
             "环保技术", "新能源", "制造业", "金融业", "农业科技", "建筑工程",
@@ -522,13 +1870,13 @@ class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
         ]
 
         for i in range(1, 157):
-            prefix = random.choice(company_prefixes)
-            middle = f"{random.choice(['华', '创', '绿', '清', '新', '智'])}{i:03d}"
-            suffix = random.choice(company_suffixes)
+            prefix = rng.choice(company_prefixes)
+            middle = f"{rng.choice(['华', '创', '绿', '清', '新', '智'])}{i:03d}"
+            suffix = rng.choice(company_suffixes)
             company_name = f"{prefix}{middle}{suffix}有限公司"
 
-            registration_code = f"91{random.randint(100000, 999999)}{random.randint(10000000, 99999999)}"
-            industry = random.choice(industries)
+            registration_code = f"91{rng.randint(100000, 999999)}{rng.randint(10000000, 99999999)}"
+            industry = rng.choice(industries)
 
             base_score = {
                 "环保技术": 68, "新能源": 71, "制造业": 58, "金融业": 63,
@@ -536,34 +1884,34 @@ class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
                 "新能源汽车": 69, "生物医药": 66, "金融科技": 67, "化工材料": 52
             }.get(industry, 62)
 
-            esg_score = base_score + random.randint(-15, 15)
+            esg_score = base_score + rng.randint(-15, 15)
             esg_score = max(35, min(92, esg_score))
 
-            years_ago = random.randint(3, 25)
-            established_date = (datetime.now() - timedelta(days=years_ago * 365)).strftime("%Y-%m-%d")
+            years_ago = rng.randint(3, 25)
+            established_date = (DATA_REFERENCE_TIME - timedelta(days=years_ago * 365)).strftime("%Y-%m-%d")
 
-            capital = random.randint(1000, 100000)
-            employees = random.randint(50, 5000)
+            capital = rng.randint(1000, 100000)
+            employees = rng.randint(50, 5000)
 
-            last_eval_days = random.randint(1, 120)
-            last_evaluation = (datetime.now() - timedelta(days=last_eval_days)).strftime("%Y-%m-%d")
+            last_eval_days = rng.randint(1, 120)
+            last_evaluation = (DATA_REFERENCE_TIME - timedelta(days=last_eval_days)).strftime("%Y-%m-%d")
 
             company = {
                 "id": i,
                 "name": company_name,
                 "industry": industry,
                 "registration_code": registration_code,
-                "is_active": random.choice([True, True, True, False]),
+                "is_active": rng.choice([True, True, True, False]),
                 "established_date": established_date,
                 "registered_capital": capital * 10000,
                 "employees": employees,
-                "location": random.choice(cities) + random.choice(["市", "区"]),
+                "location": rng.choice(cities) + rng.choice(["市", "区"]),
                 "esg_score": round(esg_score, 1),
                 "last_evaluation": last_evaluation,
-                "annual_revenue": capital * random.uniform(0.5, 3.0) * 10000,
-                "carbon_assets": random.randint(0, 50) if industry in ["新能源", "环保技术"] else random.randint(0, 20),
-                "contact_person": random.choice(["张经理", "李总", "王主任"]),
-                "contact_phone": f"1{random.choice([3,4,5,6,7,8,9])}{random.randint(100000000, 999999999)}"
+                "annual_revenue": capital * rng.uniform(0.5, 3.0) * 10000,
+                "carbon_assets": rng.randint(0, 50) if industry in ["新能源", "环保技术"] else rng.randint(0, 20),
+                "contact_person": rng.choice(["张经理", "李总", "王主任"]),
+                "contact_phone": f"1{rng.choice([3,4,5,6,7,8,9])}{rng.randint(100000000, 999999999)}"
             }
             companies.append(company)
 
@@ -571,51 +1919,52 @@ class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
 
     def generate_ultra_blockchain_data(self):
         """生成超大规模区块链数据"""
+        rng = random.Random(f"{DATA_SEED}:transactions")
         transactions = []
         transaction_types = [
             "ESG评价记录", "碳资产交易", "企业信息更新", "数据验证", "智能合约执行",
             "碳信用发行", "资产抵押", "数据共享授权", "审计记录", "合规检查"
         ]
 
-        base_time = datetime.now() - timedelta(days=60)
+        base_time = DATA_REFERENCE_TIME - timedelta(days=60)
 
         for i in range(1, 1248):
-            tx_type = random.choice(transaction_types)
+            tx_type = rng.choice(transaction_types)
             block_number = 1000 + i
-            gas_used = random.randint(21000, 150000)
-            gas_price = random.randint(10000000000, 50000000000)
+            gas_used = rng.randint(21000, 150000)
+            gas_price = rng.randint(10000000000, 50000000000)
 
-            days_offset = random.randint(0, 60 * 24 * 60)
+            days_offset = rng.randint(0, 60 * 24 * 60)
             timestamp = base_time + timedelta(minutes=days_offset)
 
             transaction = {
                 "id": i,
-                "transaction_hash": f"0x{random.randint(0, 2**128):032x}",
+                "transaction_hash": f"0x{rng.randint(0, 2**128):032x}",
                 "block_number": block_number,
                 "transaction_type": tx_type,
-                "from_address": f"0x{random.randint(0, 2**64):016x}",
-                "to_address": f"0x{random.randint(0, 2**64):016x}",
-                "amount": random.randint(0, 1000000) if "交易" in tx_type else 0,
+                "from_address": f"0x{rng.randint(0, 2**64):016x}",
+                "to_address": f"0x{rng.randint(0, 2**64):016x}",
+                "amount": rng.randint(0, 1000000) if "交易" in tx_type else 0,
                 "gas_used": gas_used,
                 "gas_price": gas_price,
                 "gas_fee": gas_used * gas_price,
                 "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
-                "status": "confirmed" if random.random() > 0.08 else "pending",
+                "status": "confirmed" if rng.random() > 0.08 else "pending",
                 "data": {}
             }
 
             if tx_type == "ESG评价记录":
                 transaction["data"] = {
-                    "company_id": random.randint(1, 500),
-                    "esg_score": round(random.uniform(45, 85), 1),
-                    "confidence_level": round(random.uniform(0.75, 0.95), 2)
+                    "company_id": rng.randint(1, 500),
+                    "esg_score": round(rng.uniform(45, 85), 1),
+                    "confidence_level": round(rng.uniform(0.75, 0.95), 2)
                 }
             elif tx_type == "碳资产交易":
                 transaction["data"] = {
-                    "asset_type": random.choice(["CER", "CCER", "VER", "GCER"]),
-                    "quantity": random.randint(100, 50000),
-                    "price_per_ton": round(random.uniform(25, 120), 2),
-                    "project_location": random.choice(["内蒙古", "新疆", "江苏", "广东", "四川"])
+                    "asset_type": rng.choice(["CER", "CCER", "VER", "GCER"]),
+                    "quantity": rng.randint(100, 50000),
+                    "price_per_ton": round(rng.uniform(25, 120), 2),
+                    "project_location": rng.choice(["内蒙古", "新疆", "江苏", "广东", "四川"])
                 }
 
             transactions.append(transaction)
@@ -628,6 +1977,7 @@ class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
 
     def generate_ultra_carbon_assets(self):
         """生成超大规模碳资产数据"""
+        rng = random.Random(f"{DATA_SEED}:carbon_assets")
         assets = []
         project_types = [
             "风力发电", "光伏发电", "林业碳汇", "甲烷回收", "生物质能",
@@ -638,48 +1988,48 @@ class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
         asset_types = ["CER", "CCER", "VER", "GCER"]
 
         for i in range(1, 188):
-            province = random.choice(provinces)
-            asset_type = random.choice(asset_types)
+            province = rng.choice(provinces)
+            asset_type = rng.choice(asset_types)
 
             # 根据不同碳信用标准调整项目类型和价格
             if asset_type == "CER":
                 # CER (Certified Emission Reduction) - UNFCCC认证，主要大型项目
                 cer_projects = ["风力发电", "光伏发电", "水力发电", "地热能"]
-                project_type = random.choice(cer_projects)
-                base_price = random.choice([58.9, 62.3, 55.7, 59.8])
-                amount = random.randint(15000, 85000)
+                project_type = rng.choice(cer_projects)
+                base_price = rng.choice([58.9, 62.3, 55.7, 59.8])
+                amount = rng.randint(15000, 85000)
             elif asset_type == "CCER":
                 # CCER (Chinese Certified Emission Reduction) - 中国核证减排量
                 ccER_projects = ["林业碳汇", "光伏发电", "生物质能", "甲烷回收", "节能改造"]
-                project_type = random.choice(ccER_projects)
-                base_price = random.choice([45.2, 42.8, 48.6, 44.1])
-                amount = random.randint(8000, 60000)
+                project_type = rng.choice(ccER_projects)
+                base_price = rng.choice([45.2, 42.8, 48.6, 44.1])
+                amount = rng.randint(8000, 60000)
             elif asset_type == "VER":
                 # VER (Verified Emission Reduction) - 自愿市场核证减排量
                 ver_projects = ["林业碳汇", "甲烷回收", "节能改造", "生物质能"]
-                project_type = random.choice(ver_projects)
-                base_price = random.choice([28.5, 32.1, 25.8, 30.7])
-                amount = random.randint(3000, 35000)
+                project_type = rng.choice(ver_projects)
+                base_price = rng.choice([28.5, 32.1, 25.8, 30.7])
+                amount = rng.randint(3000, 35000)
             else:  # GCER
                 # GCER (Gold Standard Certified Emission Reduction) - 黄金标准认证
                 gcer_projects = ["风力发电", "光伏发电", "林业碳汇", "生物质能"]
-                project_type = random.choice(gcer_projects)
-                base_price = random.choice([68.4, 72.1, 65.8, 70.3])
-                amount = random.randint(5000, 45000)
+                project_type = rng.choice(gcer_projects)
+                base_price = rng.choice([68.4, 72.1, 65.8, 70.3])
+                amount = rng.randint(5000, 45000)
 
-            price = base_price * (1 + random.uniform(-0.15, 0.20))
+            price = base_price * (1 + rng.uniform(-0.15, 0.20))
 
-            project_years = random.randint(7, 25)
-            cert_days_ago = random.randint(30, 365 * 5)
-            cert_date = datetime.now() - timedelta(days=cert_days_ago)
+            project_years = rng.randint(7, 25)
+            cert_days_ago = rng.randint(30, 365 * 5)
+            cert_date = DATA_REFERENCE_TIME - timedelta(days=cert_days_ago)
             expiry_date = cert_date + timedelta(days=project_years * 365)
 
             asset = {
                 "id": i,
                 "asset_name": f"{project_type}减排量",
                 "project_name": f"{province}{project_type}项目{i:03d}",
-                "project_id": f"PRJ{random.randint(10000, 99999)}",
-                "asset_type": random.choice(asset_types),
+                "project_id": f"PRJ{rng.randint(10000, 99999)}",
+                "asset_type": rng.choice(asset_types),
                 "amount": amount,
                 "current_price": round(price, 2),
                 "total_value": round(amount * price, 2),
@@ -687,10 +2037,10 @@ class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
                 "certification_date": cert_date.strftime("%Y-%m-%d"),
                 "expiry_date": expiry_date.strftime("%Y-%m-%d"),
                 "location": province,
-                "owner_id": random.randint(1, 500),
-                "status": random.choice(["active", "pending", "expired"]),
-                "methodology": random.choice(["AMS-I.D.", "AMS-III.D.", "ACM0002"]),
-                "project_developer": random.choice(["中节能", "国电投", "华能", "大唐", "华电"])
+                "owner_id": rng.randint(1, 500),
+                "status": rng.choice(["active", "pending", "expired"]),
+                "methodology": rng.choice(["AMS-I.D.", "AMS-III.D.", "ACM0002"]),
+                "project_developer": rng.choice(["中节能", "国电投", "华能", "大唐", "华电"])
             }
             assets.append(asset)
 
@@ -698,15 +2048,16 @@ class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
 
     def generate_ultra_esg_history(self):
         """生成超大规模ESG评价历史数据"""
+        rng = random.Random(f"{DATA_SEED}:esg_history")
         history = []
-        base_time = datetime.now() - timedelta(days=365 * 2)
+        base_time = DATA_REFERENCE_TIME - timedelta(days=365 * 2)
 
         for i in range(1, 2157):
-            days_offset = random.randint(0, 365 * 2)
+            days_offset = rng.randint(0, 365 * 2)
             eval_time = base_time + timedelta(days=days_offset)
 
-            company_id = random.randint(1, 156)
-            overall_score = round(random.uniform(42, 91), 1)
+            company_id = rng.randint(1, 156)
+            overall_score = round(rng.uniform(42, 91), 1)
 
             if overall_score >= 90:
                 grade = "A+"
@@ -723,15 +2074,15 @@ class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
                 "id": i,
                 "company_id": company_id,
                 "company_name": f"企业{company_id:03d}",
-                "industry": random.choice(["环保技术", "新能源", "制造业", "金融业", "农业科技"]),
+                "industry": rng.choice(["环保技术", "新能源", "制造业", "金融业", "农业科技"]),
                 "evaluation_date": eval_time.strftime("%Y-%m-%d"),
                 "overall_score": overall_score,
-                "environmental_score": round(random.uniform(60, 98), 1),
-                "social_score": round(random.uniform(62, 96), 1),
-                "governance_score": round(random.uniform(68, 99), 1),
+                "environmental_score": round(rng.uniform(60, 98), 1),
+                "social_score": round(rng.uniform(62, 96), 1),
+                "governance_score": round(rng.uniform(68, 99), 1),
                 "grade": grade,
-                "confidence_level": round(random.uniform(0.75, 0.99), 2),
-                "risk_level": random.choice(["低", "中", "高"])
+                "confidence_level": round(rng.uniform(0.75, 0.99), 2),
+                "risk_level": rng.choice(["低", "中", "高"])
             }
             history.append(record)
 
@@ -741,40 +2092,135 @@ class UltraESGAPIHandler(http.server.SimpleHTTPRequestHandler):
 
         return history
 
-def start_server():
-    with socketserver.TCPServer(("", PORT), UltraESGAPIHandler) as httpd:
-        try:
-            print(f"超大规模双碳比赛系统启动在 http://localhost:{PORT}")
-            print(f"系统状态: http://localhost:{PORT}/health")
-            print(f"统计数据: http://localhost:{PORT}/stats")
-            print(f"前端界面: simple_frontend.html")
-            print("=" * 60)
-            print("数据规模:")
-            print("  - 企业数量: 156 家")
-            print("  - 区块链交易: 1247 条")
-            print("  - 碳资产项目: 187 个")
-            print("  - ESG评价记录: 2156 条")
-            print("=" * 60)
-            print("按 Ctrl+C 停止服务器")
-        except UnicodeEncodeError:
-            print(f"Ultra-scale ESG System started at http://localhost:{PORT}")
-            print(f"System status: http://localhost:{PORT}/health")
-            print(f"Statistics: http://localhost:{PORT}/stats")
-            print("=" * 60)
+class OfflineServer:
+    """不经过网络调用路由时代替 UltraESGHTTPServer"""
+    stopping = False
+
+    def in_flight(self):
+        return 0
+
+    def connections(self):
+        return 0
+
+def call_route(method, path, body=b'', headers=None):
+    """不经过网络直接调用一个路由，返回 (状态码, 原始响应字节)"""
+    handler = UltraESGAPIHandler.__new__(UltraESGAPIHandler)
+    handler.server = OfflineServer()
+    handler.client_address = ('127.0.0.1', 0)
+    handler.directory = os.getcwd()
+    handler.command, handler.path, handler.request_version = method, path, 'HTTP/1.1'
+    handler.requestline = f'{method} {path} HTTP/1.1'
+    handler.close_connection = True
+    handler.matched_route = 'other'
+    handler._status = None
+    handler.log_request = lambda *args: None
+
+    handler.headers = http.client.HTTPMessage()
+    for name, value in (headers or {}).items():
+        handler.headers[name] = value
+    if body:
+        handler.headers['Content-Length'] = str(len(body))
+    handler.rfile = io.BytesIO(body)
+    handler.wfile = io.BytesIO()
+
+    getattr(handler, 'do_' + method)()
+    return handler._status, handler.wfile.getvalue()
+
+def benchmark_route(method, path, body=b'', headers=None, repeat=1000):
+    """单独压测一个路由：不经过网络和线程池，只计路由分发、参数解析和处理函数本身"""
+    call_route(method, path, body, headers)  # 预热：生成数据集和缓存
+    timings = []
+    statuses = {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        status, _ = call_route(method, path, body, headers)
+        timings.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    timings.sort()
+    total = sum(timings)
+    def percentile(q):
+        return timings[min(len(timings) - 1, int(q * len(timings)))]
+    return {
+        "route": f"{method} {path}",
+        "repeat": repeat,
+        "statuses": statuses,
+        "requests_per_second": round(repeat / total, 1) if total else None,
+        "avg_ms": round(total / repeat * 1000, 4),
+        "p50_ms": round(percentile(0.50) * 1000, 4),
+        "p95_ms": round(percentile(0.95) * 1000, 4),
+        "p99_ms": round(percentile(0.99) * 1000, 4),
+    }
+
+def start_server(rows=None, port=PORT):
+    """rows 为各表的行数（--data 快照），不传时为内置示例数据的规模"""
+    rows = rows or {"companies": len(COMPANIES.all()), "transactions": 1247,
+                    "carbon_assets": 187, "esg_history": 2156}
+    httpd = UltraESGHTTPServer(("", port), UltraESGAPIHandler)
+    COMPANIES.watch()
+    stopper = threading.Thread(target=httpd.graceful_shutdown)
+
+    def stop(signum, frame):
+        # shutdown() 会等待 serve_forever() 退出，不能在主线程（信号处理）里直接调用
+        if not httpd.stopping:
+            httpd.stopping = True
+            stopper.start()
+
+    # Ctrl+C 和 kill 都走优雅停止：不再接受新连接，处理中的请求完成后退出
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
 
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            try:
-                print("\n服务器已停止")
-            except UnicodeEncodeError:
-                print("\nServer stopped")
+    try:
+        print(f"超大规模双碳比赛系统启动在 http://localhost:{port}")
+        print(f"系统状态: http://localhost:{port}/health")
+        print(f"统计数据: http://localhost:{port}/stats")
+        print(f"前端界面: simple_frontend.html")
+        print("=" * 60)
+        print("数据规模:")
+        print(f"  - 企业数量: {rows['companies']} 家")
+        print(f"  - 区块链交易: {rows['transactions']} 条")
+        print(f"  - 碳资产项目: {rows['carbon_assets']} 个")
+        print(f"  - ESG评价记录: {rows['esg_history']} 条")
+        print(f"同时处理请求: {MAX_WORKERS}，最大连接数: {MAX_CONNECTIONS}")
+        print("=" * 60)
+        print("按 Ctrl+C 停止服务器")
+    except UnicodeEncodeError:
+        print(f"Ultra-scale ESG System started at http://localhost:{port}")
+        print(f"System status: http://localhost:{port}/health")
+        print(f"Statistics: http://localhost:{port}/stats")
+        print("=" * 60)
+
+    httpd.serve_forever()
+    stopper.join()
+    try:
+        print("\n服务器已停止")
+    except UnicodeEncodeError:
+        print("\nServer stopped")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="超大规模双碳比赛系统 Ultra API")
+    parser.add_argument('--bench', nargs='+', metavar='PATH',
+                        help="不启动服务器，单独压测路由，如 --bench /api/v1/companies?page=2 /stats")
+    parser.add_argument('--method', default='GET', help="压测使用的请求方法（默认 GET）")
+    parser.add_argument('--body', default='', help="压测 POST 接口时的请求体（JSON）")
+    parser.add_argument('--repeat', type=int, default=1000, help="每个路由调用的次数（默认 1000）")
+    parser.add_argument('--port', type=int, default=PORT, help=f"监听端口（默认 {PORT}）")
+    parser.add_argument('--data', metavar='DIR',
+                        help="使用 ultra_data.py 生成的大规模快照目录（需要 NumPy），如 --data .cache/snapshots")
+    args = parser.parse_args()
+    rows = use_snapshots(args.data) if args.data else None
+    if args.bench:
+        headers = {'Content-Type': 'application/json'} if args.body else None
+        for path in args.bench:
+            result = benchmark_route(args.method.upper(), path, args.body.encode('utf-8'),
+                                     headers, args.repeat)
+            print(json.dumps(result, ensure_ascii=False))
+        sys.exit(0)
+
     try:
         print("超大规模双碳比赛系统")
         print("=" * 40)
     except UnicodeEncodeError:
         print("Ultra-scale ESG System")
         print("=" * 40)
-    start_server()
\ No newline at end of file
+    start_server(rows, args.port)
\ No newline at end of file
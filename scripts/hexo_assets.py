@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Hexo 同步的附件处理
+把日记中的 Obsidian 嵌入 ![[...]] 解析到 Attachments/ 中的文件，复制到 Hexo 并改写为 Markdown 链接：
+
+- 按内容哈希命名（同一张图被多篇日记引用、或改名后再次引用，都只复制一次）
+- 安装了 Pillow 时为图片生成缩放后的 WebP 版本（![[图.png|400]] 指定宽度）；
+  GIF（可能是动图）和 SVG（矢量图）按原格式复制
+- ![[某篇笔记]] 是笔记嵌入（transclusion），保持原样，不当作缺失的附件
+- 输出文件名由内容哈希和宽度决定，已存在即视为已生成，重复同步不会重新编码
+- 附件哈希按 (mtime, size) 缓存在同步清单中，未变化的大文件不会重新读取
+- 复制和编码在线程池中进行（Pillow 缩放/编码时会释放 GIL）
+
+Pillow 为可选依赖：pip install Pillow；未安装时图片按原格式复制。
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# ![[文件名]]、![[文件名|400]]、![[文件名|说明]]、![[笔记#标题]]
+EMBED_RE = re.compile(r'!\[\[([^\]|#^]+)(?:[#^][^\]|]*)?(?:\|([^\]]*))?\]\]')
+SIZE_RE = re.compile(r'^(\d+)(?:x\d+)?$')
+
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".bmp", ".tif", ".tiff", ".webp", ".gif", ".svg"}
+# 只有这些格式重新编码为 WebP
+WEBP_EXTS = IMAGE_EXTS - {".gif", ".svg"}
+# 无扩展名或 .md 的嵌入是笔记
+NOTE_EXTS = {"", ".md"}
+MAX_IMAGE_WIDTH = 1600  # WebP 版本的最大宽度（更小的图不放大）
+WEBP_QUALITY = 82
+
+
+def _write_atomic(dest: Path, write: Callable[[Path], None]):
+    """write(临时路径) 写完后重命名为 dest，中断时不留下半个文件"""
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".tmp")
+    os.close(fd)
+    try:
+        write(Path(tmp))
+        os.chmod(tmp, 0o644)  # mkstemp 创建的文件是 0600
+        os.replace(tmp, dest)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def _build_asset(src: Path, dest: Path, width: int | None):
+    """复制原文件，或生成缩放后的 WebP（在线程池中运行）"""
+    if width is None:
+        _write_atomic(dest, lambda tmp: shutil.copyfile(src, tmp))
+        return
+
+    def encode(tmp: Path):
+        with Image.open(src) as img:
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info or "A" in img.mode else "RGB")
+            if img.width > width:
+                img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+            img.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+
+    _write_atomic(dest, encode)
+
+
+class AssetPipeline:
+    """解析嵌入、改写链接，并把需要的附件生成到 Hexo 资源目录"""
+
+    def __init__(self, vault_dir: Path, attachments_dir: Path, output_dir: Path,
+                 url_prefix: str, hash_cache: dict[str, list]):
+        self.vault_dir = Path(vault_dir)
+        self.attachments_dir = Path(attachments_dir)
+        self.output_dir = Path(output_dir)
+        self.url_prefix = url_prefix.rstrip("/") + "/"
+        # 绝对路径 -> [mtime_ns, size, sha256]，随同步清单保存
+        self.hash_cache = hash_cache
+
+        self._by_name: dict[str, Path] | None = None
+        self._lock = threading.Lock()
+        # 输出文件名 -> (源文件, WebP 宽度或 None)
+        self.pending: dict[str, tuple[Path, int | None]] = {}
+        self.missing: set[str] = set()
+
+    # ==================== 解析 ====================
+
+    def _name_index(self) -> dict[str, Path]:
+        """附件目录下 文件名 -> 路径（Obsidian 默认按最短路径即文件名引用）"""
+        with self._lock:
+            if self._by_name is None:
+                index = {}
+                if self.attachments_dir.is_dir():
+                    for path in sorted(self.attachments_dir.rglob("*")):
+                        if path.is_file():
+                            index.setdefault(path.name, path)
+                self._by_name = index
+            return self._by_name
+
+    def resolve(self, target: str) -> Path | None:
+        """嵌入目标 -> 附件路径；支持文件名、相对附件目录或知识库根目录的路径"""
+        target = target.strip()
+        for base in (self.attachments_dir, self.vault_dir):
+            path = base / target
+            if path.is_file():
+                return path
+        return self._name_index().get(Path(target).name)
+
+    def content_hash(self, path: Path) -> str:
+        key = str(path)
+        st = path.stat()
+        cached = self.hash_cache.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        sha = digest.hexdigest()
+        with self._lock:
+            self.hash_cache[key] = [st.st_mtime_ns, st.st_size, sha]
+        return sha
+
+    def _plan(self, path: Path, size: str | None) -> str:
+        """登记需要生成的输出文件，返回其文件名"""
+        sha = self.content_hash(path)[:16]
+        ext = path.suffix.lower()
+
+        if Image is not None and ext in WEBP_EXTS:
+            match = SIZE_RE.match(size or "")
+            width = min(int(match.group(1)), MAX_IMAGE_WIDTH) if match else MAX_IMAGE_WIDTH
+            name, width = f"{sha}-w{width}.webp", width
+        else:
+            name, width = f"{sha}{ext}", None
+
+        with self._lock:
+            self.pending.setdefault(name, (path, width))
+        return name
+
+    def rewrite(self, body: str) -> tuple[str, list[str]]:
+        """把嵌入改写为 Hexo 链接，返回 (正文, 引用的输出文件名)
+
+        找不到的附件嵌入保持原样并记录到 missing；笔记嵌入保持原样。
+        """
+        outputs = []
+
+        def replace(match: re.Match) -> str:
+            target, option = match.group(1), match.group(2)
+            path = self.resolve(target)
+            if path is None:
+                if Path(target.strip()).suffix.lower() in NOTE_EXTS:
+                    return match.group(0)
+                with self._lock:
+                    self.missing.add(target.strip())
+                return match.group(0)
+
+            name = self._plan(path, option)
+            outputs.append(name)
+            url = self.url_prefix + name
+            # |400 是尺寸，其他内容作为图片说明
+            label = option if option and not SIZE_RE.match(option) else path.stem
+            if path.suffix.lower() in IMAGE_EXTS:
+                return f"![{label}]({url})"
+            return f"[{label}]({url})"
+
+        if "![[" not in body:
+            return body, outputs
+        return EMBED_RE.sub(replace, body), outputs
+
+    # ==================== 生成 ====================
+
+    def process(self, jobs: int = 1) -> dict[str, int]:
+        """生成尚不存在的输出文件，返回 {generated, cached, failed}"""
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        todo = [(self.output_dir / name, src, width)
+                for name, (src, width) in sorted(self.pending.items())
+                if not (self.output_dir / name).exists()]
+        counts = {"generated": 0, "cached": len(self.pending) - len(todo), "failed": 0}
+
+        def build(item):
+            dest, src, width = item
+            try:
+                _build_asset(src, dest, width)
+                return True
+            except (OSError, ValueError) as e:
+                print(f"  ❌ 附件 {src.name}: {e}")
+                return False
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            for ok in pool.map(build, todo):
+                counts["generated" if ok else "failed"] += 1
+        return counts
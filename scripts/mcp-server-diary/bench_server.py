@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Diary MCP Server 基准测试
+生成 100 / 1k / 10k / 100k 篇合成日记（与真实日记相同的 frontmatter 和"精力 x/10，情绪 y/10"格式），
+对每个工具分别测量冷调用和热调用耗时（p50/p95）以及峰值内存，结果保存为 JSON，便于对比不同提交。
+
+用法：
+    python bench_server.py                              # 默认规模 100,1000,10000,100000
+    python bench_server.py --sizes 100,1000 --repeat 50
+    python bench_server.py --output before.json
+    python bench_server.py --output after.json --compare before.json
+    python bench_server.py --sizes 10000 --profile      # 额外保存热调用的 cProfile 结果
+
+说明：
+- 每个规模在独立子进程中运行，峰值 RSS 互不影响
+- build：空缓存时首次扫描 + 调用（全部解析 + 建索引）
+- cold：缓存已存在时重启服务后的首次扫描 + 调用（从 SQLite 载入 + 建内存索引）
+- warm：同一进程内重复调用
+- 直接调用 diary_server.run_tool()（工具线程池中执行的同一函数），便于 cProfile 采样
+- 导入 diary_server 不会初始化正式知识库；扫描只在 build/cold 阶段显式执行一次，
+  与服务中由文件监听维护索引一致，warm 样本不含全量扫描
+- 合成知识库按规模缓存在 --workdir 下，重复运行不会重新生成
+"""
+
+import argparse
+import cProfile
+import json
+import math
+import platform
+import pstats
+import random
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DEFAULT_SIZES = [100, 1000, 10000, 100000]
+DEFAULT_WORKDIR = Path(__file__).resolve().parent / ".cache" / "bench"
+
+# 被测工具及参数
+TOOL_CALLS = [
+    ("list_diaries", {"limit": 10}),
+    ("search_diaries", {"keyword": "小程序", "limit": 5}),
+    ("search_by_state", {"min_energy": 7, "min_mood": 7}),
+    ("get_habits_summary", {"days": 7}),
+]
+
+# 合成正文用的素材
+TOPICS = ["小程序", "小论文", "软著", "知识库", "导师任务", "YOLO", "DETR", "比赛", "复习", "读书"]
+ACTIVITIES = ["修复bug", "写文档", "看论文", "跑实验", "整理笔记", "开会讨论", "部署上线", "画图", "调参"]
+MEALS = ["鸡腿饭", "牛肉面", "小炒肉盖饭", "麻辣烫", "饺子", "沙拉"]
+FEELINGS = ["早睡早起好好努力。", "完成比完美更重要。", "专注一件事。", "保持节奏，不要焦虑。", "多运动多喝水。"]
+
+
+# ==================== 合成知识库 ====================
+
+def render_diary(day: date, rng: random.Random) -> str:
+    """按真实日记的结构生成一篇日记"""
+    topics = rng.sample(TOPICS, 3)
+    energy, mood = rng.randint(3, 10), rng.randint(3, 10)
+    done = lambda: "✅" if rng.random() < 0.7 else "❌"
+
+    lines = [
+        "---",
+        f"title: {day.year}年{day.month}月{day.day}日",
+        f"date: {day.isoformat()} 00:00:00",
+        "tags:",
+        "  - 日记",
+        "cover: /img/riji.png",
+        f"abbrlink: {rng.getrandbits(32):08x}",
+        "---",
+        "",
+        "## 昨日计划完成情况",
+        "",
+    ]
+    for topic in topics:
+        lines.append(f"- [{'x' if rng.random() < 0.7 else ' '}] {topic}：{rng.choice(ACTIVITIES)}")
+    lines += ["", "## 今日记录", ""]
+    for topic in topics:
+        lines.append(f"### {topic}")
+        for _ in range(rng.randint(2, 5)):
+            lines.append(f"- {rng.choice(ACTIVITIES)}，{rng.choice(TOPICS)}相关")
+        lines.append("")
+    lines += [
+        "## 状态",
+        "",
+        f"精力 {energy}/10，情绪 {mood}/10",
+        "",
+        "## 习惯打卡",
+        "",
+        "| 项目 | 完成情况 |",
+        "|------|----------|",
+        f"| 小论文 | {done()} 看了{rng.randint(1, 3)}篇论文 |",
+        f"| 运动 | {done()} 散步{rng.randint(10, 60)}分钟 |",
+        f"| 喝水 | {done()} {rng.randint(1, 3)}L |",
+        f"| 饮食 | 午：{rng.choice(MEALS)} / 晚：{rng.choice(MEALS)} |",
+        "",
+        "## 感悟",
+        "",
+        f"> **{rng.choice(FEELINGS)}**",
+        "",
+        "## 明日计划",
+        "",
+        f"- [ ] {rng.choice(TOPICS)}：{rng.choice(ACTIVITIES)}",
+        "",
+    ]
+    return "\n".join(lines)
+
+
+def generate_vault(workdir: Path, size: int, seed: int = 42) -> Path:
+    """生成（或复用）size 篇日记的合成知识库，按月份分文件夹"""
+    vault = workdir / f"vault-{size}"
+    marker = vault / ".complete"
+    if marker.exists():
+        return vault
+    if vault.exists():
+        shutil.rmtree(vault)
+
+    rng = random.Random(seed)
+    last = date(2026, 2, 10)
+    for i in range(size):
+        day = last - timedelta(days=size - 1 - i)
+        month_dir = vault / "01-Daily" / f"{day.year:04d}-{day.month:02d}"
+        month_dir.mkdir(parents=True, exist_ok=True)
+        (month_dir / f"{day.isoformat()}.md").write_text(render_diary(day, rng), encoding="utf-8")
+
+    marker.write_text(datetime.now().isoformat(), encoding="utf-8")
+    return vault
+
+
+# ==================== 单个规模（子进程） ====================
+
+def percentile(samples: list[float], pct: float) -> float:
+    """最近秩法百分位"""
+    ordered = sorted(samples)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def timed_call(server, name: str, arguments: dict) -> float:
+    start = time.perf_counter()
+    server.run_tool(name, arguments, threading.Event())
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_size(vault: Path, size: int, repeat: int, profile_path: Path | None) -> dict:
+    """在当前进程中测量一个规模，返回结果字典"""
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    import diary_server
+
+    cache_db = vault.parent / f"cache-{size}.sqlite3"
+    cache_db.unlink(missing_ok=True)
+
+    # build：空缓存，首次调用完成全部解析和索引
+    start = time.perf_counter()
+    diary_server.init_vault(vault, cache_db)
+    diary_server.vault.refresh(True)
+    diary_server.run_tool("list_diaries", {"limit": 1}, threading.Event())
+    build_ms = (time.perf_counter() - start) * 1000
+
+    tools = {}
+    for name, arguments in TOOL_CALLS:
+        # cold：缓存已写入，模拟重启服务后的第一次调用
+        diary_server.diary_cache.close()
+        start = time.perf_counter()
+        diary_server.init_vault(vault, cache_db)
+        diary_server.vault.refresh(True)
+        diary_server.run_tool(name, arguments, threading.Event())
+        cold_ms = (time.perf_counter() - start) * 1000
+
+        warm = [timed_call(diary_server, name, arguments) for _ in range(repeat)]
+        tools[name] = {
+            "arguments": arguments,
+            "cold_ms": round(cold_ms, 3),
+            "warm_p50_ms": round(percentile(warm, 50), 3),
+            "warm_p95_ms": round(percentile(warm, 95), 3),
+            "warm_mean_ms": round(sum(warm) / len(warm), 3),
+        }
+
+    if profile_path is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        for name, arguments in TOOL_CALLS:
+            for _ in range(repeat):
+                diary_server.run_tool(name, arguments, threading.Event())
+        profiler.disable()
+        profiler.dump_stats(str(profile_path))
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(15)
+
+    diary_server.diary_cache.close()
+    return {
+        "size": size,
+        "build_ms": round(build_ms, 3),
+        "peak_rss_mb": peak_rss_mb(),
+        "tools": tools,
+    }
+
+
+# ==================== 汇总 ====================
+
+def git_revision() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=Path(__file__).resolve().parent, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def run_size_subprocess(vault: Path, size: int, repeat: int, profile_path: Path | None) -> dict:
+    """在子进程中测量一个规模，峰值 RSS 只包含该规模"""
+    cmd = [sys.executable, str(Path(__file__).resolve()), "--_worker", str(vault),
+           "--sizes", str(size), "--repeat", str(repeat)]
+    if profile_path is not None:
+        cmd += ["--_profile-path", str(profile_path)]
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
+    if result.returncode != 0:
+        raise RuntimeError(f"规模 {size} 测试失败:\n{result.stderr}")
+    if result.stderr:
+        print(result.stderr, file=sys.stderr, end="")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def print_results(results: dict, baseline: dict | None = None):
+    """打印结果表；提供基准文件时附带热调用 p50 的变化"""
+    base_sizes = {r["size"]: r for r in (baseline or {}).get("sizes", [])}
+    for entry in results["sizes"]:
+        rss = f"{entry['peak_rss_mb']:.1f} MB" if entry["peak_rss_mb"] is not None else "未知"
+        print(f"\n## {entry['size']} 篇日记  (build {entry['build_ms']:.0f} ms, 峰值 RSS {rss})\n")
+        print(f"| 工具 | cold (ms) | warm p50 (ms) | warm p95 (ms) |{' 对比 p50 |' if baseline else ''}")
+        print(f"|------|-----------|---------------|---------------|{'---------|' if baseline else ''}")
+        base_tools = base_sizes.get(entry["size"], {}).get("tools", {})
+        for name, t in entry["tools"].items():
+            row = f"| {name} | {t['cold_ms']:.1f} | {t['warm_p50_ms']:.2f} | {t['warm_p95_ms']:.2f} |"
+            if baseline:
+                old = base_tools.get(name)
+                if old and old["warm_p50_ms"] > 0:
+                    row += f" {(t['warm_p50_ms'] / old['warm_p50_ms'] - 1) * 100:+.0f}% |"
+                else:
+                    row += " - |"
+            print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diary MCP Server 基准测试")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="日记规模，逗号分隔")
+    parser.add_argument("--repeat", type=int, default=20, help="每个工具热调用次数")
+    parser.add_argument("--workdir", type=Path, default=DEFAULT_WORKDIR, help="合成知识库目录")
+    parser.add_argument("--output", type=Path, help="结果 JSON 路径（默认 workdir/bench-<时间>.json）")
+    parser.add_argument("--compare", type=Path, help="与之前保存的结果 JSON 对比")
+    parser.add_argument("--profile", action="store_true", help="保存热调用的 cProfile 结果")
+    parser.add_argument("--_worker", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--_profile-path", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    if args._worker is not None:
+        # 子进程：测量单个规模，最后一行输出 JSON
+        print(json.dumps(bench_size(args._worker, sizes[0], args.repeat, args._profile_path)))
+        return
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    output = args.output or args.workdir / f"bench-{stamp}.json"
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "sizes": [],
+    }
+    for size in sizes:
+        print(f"生成 {size} 篇合成日记...", file=sys.stderr)
+        vault = generate_vault(args.workdir, size)
+        print(f"测试 {size} 篇...", file=sys.stderr)
+        profile_path = output.with_name(f"{output.stem}-{size}.prof") if args.profile else None
+        results["sizes"].append(run_size_subprocess(vault, size, args.repeat, profile_path))
+
+    output.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    baseline = None
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+    print_results(results, baseline)
+    print(f"\n结果已保存: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+日记解析缓存
+以 (路径, mtime, size) 为键缓存 parse_diary() 的结果，并持久化到 SQLite 边车文件。
+
+- 冷启动：直接从 SQLite 载入解析结果，未变化的日记不再读取
+- 热调用：只 stat 文件，mtime/size 变化时才重新解析（O(变化文件数)）
+- 派生表：register() 注册的钩子在同一个事务里随解析结果一起写入/删除，
+  只在文件变化时运行一次（见 diary_stats.py）
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+# 缓存结构变化时递增，旧缓存会被丢弃重建
+SCHEMA_VERSION = 1
+
+
+class DiaryCache:
+    """日记解析结果缓存（内存 + SQLite 持久化）"""
+
+    def __init__(self, db_path: Path, parser: Callable[[Path], dict[str, Any]]):
+        self.db_path = Path(db_path)
+        self.parser = parser
+        self._lock = threading.Lock()
+        # path -> (mtime_ns, size, diary)
+        self._entries: dict[str, tuple[int, int, dict[str, Any]]] = {}
+        # 派生表钩子：on_store(conn, path, diary) / on_remove(conn, paths)
+        self._hooks: list[Any] = []
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._init_schema()
+        self._load()
+
+    def _init_schema(self):
+        """建表；版本不一致时清空旧缓存"""
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            # 派生表依赖 diaries，一起重建
+            tables = self._conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+            for (table,) in tables:
+                self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS diaries (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                metadata TEXT NOT NULL,
+                content TEXT NOT NULL,
+                body_offset INTEGER NOT NULL
+            )"""
+        )
+        self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.commit()
+
+    def _load(self):
+        """冷启动：从 SQLite 载入全部解析结果"""
+        rows = self._conn.execute(
+            "SELECT path, mtime_ns, size, metadata, content, body_offset FROM diaries"
+        )
+        for path, mtime_ns, size, metadata, content, body_offset in rows:
+            file_path = Path(path)
+            diary = {
+                "metadata": json.loads(metadata),
+                "body": content[body_offset:],
+                "full_content": content,
+                "file_path": path,
+                "file_name": file_path.name,
+                "date": file_path.stem
+            }
+            self._entries[path] = (mtime_ns, size, diary)
+
+    def is_fresh(self, path: str, stat: tuple[int, int]) -> bool:
+        """缓存中的解析结果与 (mtime_ns, size) 是否一致"""
+        entry = self._entries.get(path)
+        return entry is not None and entry[0] == stat[0] and entry[1] == stat[1]
+
+    def paths(self) -> list[str]:
+        """所有已缓存的笔记路径"""
+        return list(self._entries)
+
+    def peek(self, path: str) -> dict[str, Any] | None:
+        """已缓存的解析结果（不检查文件是否变化）"""
+        entry = self._entries.get(path)
+        return entry[2] if entry is not None else None
+
+    def get(self, file_path: Path, stat: tuple[int, int] | None = None,
+            commit: bool = True) -> dict[str, Any]:
+        """获取解析后的日记，文件未变化时直接返回缓存
+
+        stat 为调用方已拿到的 (mtime_ns, size)，不传时自行 stat；
+        批量更新时传 commit=False，最后统一调用 commit()。
+        """
+        key = str(file_path)
+        if stat is None:
+            st = file_path.stat()
+            stat = (st.st_mtime_ns, st.st_size)
+        mtime_ns, size = stat
+
+        entry = self._entries.get(key)
+        if entry and entry[0] == mtime_ns and entry[1] == size:
+            return entry[2]
+
+        diary = self.parser(file_path)
+        content = diary["full_content"]
+        body_offset = len(content) - len(diary["body"])
+
+        with self._lock:
+            self._entries[key] = (mtime_ns, size, diary)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO diaries VALUES (?, ?, ?, ?, ?, ?)",
+                (key, mtime_ns, size,
+                 json.dumps(diary["metadata"], ensure_ascii=False), content, body_offset)
+            )
+            for hook in self._hooks:
+                hook.on_store(self._conn, key, diary)
+            if commit:
+                self._conn.commit()
+
+        return diary
+
+    def get_many(self, files: Iterable[Path]) -> list[dict[str, Any]]:
+        """批量获取解析后的日记（一次提交）"""
+        diaries = [self.get(file, commit=False) for file in files]
+        self.commit()
+        return diaries
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def prune(self, live_paths: Iterable[str]):
+        """删除不在 live_paths 中的缓存条目"""
+        stale = set(self._entries) - set(live_paths)
+        if not stale:
+            return
+
+        with self._lock:
+            for path in stale:
+                self._entries.pop(path, None)
+            self._conn.executemany("DELETE FROM diaries WHERE path = ?", [(p,) for p in stale])
+            for hook in self._hooks:
+                hook.on_remove(self._conn, stale)
+            self._conn.commit()
+
+    def register(self, hook: Any):
+        """注册派生表钩子
+
+        hook 需实现 create_tables(conn)、on_store(conn, path, diary)、
+        on_remove(conn, paths)，以及 missing(conn) 返回尚未生成派生数据的路径，
+        用于首次注册时对已缓存的日记补算一次。
+        """
+        with self._lock:
+            hook.create_tables(self._conn)
+            for path in hook.missing(self._conn):
+                entry = self._entries.get(path)
+                if entry is not None:
+                    hook.on_store(self._conn, path, entry[2])
+            self._conn.commit()
+            self._hooks.append(hook)
+
+    def execute(self, sql: str, params: tuple | dict = ()) -> list[tuple]:
+        """在缓存数据库上执行只读查询"""
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def write(self, statements: Iterable[tuple[str, Iterable[tuple]]]):
+        """在一个事务里执行多条写语句：[(sql, 参数列表), ...]"""
+        with self._lock:
+            for sql, rows in statements:
+                self._conn.executemany(sql, rows)
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+日记全文倒排索引
+- 中文按字符二元组（bigram）切分，英文/数字按单词切分（小写）
+- 位置倒排表：词项 -> {文档: [位置...]}，并记录每个位置的字符偏移
+- 支持 AND / OR / 短语查询，BM25 排序，片段直接按偏移截取
+
+查询语法：
+    小程序 论文          AND（两个词都要出现）
+    小程序 OR 论文       OR（也可以写成 小程序 | 论文）
+    "deep learning"      短语（引号内按相邻位置匹配）
+    yolo*                英文前缀匹配
+中文词本身按短语匹配，"小程序" 与子串匹配语义一致；单个英文/数字词扫描词表，
+命中包含它的词项（yolo 可命中 YOLOX），yolo* 只命中以 yolo 开头的词项。
+含标点或符号的词（C++、✅、8/10）以及切不出词项的词，先用词项缩小候选文档，
+再对原文做不区分大小写的子串扫描。
+"""
+
+import heapq
+import math
+import re
+import threading
+from array import array
+from collections import defaultdict
+from typing import Any, Callable
+
+# CJK 统一表意文字（含扩展 A）连续段，或英文/数字单词
+TOKEN_RE = re.compile(r'[㐀-䶿一-鿿]+|[A-Za-z0-9_]+')
+QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+# 词项字符与空白之外的字符，即标点和符号
+SYMBOL_RE = re.compile(r'[^\s㐀-䶿一-鿿A-Za-z0-9_]')
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def is_cjk(ch: str) -> bool:
+    return '㐀' <= ch <= '䶿' or '一' <= ch <= '鿿'
+
+
+def tokenize(text: str) -> list[tuple[str, int, int]]:
+    """切分文本，返回 (词项, 起始偏移, 结束偏移) 列表"""
+    tokens = []
+    for match in TOKEN_RE.finditer(text):
+        run = match.group()
+        start = match.start()
+        if is_cjk(run[0]):
+            if len(run) == 1:
+                tokens.append((run, start, start + 1))
+            else:
+                tokens.extend([(run[i:i + 2], start + i, start + i + 2)
+                               for i in range(len(run) - 1)])
+        else:
+            tokens.append((run.lower(), start, match.end()))
+    return tokens
+
+
+class _Doc:
+    """单篇文档的索引数据"""
+    __slots__ = ("text", "starts", "ends", "terms")
+
+    def __init__(self, text: str, tokens: list[tuple[str, int, int]]):
+        self.text = text
+        self.starts = array('I', (t[1] for t in tokens))
+        self.ends = array('I', (t[2] for t in tokens))
+        self.terms = {t[0] for t in tokens}
+
+    def gap(self, pos: int) -> str | None:
+        """位置 pos 与 pos+1 之间的原文；两个 bigram 重叠时返回 None"""
+        return _gap(self.text, self.ends[pos], self.starts[pos + 1])
+
+
+def _gap(text: str, end: int, next_start: int) -> str | None:
+    if next_start < end:
+        return None
+    between = text[end:next_start]
+    # 空白一律视为相同的分隔
+    return ' ' if between and between.isspace() else between
+
+
+class InvertedIndex:
+    """可增量更新的位置倒排索引"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._docs: dict[str, _Doc] = {}
+        # 词项 -> {文档ID: 位置数组}
+        self._postings: dict[str, dict[str, array]] = {}
+        # 单个汉字 -> 包含它的 bigram 词项（用于单字查询）
+        self._char_terms: dict[str, set[str]] = {}
+        self._total_len = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._docs
+
+    # ==================== 增量更新 ====================
+
+    def add(self, doc_id: str, text: str):
+        """加入或更新文档；文本未变化时直接跳过"""
+        with self._lock:
+            old = self._docs.get(doc_id)
+            if old is not None:
+                if old.text == text:
+                    return
+                self.remove(doc_id)
+
+            tokens = tokenize(text)
+            doc = _Doc(text, tokens)
+            self._docs[doc_id] = doc
+            self._total_len += len(tokens)
+
+            # 先在文档内按词项归并位置，再一次性写入倒排表
+            term_positions = defaultdict(list)
+            for pos, token in enumerate(tokens):
+                term_positions[token[0]].append(pos)
+
+            for term, positions in term_positions.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    if len(term) == 2 and is_cjk(term[0]):
+                        self._char_terms.setdefault(term[0], set()).add(term)
+                        self._char_terms.setdefault(term[1], set()).add(term)
+                postings[doc_id] = array('I', positions)
+
+    def remove(self, doc_id: str):
+        """删除文档"""
+        with self._lock:
+            doc = self._docs.pop(doc_id, None)
+            if doc is None:
+                return
+            self._total_len -= len(doc.starts)
+
+            for term in doc.terms:
+                postings = self._postings[term]
+                del postings[doc_id]
+                if not postings:
+                    del self._postings[term]
+                    if len(term) == 2 and is_cjk(term[0]):
+                        for ch in term:
+                            terms = self._char_terms.get(ch)
+                            if terms is not None:
+                                terms.discard(term)
+                                if not terms:
+                                    del self._char_terms[ch]
+
+    def doc_ids(self) -> set[str]:
+        return set(self._docs)
+
+    # ==================== 查询 ====================
+
+    def parse_query(self, query: str) -> list[list[str]]:
+        """解析查询为 OR 分组，每组内为 AND 的词/短语"""
+        groups: list[list[str]] = [[]]
+        for match in QUERY_RE.finditer(query):
+            phrase, word = match.groups()
+            if word in ("OR", "|"):
+                groups.append([])
+            elif phrase is not None:
+                if phrase.strip():
+                    groups[-1].append(phrase)
+            else:
+                groups[-1].append(word)
+        return [g for g in groups if g]
+
+    def _match_term(self, term: str) -> dict[str, list[tuple[int, int]]]:
+        """匹配单个词/短语，返回 {文档ID: [(起始偏移, 结束偏移)...]}"""
+        query_tokens = tokenize(term)
+        prefix = term.endswith('*')
+        if not query_tokens or SYMBOL_RE.search(term[:-1] if prefix else term):
+            return self._match_substring(term, query_tokens)
+        tokens = [t[0] for t in query_tokens]
+        gaps = [_gap(term, query_tokens[i][2], query_tokens[i + 1][1])
+                for i in range(len(query_tokens) - 1)]
+
+        # 单个汉字：通过包含该字的 bigram 展开
+        if len(tokens) == 1 and len(tokens[0]) == 1 and is_cjk(tokens[0]):
+            return self._match_char(tokens[0])
+
+        # 单个英文词：yolo* 展开为以 yolo 开头的词项，yolo 展开为包含 yolo 的词项
+        if len(tokens) == 1 and not is_cjk(tokens[0][0]):
+            return self._match_prefix(tokens[0], anywhere=not prefix)
+
+        postings_list = [self._postings.get(t) for t in tokens]
+        if any(p is None for p in postings_list):
+            return {}
+
+        # 从最短的倒排表开始求交集
+        candidates = set(min(postings_list, key=len))
+        for postings in postings_list:
+            candidates.intersection_update(postings)
+
+        matches = {}
+        for doc_id in candidates:
+            doc = self._docs[doc_id]
+            first = postings_list[0][doc_id]
+            rest = [set(p[doc_id]) for p in postings_list[1:]]
+            spans = []
+            for pos in first:
+                if all(pos + i + 1 in positions and doc.gap(pos + i) == gaps[i]
+                       for i, positions in enumerate(rest)):
+                    spans.append((doc.starts[pos], doc.ends[pos + len(rest)]))
+            if spans:
+                matches[doc_id] = spans
+        return matches
+
+    def _match_char(self, ch: str) -> dict[str, list[tuple[int, int]]]:
+        """单字匹配：合并单字词项和包含该字的 bigram 出现位置"""
+        offsets: dict[str, set[int]] = {}
+        for term in self._char_terms.get(ch, set()) | {ch}:
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            for doc_id, positions in postings.items():
+                doc = self._docs[doc_id]
+                doc_offsets = offsets.setdefault(doc_id, set())
+                for pos in positions:
+                    start = doc.starts[pos]
+                    if term[0] == ch:
+                        doc_offsets.add(start)
+                    if len(term) == 2 and term[1] == ch:
+                        doc_offsets.add(start + 1)
+        return {doc_id: [(o, o + 1) for o in sorted(s)] for doc_id, s in offsets.items()}
+
+    def _match_prefix(self, prefix: str, anywhere: bool = False) -> dict[str, list[tuple[int, int]]]:
+        """英文前缀匹配（扫描词表）；anywhere 时匹配词项中任意位置"""
+        matches: dict[str, list[tuple[int, int]]] = {}
+        for term, postings in self._postings.items():
+            if not (prefix in term if anywhere else term.startswith(prefix)):
+                continue
+            for doc_id, positions in postings.items():
+                doc = self._docs[doc_id]
+                matches.setdefault(doc_id, []).extend(
+                    (doc.starts[pos], doc.ends[pos]) for pos in positions)
+        return matches
+
+    def _docs_containing(self, token: str) -> set[str]:
+        """原文中可能以子串形式包含该查询词项的文档"""
+        if is_cjk(token[0]):
+            if len(token) == 1:
+                terms = self._char_terms.get(token, set()) | {token}
+            else:
+                terms = {token}
+        else:
+            # 英文/数字词项可能是文档中更长单词的一部分
+            terms = [t for t in self._postings if token in t]
+        docs: set[str] = set()
+        for t in terms:
+            docs.update(self._postings.get(t, ()))
+        return docs
+
+    def _match_substring(self, term: str,
+                         query_tokens: list[tuple[str, int, int]]) -> dict[str, list[tuple[int, int]]]:
+        """子串匹配（不区分大小写）：词项只用来缩小候选，最终以原文为准"""
+        needle = term.strip()
+        if not needle:
+            return {}
+        if query_tokens:
+            candidates = None
+            for token in sorted({t[0] for t in query_tokens}, key=len, reverse=True):
+                docs = self._docs_containing(token)
+                candidates = docs if candidates is None else candidates & docs
+                if not candidates:
+                    return {}
+        else:
+            candidates = self._docs.keys()
+
+        pattern = re.compile(re.escape(needle), re.IGNORECASE)
+        matches = {}
+        for doc_id in candidates:
+            spans = [m.span() for m in pattern.finditer(self._docs[doc_id].text)]
+            if spans:
+                matches[doc_id] = spans
+        return matches
+
+    def search(self, query: str, limit: int | None = None) -> list[dict[str, Any]]:
+        """执行查询，返回按 BM25 得分降序排列的结果
+
+        每条结果包含 doc_id、score 和 spans（命中的字符偏移）。
+        """
+        return self.search_page(query, limit)[0]
+
+    def search_page(self, query: str, limit: int | None = None,
+                    after: tuple[float, str] | None = None, min_score: float = 0.0,
+                    doc_filter: Callable[[str], bool] | None = None) -> tuple[list[dict[str, Any]], int]:
+        """分页查询，返回 (本页结果, 命中总数)
+
+        排序键为 (-score, doc_id)；after 为上一页最后一条的 (score, doc_id)，
+        只返回排在它之后的结果（keyset 游标）。doc_filter 在打分前过滤文档，
+        min_score 以下的结果不计入。所有匹配文档都会打分（没有提前终止），
+        打分只用倒排表中的词频；之后用堆选出本页 limit 条，命中偏移（spans）
+        只为这几条收集。
+        """
+        groups = self.parse_query(query)
+        if not groups:
+            return [], 0
+
+        with self._lock:
+            n_docs = len(self._docs)
+            if n_docs == 0:
+                return [], 0
+            avgdl = self._total_len / n_docs
+
+            scores: dict[str, float] = {}
+            # doc_id -> 命中该文档的各组词项
+            matched: dict[str, list[dict[str, list[tuple[int, int]]]]] = defaultdict(list)
+            term_cache: dict[str, dict[str, list[tuple[int, int]]]] = {}
+
+            for group in groups:
+                group_matches = []
+                for term in group:
+                    if term not in term_cache:
+                        term_cache[term] = self._match_term(term)
+                    group_matches.append(term_cache[term])
+
+                # AND：组内所有词都命中的文档
+                docs = set(min(group_matches, key=len))
+                for m in group_matches:
+                    docs.intersection_update(m)
+                if doc_filter is not None:
+                    docs = {d for d in docs if doc_filter(d)}
+
+                for doc_id in docs:
+                    dl = len(self._docs[doc_id].starts)
+                    score = 0.0
+                    for m in group_matches:
+                        tf = len(m[doc_id])
+                        df = len(m)
+                        idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+                        score += idf * tf * (BM25_K1 + 1) / (
+                            tf + BM25_K1 * (1 - BM25_B + BM25_B * dl / avgdl))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + score
+                    matched[doc_id].extend(group_matches)
+
+            ranked = [(-score, doc_id) for doc_id, score in scores.items() if score >= min_score]
+            total = len(ranked)
+            if after is not None:
+                cursor = (-after[0], after[1])
+                ranked = [key for key in ranked if key > cursor]
+
+            if limit is None:
+                ranked.sort()
+            else:
+                ranked = heapq.nsmallest(limit, ranked)
+
+            hits = []
+            for neg_score, doc_id in ranked:
+                spans = {span for m in matched[doc_id] for span in m[doc_id]}
+                hits.append({"doc_id": doc_id, "score": -neg_score, "spans": sorted(spans)})
+
+        return hits, total
+
+    def snippets(self, doc_id: str, spans: list[tuple[int, int]],
+                 max_snippets: int = 3, context_lines: int = 1) -> list[str]:
+        """根据命中偏移截取上下文（命中行及前后各 context_lines 行）"""
+        doc = self._docs.get(doc_id)
+        if doc is None:
+            return []
+        text = doc.text
+
+        result = []
+        last_end = -1
+        for start, _ in spans:
+            if start < last_end:
+                continue  # 已包含在上一个片段中
+            # 命中所在行的起止位置，再向前/向后扩展 context_lines 行
+            line_start = text.rfind('\n', 0, start) + 1
+            for _ in range(context_lines):
+                if line_start == 0:
+                    break
+                line_start = text.rfind('\n', 0, line_start - 1) + 1
+
+            line_end = text.find('\n', start)
+            for _ in range(context_lines):
+                if line_end == -1:
+                    break
+                line_end = text.find('\n', line_end + 1)
+            if line_end == -1:
+                line_end = len(text)
+
+            result.append(text[line_start:line_end])
+            last_end = line_end
+            if len(result) >= max_snippets:
+                break
+        return result
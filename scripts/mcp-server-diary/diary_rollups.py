@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+日/周/月汇总表
+周复盘、月复盘需要跨周、跨月的统计。每篇日记变化时把它的指标（习惯、精力、情绪、字数）
+计入所在的日、ISO 周和月三行汇总，存入缓存数据库的 diary_rollups 表：
+
+- 增量维护：日记修改时先减去旧贡献（记在 rollup_sources）再加上新贡献，删除时只减去
+- 查询 "最近 12 周" 只读取 12 行汇总，不读取任何 Markdown
+"""
+
+import re
+from datetime import date, timedelta
+from typing import Any, Callable, Iterable
+
+from diary_cache import DiaryCache
+from diary_stats import HABITS, extract_stats
+
+# 中日韩文字按字计数，其他按词计数
+CJK_RE = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]')
+WORD_RE = re.compile(r'[A-Za-z0-9]+(?:[\'.-][A-Za-z0-9]+)*')
+
+PERIODS = ("day", "week", "month")
+
+# 可累加的汇总列
+SUM_COLUMNS = ["diaries", "words", "energy_sum", "energy_days", "mood_sum", "mood_days",
+               *HABITS.values()]
+
+
+def count_words(body: str) -> int:
+    """字数：汉字个数 + 英文/数字词数"""
+    return len(CJK_RE.findall(body)) + len(WORD_RE.findall(body))
+
+
+def period_start(day: date, period: str) -> date:
+    """日期所在周期的第一天（周从周一开始）"""
+    if period == "week":
+        return day - timedelta(days=day.weekday())
+    if period == "month":
+        return day.replace(day=1)
+    return day
+
+
+def period_key(start: date, period: str) -> str:
+    """周期的显示名：2026-01-05 / 2026-W02 / 2026-01"""
+    if period == "week":
+        year, week, _ = start.isocalendar()
+        return f"{year}-W{week:02d}"
+    if period == "month":
+        return start.strftime("%Y-%m")
+    return start.isoformat()
+
+
+def shift_period(start: date, period: str, n: int) -> date:
+    """向前（n < 0）或向后移动 n 个周期"""
+    if period == "week":
+        return start + timedelta(weeks=n)
+    if period == "month":
+        months = start.year * 12 + start.month - 1 + n
+        return date(months // 12, months % 12 + 1, 1)
+    return start + timedelta(days=n)
+
+
+def contribution(body: str) -> dict[str, int]:
+    """单篇日记对汇总的贡献"""
+    stats = extract_stats(body)
+    energy, mood = stats["energy"], stats["mood"]
+    row = {
+        "diaries": 1,
+        "words": count_words(body),
+        "energy_sum": energy or 0,
+        "energy_days": int(energy is not None),
+        "mood_sum": mood or 0,
+        "mood_days": int(mood is not None),
+    }
+    for column in HABITS.values():
+        row[column] = stats[column]
+    return row
+
+
+class DiaryRollups:
+    """diary_rollups 表：随 DiaryCache 增量维护的日/周/月汇总"""
+
+    def __init__(self, cache: DiaryCache, is_diary: Callable[[str], bool]):
+        self.cache = cache
+        self.is_diary = is_diary
+        cache.register(self)
+
+    # ==================== DiaryCache 钩子 ====================
+
+    def create_tables(self, conn):
+        sum_columns = ",\n".join(f"{c} INTEGER NOT NULL" for c in SUM_COLUMNS)
+        # 每篇日记计入汇总的值，修改/删除时据此减去旧贡献
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS rollup_sources (
+                path TEXT PRIMARY KEY,
+                date TEXT NOT NULL,
+                {sum_columns}
+            )"""
+        )
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS diary_rollups (
+                period TEXT NOT NULL,
+                start TEXT NOT NULL,
+                key TEXT NOT NULL,
+                {sum_columns},
+                PRIMARY KEY (period, start)
+            )"""
+        )
+
+    def missing(self, conn) -> list[str]:
+        rows = conn.execute(
+            "SELECT path FROM diaries WHERE path NOT IN (SELECT path FROM rollup_sources)")
+        return [path for (path,) in rows if self.is_diary(path)]
+
+    def on_store(self, conn, path: str, diary: dict[str, Any]):
+        if not self.is_diary(path):
+            return
+        try:
+            day = date.fromisoformat(diary["date"])
+        except ValueError:
+            return
+
+        self._retract(conn, [path])
+        row = contribution(diary["body"])
+        conn.execute(
+            f"INSERT INTO rollup_sources (path, date, {', '.join(SUM_COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(SUM_COLUMNS))})",
+            (path, day.isoformat(), *(row[c] for c in SUM_COLUMNS))
+        )
+        self._apply(conn, day, [row[c] for c in SUM_COLUMNS])
+
+    def on_remove(self, conn, paths: Iterable[str]):
+        self._retract(conn, list(paths))
+
+    def _retract(self, conn, paths: list[str]):
+        """从汇总中减去这些日记的旧贡献"""
+        for path in paths:
+            old = conn.execute(
+                f"SELECT date, {', '.join(SUM_COLUMNS)} FROM rollup_sources WHERE path = ?",
+                (path,)
+            ).fetchone()
+            if old is None:
+                continue
+            self._apply(conn, date.fromisoformat(old[0]), [-v for v in old[1:]])
+            conn.execute("DELETE FROM rollup_sources WHERE path = ?", (path,))
+        conn.execute("DELETE FROM diary_rollups WHERE diaries <= 0")
+
+    def _apply(self, conn, day: date, values: list[int]):
+        """把 values 累加到 day 所在的日、周、月三行"""
+        updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in SUM_COLUMNS)
+        rows = []
+        for period in PERIODS:
+            start = period_start(day, period)
+            rows.append((period, start.isoformat(), period_key(start, period), *values))
+        conn.executemany(
+            f"INSERT INTO diary_rollups (period, start, key, {', '.join(SUM_COLUMNS)}) "
+            f"VALUES (?, ?, ?, {', '.join('?' * len(SUM_COLUMNS))}) "
+            f"ON CONFLICT (period, start) DO UPDATE SET {updates}",
+            rows
+        )
+
+    # ==================== 查询 ====================
+
+    def latest_date(self) -> date | None:
+        row = self.cache.execute("SELECT MAX(date) FROM rollup_sources")[0]
+        return date.fromisoformat(row[0]) if row[0] else None
+
+    def review(self, period: str, count: int, end: date | None = None) -> list[dict[str, Any]]:
+        """最近 count 个周期（截止 end 所在周期，默认最新一篇日记）的汇总，按时间顺序
+
+        没有日记的周期也会返回（diaries 为 0），便于看出断档。
+        """
+        if period not in PERIODS:
+            raise ValueError(f"未知的周期: {period}")
+        end = end or self.latest_date()
+        if end is None:
+            return []
+
+        last = period_start(end, period)
+        first = shift_period(last, period, -(count - 1))
+        rows = self.cache.execute(
+            f"SELECT start, {', '.join(SUM_COLUMNS)} FROM diary_rollups "
+            f"WHERE period = ? AND start >= ? AND start <= ?",
+            (period, first.isoformat(), last.isoformat())
+        )
+        by_start = {row[0]: dict(zip(SUM_COLUMNS, row[1:])) for row in rows}
+
+        result = []
+        start = first
+        while start <= last:
+            row = by_start.get(start.isoformat()) or dict.fromkeys(SUM_COLUMNS, 0)
+            result.append({
+                "start": start,
+                "end": shift_period(start, period, 1) - timedelta(days=1),
+                "key": period_key(start, period),
+                "diaries": row["diaries"],
+                "words": row["words"],
+                "energy": row["energy_sum"] / row["energy_days"] if row["energy_days"] else None,
+                "mood": row["mood_sum"] / row["mood_days"] if row["mood_days"] else None,
+                "habits": {habit: row[column] for habit, column in HABITS.items()},
+            })
+            start = shift_period(start, period, 1)
+        return result
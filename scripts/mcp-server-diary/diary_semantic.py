@@ -0,0 +1,517 @@
+#!/usr/bin/env python3
+"""
+知识库语义检索
+离线 LSA：TF-IDF（中文单字 + 二元组、英文单词）经截断 SVD 降到 DIM 维，不需要网络和模型文件。
+"累"与"疲惫""没睡好"这类经常一起出现的词会落在相近的方向上。
+
+- 笔记按段落切块，每块一个向量；向量以 float16 存在内存映射文件 semantic/vectors.f16
+- 近似最近邻（IVF）：k-means 质心把向量分桶，查询只扫描最相近的 NPROBE 个桶；
+  有 doc_filter 时先过滤再打分，符合条件的笔记不足 limit 篇时加倍扩大扫描的桶数
+- 服务启动后由 build() 在后台线程训练/载入模型，期间 building=True，调用方先用关键词检索
+- 增量：笔记变化时（DiaryCache 钩子）只标记为待更新，下次查询时用已有的投影矩阵把新块
+  "折入"（fold-in）；块数相对上次训练变化超过 REFIT_RATIO 时重新训练词表、SVD 和质心
+- 块的位置（路径、偏移、行号、桶）存在缓存数据库的 semantic_chunks 表
+
+依赖 numpy（可选）：pip install numpy；未安装时 available=False，由调用方退化为关键词检索。
+"""
+
+import math
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable, Iterable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from diary_cache import DiaryCache
+from diary_index import is_cjk, tokenize
+
+DIM = 128             # 向量维度
+CHUNK_CHARS = 400     # 每块大约的字数
+MAX_VOCAB = 50000     # 词表上限（按文档频率取前 N 个）
+FIT_SAMPLE = 20000    # 训练 SVD 最多使用的块数，其余块直接折入
+REFIT_RATIO = 0.5     # 块数变化超过该比例时重新训练
+NPROBE = 8            # 查询时扫描的桶数
+KMEANS_ITERS = 10
+
+PARAGRAPH_RE = re.compile(r'\n\s*\n')
+
+
+def chunk_spans(body: str, size: int = CHUNK_CHARS) -> list[tuple[int, int]]:
+    """按空行分段，相邻短段合并到约 size 字，超长段按行切开，返回 (起, 止) 偏移"""
+    paragraphs = []
+    pos = 0
+    for match in PARAGRAPH_RE.finditer(body):
+        paragraphs.append((pos, match.start()))
+        pos = match.end()
+    paragraphs.append((pos, len(body)))
+
+    pieces = []
+    for start, end in paragraphs:
+        while end - start > 2 * size:
+            cut = body.rfind("\n", start + size // 2, start + size * 3 // 2)
+            if cut <= start:
+                cut = start + size
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+
+    chunks = []
+    current = None
+    for start, end in pieces:
+        if not body[start:end].strip():
+            continue
+        if current is None:
+            current = [start, end]
+        elif end - current[0] <= size:
+            current[1] = end
+        else:
+            chunks.append((current[0], current[1]))
+            current = [start, end]
+    if current is not None:
+        chunks.append((current[0], current[1]))
+    return chunks
+
+
+def term_counts(text: str) -> Counter:
+    """特征：倒排索引的词项（中文二元组、英文单词）+ 中文单字"""
+    counts = Counter(term for term, _, _ in tokenize(text) if not (len(term) == 1 and is_cjk(term)))
+    counts.update(ch for ch in text if is_cjk(ch))
+    return counts
+
+
+# ==================== 稀疏矩阵运算（CSR，仅用 numpy） ====================
+
+def _csr_dot(indptr, indices, data, matrix, batch_nnz: int = 1 << 18):
+    """CSR 稀疏矩阵 × 稠密矩阵，按非零元分批避免中间结果过大"""
+    n_rows = len(indptr) - 1
+    out = np.zeros((n_rows, matrix.shape[1]), dtype=np.float32)
+    row = 0
+    while row < n_rows:
+        end = int(np.searchsorted(indptr, indptr[row] + batch_nnz, side="right")) - 1
+        end = min(max(end, row + 1), n_rows)
+        lo, hi = indptr[row], indptr[end]
+        if hi > lo:
+            product = matrix[indices[lo:hi]] * data[lo:hi, None]
+            starts = indptr[row:end] - lo
+            nonempty = indptr[row + 1:end + 1] > indptr[row:end]
+            out[row:end][nonempty] = np.add.reduceat(product, starts[nonempty], axis=0)
+        row = end
+    return out
+
+
+def _csr_transpose(indptr, indices, data, n_cols: int):
+    rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+    order = np.argsort(indices, kind="stable")
+    t_indptr = np.concatenate(([0], np.cumsum(np.bincount(indices, minlength=n_cols))))
+    return t_indptr, rows[order], data[order]
+
+
+def _randomized_svd(csr, n_cols: int, k: int, n_iter: int = 4, oversample: int = 10):
+    """随机化截断 SVD（Halko 等），返回右奇异向量 (n_cols, k)"""
+    rng = np.random.default_rng(0)
+    transposed = _csr_transpose(*csr, n_cols)
+    omega = rng.standard_normal((n_cols, k + oversample)).astype(np.float32)
+
+    y = _csr_dot(*csr, omega)
+    for _ in range(n_iter):
+        q, _ = np.linalg.qr(y)
+        z, _ = np.linalg.qr(_csr_dot(*transposed, q))
+        y = _csr_dot(*csr, z)
+    q, _ = np.linalg.qr(y)
+    b_t = _csr_dot(*transposed, q)            # (Q^T X)^T
+    _, _, vt = np.linalg.svd(b_t.T, full_matrices=False)
+    return np.ascontiguousarray(vt[:k].T, dtype=np.float32)
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def _kmeans(vectors, n_lists: int, iters: int = KMEANS_ITERS):
+    """球面 k-means，返回单位长度的质心"""
+    rng = np.random.default_rng(0)
+    sample = vectors
+    if len(sample) > 50000:
+        sample = sample[rng.choice(len(sample), 50000, replace=False)]
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        filled = np.linalg.norm(sums, axis=1) > 0
+        centroids[filled] = _normalize(sums[filled])
+    return centroids
+
+
+# ==================== 语义索引 ====================
+
+class SemanticIndex:
+    """分块向量 + IVF 近似最近邻，随 DiaryCache 增量维护"""
+
+    def __init__(self, cache: DiaryCache, cache_dir: Path,
+                 accepts: Callable[[str], bool] = lambda path: True):
+        self.cache = cache
+        self.cache_dir = Path(cache_dir)
+        self.accepts = accepts
+        self.available = np is not None
+
+        self._lock = threading.RLock()
+        # 待更新的路径；钩子在 DiaryCache 的锁内调用，只碰这把小锁，避免与查询互相等待
+        self._dirty_lock = threading.Lock()
+        self._dirty: set[str] = set()
+        # 后台 build() 进行中
+        self.building = False
+
+        # 模型
+        self.model_id: str | None = None
+        self._vocab: dict[str, int] = {}
+        self._idf = None
+        self._components = None
+        self._centroids = None
+        self._fit_chunks = 0
+
+        # 向量行
+        self._vectors = None
+        self._capacity = 0
+        self._next_row = 0
+        self._free: list[int] = []
+        self._row_path: dict[int, str] = {}
+        self._row_span: dict[int, tuple[int, int]] = {}
+        self._row_list: dict[int, int] = {}
+        self._path_rows: dict[str, list[int]] = {}
+        self._lists: list[set[int]] = []
+        self._list_arrays: dict[int, Any] = {}
+
+        if self.available:
+            cache.register(self)
+
+    # ==================== DiaryCache 钩子 ====================
+
+    def create_tables(self, conn):
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS semantic_chunks (
+                path TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                row INTEGER NOT NULL,
+                list INTEGER NOT NULL,
+                start INTEGER NOT NULL,
+                end INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                PRIMARY KEY (path, seq)
+            )"""
+        )
+        self._load_model()
+        # 模型文件丢失或已重新训练，旧的块作废（之后由 missing() 重新标记）
+        conn.execute("DELETE FROM semantic_chunks WHERE model != ?", (self.model_id or "",))
+        rows = conn.execute("SELECT path, row, list, start, end FROM semantic_chunks ORDER BY path, seq")
+        for path, row, list_id, start, end in rows:
+            self._attach_row(path, row, list_id, (start, end))
+        self._free = sorted(set(range(self._next_row)) - set(self._row_path), reverse=True)
+
+    def missing(self, conn) -> list[str]:
+        rows = conn.execute(
+            "SELECT path FROM diaries WHERE path NOT IN (SELECT path FROM semantic_chunks)")
+        return [path for (path,) in rows if self.accepts(path)]
+
+    def on_store(self, conn, path: str, diary: dict[str, Any]):
+        if self.accepts(path):
+            with self._dirty_lock:
+                self._dirty.add(path)
+
+    def on_remove(self, conn, paths: Iterable[str]):
+        with self._dirty_lock:
+            self._dirty.update(paths)
+
+    # ==================== 模型与向量文件 ====================
+
+    def _model_path(self) -> Path:
+        return self.cache_dir / "model.npz"
+
+    def _vectors_path(self) -> Path:
+        return self.cache_dir / "vectors.f16"
+
+    def _load_model(self):
+        try:
+            with np.load(self._model_path(), allow_pickle=False) as data:
+                vocab = data["vocab"].tolist()
+                idf, components, centroids = data["idf"], data["components"], data["centroids"]
+                model_id, fit_chunks = str(data["model_id"]), int(data["fit_chunks"])
+            size = os.path.getsize(self._vectors_path())
+        except (OSError, ValueError, KeyError):
+            return
+
+        self._vocab = {term: i for i, term in enumerate(vocab)}
+        self._idf, self._components, self._centroids = idf, components, centroids
+        self.model_id, self._fit_chunks = model_id, fit_chunks
+        self._lists = [set() for _ in range(len(centroids))]
+        self._capacity = size // (components.shape[1] * 2)
+        self._vectors = np.memmap(self._vectors_path(), dtype=np.float16, mode="r+",
+                                  shape=(self._capacity, components.shape[1]))
+
+    def _save_model(self):
+        tmp = self.cache_dir / "model.tmp.npz"
+        vocab = sorted(self._vocab, key=self._vocab.get)
+        np.savez(tmp, vocab=np.array(vocab, dtype=str), idf=self._idf,
+                 components=self._components, centroids=self._centroids,
+                 model_id=np.array(self.model_id), fit_chunks=np.array(self._fit_chunks))
+        os.replace(tmp, self._model_path())
+
+    def _reset_vectors(self, rows: int, dim: int):
+        """重新训练后换一个新的向量文件"""
+        self._vectors = None
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self._capacity = max(1024, 1 << max(0, rows - 1).bit_length())
+        with open(self._vectors_path(), "wb") as f:
+            f.truncate(self._capacity * dim * 2)
+        self._vectors = np.memmap(self._vectors_path(), dtype=np.float16, mode="r+",
+                                  shape=(self._capacity, dim))
+
+    def _grow_vectors(self, rows: int):
+        if rows <= self._capacity:
+            return
+        dim = self._components.shape[1]
+        self._vectors.flush()
+        self._vectors = None
+        self._capacity = 1 << (rows - 1).bit_length()
+        with open(self._vectors_path(), "r+b") as f:
+            f.truncate(self._capacity * dim * 2)
+        self._vectors = np.memmap(self._vectors_path(), dtype=np.float16, mode="r+",
+                                  shape=(self._capacity, dim))
+
+    # ==================== 行管理 ====================
+
+    def _attach_row(self, path: str, row: int, list_id: int, span: tuple[int, int]):
+        self._row_path[row] = path
+        self._row_span[row] = span
+        self._row_list[row] = list_id
+        self._path_rows.setdefault(path, []).append(row)
+        self._lists[list_id].add(row)
+        self._list_arrays.pop(list_id, None)
+        self._next_row = max(self._next_row, row + 1)
+
+    def _detach_path(self, path: str):
+        for row in self._path_rows.pop(path, []):
+            del self._row_path[row]
+            del self._row_span[row]
+            list_id = self._row_list.pop(row)
+            self._lists[list_id].discard(row)
+            self._list_arrays.pop(list_id, None)
+            self._free.append(row)
+
+    def _allocate_row(self) -> int:
+        if self._free:
+            return self._free.pop()
+        self._next_row += 1
+        return self._next_row - 1
+
+    def _list_array(self, list_id: int):
+        array = self._list_arrays.get(list_id)
+        if array is None:
+            array = np.fromiter(self._lists[list_id], dtype=np.int64, count=len(self._lists[list_id]))
+            self._list_arrays[list_id] = array
+        return array
+
+    # ==================== 向量化 ====================
+
+    def _chunks(self, paths: Iterable[str]) -> list[tuple[str, int, int, str]]:
+        """(路径, 起, 止, 用于向量化的文本)；第一块带上标题"""
+        chunks = []
+        for path in paths:
+            note = self.cache.peek(path)
+            if note is None:
+                continue
+            body = note["body"]
+            title = note["metadata"].get("title", note["date"])
+            for seq, (start, end) in enumerate(chunk_spans(body)):
+                text = body[start:end]
+                chunks.append((path, start, end, f"{title}\n{text}" if seq == 0 else text))
+        return chunks
+
+    def _tfidf(self, texts: list[str]):
+        """TF-IDF（对数词频）并按行归一化，返回 CSR 三元组"""
+        indptr, indices, data = [0], [], []
+        for text in texts:
+            row = [(self._vocab[term], 1 + math.log(count))
+                   for term, count in term_counts(text).items() if term in self._vocab]
+            indices.extend(i for i, _ in row)
+            data.extend(w for _, w in row)
+            indptr.append(len(indices))
+        indptr = np.array(indptr, dtype=np.int64)
+        indices = np.array(indices, dtype=np.int64)
+        data = np.array(data, dtype=np.float32) * self._idf[indices]
+        # 行归一化（空行不参与 reduceat）
+        lengths = np.diff(indptr)
+        nonempty = lengths > 0
+        norms = np.ones(len(texts), dtype=np.float32)
+        if nonempty.any():
+            norms[nonempty] = np.sqrt(np.add.reduceat(data ** 2, indptr[:-1][nonempty]))
+        data /= np.repeat(norms, lengths)
+        return indptr, indices, data
+
+    def _embed(self, texts: list[str]):
+        return _normalize(_csr_dot(*self._tfidf(texts), self._components))
+
+    def _assign(self, vectors):
+        return np.argmax(vectors @ self._centroids.T, axis=1)
+
+    # ==================== 训练与增量更新 ====================
+
+    def _fit(self):
+        """用当前所有笔记重新训练词表、SVD 和质心，并重建全部向量"""
+        with self._dirty_lock:
+            self._dirty.clear()
+        chunks = self._chunks(sorted(p for p in self.cache.paths() if self.accepts(p)))
+        texts = [c[3] for c in chunks]
+        if not texts:
+            return
+
+        rng = np.random.default_rng(0)
+        sample = texts
+        if len(texts) > FIT_SAMPLE:
+            sample = [texts[i] for i in sorted(rng.choice(len(texts), FIT_SAMPLE, replace=False))]
+
+        df = Counter()
+        for text in sample:
+            df.update(term_counts(text).keys())
+        min_df = 2 if len(sample) >= 20 else 1
+        vocab = [term for term, n in df.most_common(MAX_VOCAB) if n >= min_df]
+        self._vocab = {term: i for i, term in enumerate(vocab)}
+        self._idf = np.array([math.log((1 + len(sample)) / (1 + df[t])) + 1 for t in vocab],
+                             dtype=np.float32)
+
+        k = max(1, min(DIM, len(sample) - 1, len(vocab) - 1))
+        self._components = _randomized_svd(self._tfidf(sample), len(vocab), k)
+        vectors = self._embed(texts)
+        n_lists = max(1, min(1024, int(math.sqrt(len(texts)))))
+        self._centroids = _kmeans(vectors, n_lists)
+        assign = self._assign(vectors)
+
+        self.model_id = uuid.uuid4().hex
+        self._fit_chunks = len(texts)
+        self._reset_vectors(len(texts), k)
+        self._vectors[:len(texts)] = vectors.astype(np.float16)
+        self._vectors.flush()
+
+        self._row_path, self._row_span, self._row_list, self._path_rows = {}, {}, {}, {}
+        self._lists = [set() for _ in range(n_lists)]
+        self._list_arrays, self._free, self._next_row = {}, [], 0
+        records, seqs = [], Counter()
+        for row, ((path, start, end, _), list_id) in enumerate(zip(chunks, assign.tolist())):
+            self._attach_row(path, row, list_id, (start, end))
+            records.append((path, seqs[path], row, list_id, start, end, self.model_id))
+            seqs[path] += 1
+
+        self._save_model()
+        self.cache.write([
+            ("DELETE FROM semantic_chunks", [()]),
+            ("INSERT INTO semantic_chunks VALUES (?, ?, ?, ?, ?, ?, ?)", records),
+        ])
+
+    def _update(self, paths: set[str]):
+        """用现有模型折入变化笔记的块"""
+        for path in paths:
+            self._detach_path(path)
+        chunks = self._chunks(p for p in sorted(paths) if self.accepts(p))
+
+        records, seqs = [], Counter()
+        if chunks:
+            vectors = self._embed([c[3] for c in chunks])
+            assign = self._assign(vectors).tolist()
+            rows = [self._allocate_row() for _ in chunks]
+            self._grow_vectors(self._next_row)
+            self._vectors[rows] = vectors.astype(np.float16)
+            self._vectors.flush()
+            for (path, start, end, _), row, list_id in zip(chunks, rows, assign):
+                self._attach_row(path, row, list_id, (start, end))
+                records.append((path, seqs[path], row, list_id, start, end, self.model_id))
+                seqs[path] += 1
+
+        self.cache.write([
+            ("DELETE FROM semantic_chunks WHERE path = ?", [(p,) for p in paths]),
+            ("INSERT INTO semantic_chunks VALUES (?, ?, ?, ?, ?, ?, ?)", records),
+        ])
+
+    def _ensure_current(self):
+        if self.model_id is None:
+            self._fit()
+            return
+
+        with self._dirty_lock:
+            dirty, self._dirty = self._dirty, set()
+        if dirty:
+            self._update(dirty)
+
+        live = len(self._row_path)
+        if abs(live - self._fit_chunks) > REFIT_RATIO * self._fit_chunks:
+            self._fit()
+
+    def build(self):
+        """训练或补齐模型（服务启动后在后台线程调用，首次查询不必等待训练）"""
+        if not self.available:
+            return
+        self.building = True
+        try:
+            with self._lock:
+                self._ensure_current()
+        finally:
+            self.building = False
+
+    # ==================== 查询 ====================
+
+    def search(self, query: str, limit: int = 5, doc_filter: Callable[[str], bool] | None = None,
+               nprobe: int = NPROBE) -> list[dict[str, Any]]:
+        """返回最相近的笔记：每篇取得分最高的块，含 doc_id、score 和 span（块在正文中的偏移）"""
+        if not self.available:
+            return []
+
+        with self._lock:
+            self._ensure_current()
+            if self.model_id is None or not self._row_path:
+                return []
+
+            query_vector = self._embed([query])[0]
+            if not query_vector.any():
+                return []
+
+            order = np.argsort(-(self._centroids @ query_vector))
+            while True:
+                best = self._probe(query_vector, order[:nprobe], limit, doc_filter)
+                # 过滤后不足 limit 篇：扩大扫描范围，直到扫描完所有桶
+                if len(best) >= limit or nprobe >= len(order):
+                    break
+                nprobe *= 2
+
+            return [{"doc_id": path, "score": score, "span": self._row_span[row]}
+                    for path, (score, row) in best.items()]
+
+    def _probe(self, query_vector, lists, limit: int,
+               doc_filter: Callable[[str], bool] | None) -> dict[str, tuple[float, int]]:
+        """扫描指定的桶，返回 路径 -> (最高得分, 行)，最多 limit 篇"""
+        rows = np.sort(np.concatenate([self._list_array(int(j)) for j in lists]))
+        if doc_filter is not None and len(rows):
+            keep = np.fromiter((doc_filter(self._row_path[int(r)]) for r in rows),
+                               dtype=bool, count=len(rows))
+            rows = rows[keep]
+        if len(rows) == 0:
+            return {}
+        scores = self._vectors[rows].astype(np.float32) @ query_vector
+
+        best: dict[str, tuple[float, int]] = {}
+        for i in np.argsort(-scores):
+            row = int(rows[i])
+            path = self._row_path[row]
+            if path in best:
+                continue
+            best[path] = (float(scores[i]), row)
+            if len(best) >= limit:
+                break
+        return best
@@ -22,8 +22,12 @@ Diary MCP Server
 """
 
 import asyncio
-import re
-from datetime import datetime
+import base64
+import bisect
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from pathlib import Path
 from typing import Any
 
@@ -44,6 +48,20 @@ except ImportError:
     exit(1)
 
 import platform
+import sys
+
+# 与 sync_diary_to_hexo.py 共用的 frontmatter 解析（位于上级 scripts 目录）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from obsidian_frontmatter import parse_frontmatter
+
+from diary_cache import DiaryCache
+from diary_rollups import DiaryRollups
+from diary_semantic import SemanticIndex
+from diary_stats import DiaryStats
+from vault_crawler import DEFAULT_IGNORE, DEFAULT_ROOTS
+from vault_graph import LinkGraph
+from vault_index import VaultIndex
+from vault_watcher import VaultWatcher
 
 # WSL 路径映射
 def get_real_path(windows_path: str) -> Path:
@@ -60,76 +78,121 @@ def get_real_path(windows_path: str) -> Path:
         return Path(path)
     return Path(windows_path)
 
-# 日记目录配置
-DIARY_DIR = get_real_path(r"E:\000\knowledge\01-Daily\2026-01")
+# 知识库配置
+VAULT_DIR = get_real_path(r"E:\000\knowledge")
+DIARY_ROOT = "01-Daily"          # 日记所在目录（其下按月份分文件夹）
+INDEX_ROOTS = DEFAULT_ROOTS      # 建立索引的顶层目录
+IGNORE_PATTERNS = DEFAULT_IGNORE  # 忽略的目录/文件（fnmatch 通配符）
+
+# 解析缓存（SQLite 边车文件）
+CACHE_DB = Path(__file__).resolve().parent / ".cache" / "diary_cache.sqlite3"
+
+# 并发配置
+MAX_CONCURRENT_TOOLS = 4  # 同时执行的工具调用数（工具线程池大小）
+PARSE_WORKERS = 4         # 单次请求内并行读取/解析文件的线程数
 
 # 创建 Server 实例
 server = Server("diary-server")
 
-# 获取所有日记文件
-def get_diary_files() -> list[Path]:
-    """获取所有日记文件，按日期排序"""
-    diary_path = Path(DIARY_DIR)
-    if not diary_path.exists():
-        return []
-    return sorted(diary_path.glob("2026-01-*.md"))
-
 # 解析日记 frontmatter 和内容
 def parse_diary(file_path: Path) -> dict[str, Any]:
     """解析日记文件"""
     content = file_path.read_text(encoding='utf-8')
-    lines = content.split('\n')
-
-    metadata = {}
-    body_start = 0
-
-    # 解析 frontmatter
-    if lines and lines[0] == '---':
-        for i, line in enumerate(lines[1:], 1):
-            if line == '---':
-                body_start = i + 1
-                break
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip()
-                value = value.strip()
-                # 处理列表格式
-                if value == '' and i + 1 < len(lines) and lines[i + 1].strip().startswith('-'):
-                    list_values = []
-                    j = i + 1
-                    while j < len(lines) and not lines[j].startswith('---') and lines[j].strip().startswith('-'):
-                        list_values.append(lines[j].strip()[2:].strip())
-                        j += 1
-                    metadata[key] = list_values
-                else:
-                    metadata[key] = value
-
-    body = '\n'.join(lines[body_start:])
+    metadata, body_start = parse_frontmatter(content)
 
     return {
         "metadata": metadata,
-        "body": body,
+        "body": content[body_start:],
         "full_content": content,
         "file_path": str(file_path),
         "file_name": file_path.name,
         "date": file_path.stem
     }
 
+def init_vault(vault_dir: Path = VAULT_DIR, cache_db: Path = CACHE_DB):
+    """创建缓存、共享索引和指标表（测试/基准时可指向其他知识库）"""
+    global diary_cache, vault, diary_stats, diary_rollups, link_graph, semantic_index
+
+    # 解析缓存：按 (路径, mtime, size) 命中，只重新解析变化的文件
+    diary_cache = DiaryCache(cache_db, parse_diary)
+
+    # 知识库共享索引：元数据 + 全文倒排索引 + 日记日期表
+    vault = VaultIndex(vault_dir, diary_cache, INDEX_ROOTS, IGNORE_PATTERNS, DIARY_ROOT,
+                       parse_workers=PARSE_WORKERS)
+
+    # 结构化指标表：精力/情绪/感悟/习惯，随缓存增量维护
+    diary_stats = DiaryStats(diary_cache, vault.is_diary)
+
+    # 日/周/月汇总表：日记变化时增量加减，复盘查询不读取 Markdown
+    diary_rollups = DiaryRollups(diary_cache, vault.is_diary)
+
+    # 链接图：每篇笔记变化时解析一次双链和标签，邻接表按需重建
+    link_graph = LinkGraph(diary_cache, vault.rel_path, vault.is_diary)
+
+    # 语义检索：分块向量 + IVF，首次查询时训练，之后随笔记变化增量折入
+    semantic_index = SemanticIndex(diary_cache, Path(cache_db).parent / "semantic")
+
+# 由 main() 调用 init_vault() 创建；导入本模块（如 bench_server.py）不会打开正式缓存
+diary_cache = vault = diary_stats = diary_rollups = link_graph = semantic_index = None
+
+# 工具调用在独立线程池中执行，文件读取和解析不阻塞 stdio 事件循环
+tool_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_TOOLS, thread_name_prefix="diary-tool")
+
+class ToolCancelled(Exception):
+    """客户端取消了请求，工作线程提前结束"""
+
+def check_cancelled(cancel: threading.Event):
+    if cancel.is_set():
+        raise ToolCancelled()
+
+def wait_for_index(cancel: threading.Event):
+    """等待后台监听完成首次全量扫描"""
+    vault.wait_ready(cancel)
+    check_cancelled(cancel)
+
+async def run_in_tool_thread(func, *args):
+    """在工具线程池中执行 func(*args, cancel)，协程被取消时通知工作线程停止"""
+    cancel = threading.Event()
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(tool_executor, func, *args, cancel)
+    try:
+        return await future
+    except asyncio.CancelledError:
+        cancel.set()
+        raise
+
+# 分页游标：不透明的 base64 字符串，内容是继续查询所需的位置
+def encode_cursor(data: dict[str, Any]) -> str:
+    raw = json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str) -> dict[str, Any] | None:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return data if isinstance(data, dict) else None
+
+def page_after(items: list[str], limit: int, after: str | None) -> tuple[list[str], bool]:
+    """已排序列表中 after 之后的 limit 项，返回 (本页, 是否还有更多)"""
+    start = bisect.bisect_right(items, after) if after else 0
+    return items[start:start + limit], start + limit < len(items)
+
 # ==================== Resources ====================
 
 @server.list_resources()
 async def handle_list_resources() -> list[Resource]:
     """列出所有可用的日记资源"""
-    files = get_diary_files()
+    await run_in_tool_thread(wait_for_index)
     resources = []
 
-    for file in files:
-        date = file.stem
+    for day in vault.diary_dates():
         resources.append(
             Resource(
-                uri=f"diary://{date}",
-                name=f"日记: {date}",
-                description=f"查看 {date} 的日记内容",
+                uri=f"diary://{day}",
+                name=f"日记: {day}",
+                description=f"查看 {day} 的日记内容",
                 mimeType="text/markdown"
             )
         )
@@ -140,14 +203,14 @@ async def handle_list_resources() -> list[Resource]:
 async def handle_read_resource(uri: str) -> str:
     """读取指定日记内容"""
     if uri.startswith("diary://"):
-        date = uri.replace("diary://", "")
-        file_path = Path(DIARY_DIR) / f"{date}.md"
+        day = uri.replace("diary://", "")
+        await run_in_tool_thread(wait_for_index)
+        diary = vault.get_diary(day)
 
-        if file_path.exists():
-            diary = parse_diary(file_path)
+        if diary:
             return diary["full_content"]
         else:
-            return f"# 日记不存在\n\n日期 {date} 的日记文件不存在。"
+            return f"# 日记不存在\n\n日期 {day} 的日记文件不存在。"
 
     return "未知的资源 URI"
 
@@ -170,8 +233,12 @@ async def handle_list_tools() -> list[Tool]:
                     },
                     "recent": {
                         "type": "boolean",
-                        "description": "是否只返回最近的日记",
+                        "description": "是否从最近的日记开始（翻页时向更早的日期继续）",
                         "default": True
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "上一页结果末尾给出的 cursor，用于继续获取"
                     }
                 }
             }
@@ -192,23 +259,63 @@ async def handle_list_tools() -> list[Tool]:
         ),
         Tool(
             name="search_diaries",
-            description="在所有日记中搜索关键词",
+            description="在日记（或整个知识库）中搜索关键词，按相关度 (BM25) 排序",
             inputSchema={
                 "type": "object",
                 "properties": {
                     "keyword": {
                         "type": "string",
-                        "description": "要搜索的关键词"
+                        "description": "要搜索的关键词；空格分隔表示 AND，OR 表示或，引号表示短语，英文词尾 * 表示前缀"
                     },
                     "limit": {
                         "type": "number",
                         "description": "返回结果数量限制",
                         "default": 5
+                    },
+                    "scope": {
+                        "type": "string",
+                        "enum": ["daily", "vault"],
+                        "description": "搜索范围：daily 只搜 01-Daily，vault 搜整个知识库",
+                        "default": "daily"
+                    },
+                    "min_score": {
+                        "type": "number",
+                        "description": "最低相关度，低于该值的结果不返回",
+                        "default": 0
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "上一页结果末尾给出的 cursor，用于继续获取"
                     }
                 },
                 "required": ["keyword"]
             }
         ),
+        Tool(
+            name="semantic_search",
+            description="按语义检索知识库（如搜\"累\"也能找到写\"疲惫\"的日记），返回最相近的笔记片段",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "查询内容，可以是词语或一句话"
+                    },
+                    "limit": {
+                        "type": "number",
+                        "description": "返回结果数量限制",
+                        "default": 5
+                    },
+                    "scope": {
+                        "type": "string",
+                        "enum": ["daily", "vault"],
+                        "description": "搜索范围：daily 只搜 01-Daily，vault 搜整个知识库",
+                        "default": "vault"
+                    }
+                },
+                "required": ["query"]
+            }
+        ),
         Tool(
             name="get_diary_summary",
             description="获取日记的摘要信息（标题、日期、状态等）",
@@ -238,6 +345,14 @@ async def handle_list_tools() -> list[Tool]:
                         "type": "number",
                         "description": "最低情绪分数 (0-10)",
                         "default": 0
+                    },
+                    "start_date": {
+                        "type": "string",
+                        "description": "起始日期 (YYYY-MM-DD)，可选"
+                    },
+                    "end_date": {
+                        "type": "string",
+                        "description": "结束日期 (YYYY-MM-DD)，可选"
                     }
                 }
             }
@@ -255,119 +370,331 @@ async def handle_list_tools() -> list[Tool]:
                     }
                 }
             }
+        ),
+        Tool(
+            name="get_state_trend",
+            description="精力/情绪的滑动平均趋势",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "window": {
+                        "type": "number",
+                        "description": "滑动窗口天数",
+                        "default": 7
+                    },
+                    "days": {
+                        "type": "number",
+                        "description": "显示最近几篇日记",
+                        "default": 30
+                    }
+                }
+            }
+        ),
+        Tool(
+            name="get_period_review",
+            description="按周/月汇总习惯、精力、情绪和字数（用于周复盘、月复盘）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "period": {
+                        "type": "string",
+                        "enum": ["day", "week", "month"],
+                        "description": "汇总周期",
+                        "default": "week"
+                    },
+                    "count": {
+                        "type": "number",
+                        "description": "最近几个周期，如最近 12 周",
+                        "default": 12
+                    },
+                    "end_date": {
+                        "type": "string",
+                        "description": "截止日期 (YYYY-MM-DD)，默认最新一篇日记"
+                    }
+                }
+            }
+        ),
+        Tool(
+            name="backlinks",
+            description="反向链接：哪些笔记链接到了指定笔记（或带有指定 #标签）",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "note": {
+                        "type": "string",
+                        "description": "笔记名、相对路径或日期 (YYYY-MM-DD)；以 # 开头时按标签查询"
+                    },
+                    "limit": {
+                        "type": "number",
+                        "description": "每页数量",
+                        "default": 50
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "上一页返回的 cursor，用于翻页"
+                    }
+                },
+                "required": ["note"]
+            }
+        ),
+        Tool(
+            name="neighbors",
+            description="链接图上与指定笔记相距 depth 跳以内的笔记",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "note": {
+                        "type": "string",
+                        "description": "笔记名、相对路径或日期 (YYYY-MM-DD)"
+                    },
+                    "depth": {
+                        "type": "number",
+                        "description": "跳数（1-3）",
+                        "default": 1
+                    },
+                    "direction": {
+                        "type": "string",
+                        "enum": ["both", "out", "in"],
+                        "description": "out 只沿出链，in 只沿反链",
+                        "default": "both"
+                    },
+                    "limit": {
+                        "type": "number",
+                        "description": "最多返回多少篇",
+                        "default": 100
+                    }
+                },
+                "required": ["note"]
+            }
+        ),
+        Tool(
+            name="orphans",
+            description="孤立笔记：没有反链、也没有链接到其他笔记",
+            inputSchema={
+                "type": "object",
+                "properties": {
+                    "include_diaries": {
+                        "type": "boolean",
+                        "description": "是否包含日记",
+                        "default": False
+                    },
+                    "limit": {
+                        "type": "number",
+                        "description": "每页数量",
+                        "default": 50
+                    },
+                    "cursor": {
+                        "type": "string",
+                        "description": "上一页返回的 cursor，用于翻页"
+                    }
+                }
+            }
         )
     ]
 
 @server.call_tool()
 async def handle_call_tool(name: str, arguments: dict) -> list[TextContent | ImageContent | EmbeddedResource]:
-    """处理工具调用"""
+    """处理工具调用（在工具线程池中执行，多个调用可以并行）"""
+    try:
+        return await run_in_tool_thread(run_tool, name, arguments)
+    except ToolCancelled:
+        return [TextContent(type="text", text="请求已取消")]
+
+def run_tool(name: str, arguments: dict, cancel: threading.Event) -> list[TextContent | ImageContent | EmbeddedResource]:
+    """执行工具调用（同步，运行在工具线程中）"""
+    # 索引由后台监听维护，这里只读当前索引（首次扫描完成前等待）
+    wait_for_index(cancel)
 
     # ===== list_diaries: 列出日记 =====
     if name == "list_diaries":
-        files = get_diary_files()
-        limit = arguments.get("limit", 10)
+        dates = vault.diary_dates()
+        limit = max(1, int(arguments.get("limit", 10)))
         recent = arguments.get("recent", True)
 
-        if recent:
-            files = files[-limit:]
+        # 游标记录上一页边界的日期：recent 时向更早翻页，否则向更晚翻页
+        anchor = None
+        if arguments.get("cursor"):
+            cursor = decode_cursor(arguments["cursor"])
+            if cursor is None or cursor.get("tool") != "list_diaries":
+                return [TextContent(type="text", text="错误: 无效的 cursor")]
+            anchor = cursor["date"]
+            recent = cursor["recent"]
 
-        result = "# 日记列表\n\n"
-        for file in files:
-            date = file.stem
-            diary = parse_diary(file)
-            title = diary["metadata"].get("title", date)
-            result += f"- **{date}**: {title}\n"
-
-        result += f"\n共 {len(files)} 篇日记"
-        return [TextContent(type="text", text=result)]
+        if recent:
+            end = bisect.bisect_left(dates, anchor) if anchor else len(dates)
+            start = max(0, end - limit)
+            has_more = start > 0
+        else:
+            start = bisect.bisect_right(dates, anchor) if anchor else 0
+            end = start + limit
+            has_more = end < len(dates)
+        page = dates[start:end]
+
+        lines = ["# 日记列表", ""]
+        for diary in vault.diaries(page):
+            day = diary["date"]
+            title = diary["metadata"].get("title", day)
+            lines.append(f"- **{day}**: {title}")
+
+        lines.append("")
+        lines.append(f"共 {len(dates)} 篇日记，本页 {len(page)} 篇")
+        if has_more and page:
+            next_cursor = encode_cursor({
+                "tool": "list_diaries", "recent": recent,
+                "date": page[0] if recent else page[-1]
+            })
+            lines.append(f"更多: cursor={next_cursor}")
+        return [TextContent(type="text", text="\n".join(lines))]
 
     # ===== read_diary: 读取日记 =====
     elif name == "read_diary":
-        date = arguments.get("date")
-        if not date:
+        day = arguments.get("date")
+        if not day:
             return [TextContent(type="text", text="错误: 请提供日期参数")]
 
-        file_path = Path(DIARY_DIR) / f"{date}.md"
+        diary = vault.get_diary(day)
 
-        if not file_path.exists():
-            return [TextContent(type="text", text=f"错误: 日期 {date} 的日记不存在")]
+        if not diary:
+            return [TextContent(type="text", text=f"错误: 日期 {day} 的日记不存在")]
 
-        diary = parse_diary(file_path)
         return [TextContent(type="text", text=diary["full_content"])]
 
     # ===== search_diaries: 搜索日记 =====
     elif name == "search_diaries":
         keyword = arguments.get("keyword", "")
-        limit = arguments.get("limit", 5)
+        limit = max(1, int(arguments.get("limit", 5)))
+        scope = arguments.get("scope", "daily")
+        min_score = float(arguments.get("min_score", 0))
 
         if not keyword:
             return [TextContent(type="text", text="错误: 请提供搜索关键词")]
 
-        files = get_diary_files()
-        results = []
-
-        for file in files:
-            diary = parse_diary(file)
-            # 搜索标题和正文
-            if keyword in diary["body"] or keyword in diary["metadata"].get("title", ""):
-                # 提取匹配的上下文
-                body_lines = diary["body"].split('\n')
-                contexts = []
-                for i, line in enumerate(body_lines):
-                    if keyword in line:
-                        start = max(0, i - 1)
-                        end = min(len(body_lines), i + 2)
-                        context = '\n'.join(body_lines[start:end])
-                        contexts.append(context)
-
-                results.append({
-                    "date": diary["date"],
-                    "title": diary["metadata"].get("title", diary["date"]),
-                    "contexts": contexts[:3]  # 最多3个上下文
-                })
-
-        if not results:
+        # 游标记录上一页最后一条的 (得分, 路径)、已显示的条数和已翻过的命中数
+        after = None
+        shown = 0
+        seen = 0
+        if arguments.get("cursor"):
+            cursor = decode_cursor(arguments["cursor"])
+            if cursor is None or cursor.get("tool") != "search_diaries" or cursor.get("keyword") != keyword:
+                return [TextContent(type="text", text="错误: 无效的 cursor（与当前关键词不匹配）")]
+            after = (cursor["score"], cursor["doc_id"])
+            shown = cursor["shown"]
+            seen = cursor.get("seen", shown)
+            scope = cursor["scope"]
+            min_score = cursor["min_score"]
+
+        # 只对本页的 limit 条结果收集偏移和生成片段
+        hits, total = vault.search(keyword, scope, limit, after, min_score)
+
+        if not hits:
+            if after is not None:
+                return [TextContent(type="text", text=f"'{keyword}' 没有更多结果")]
             return [TextContent(type="text", text=f"未找到包含关键词 '{keyword}' 的日记")]
 
+        results = []
+        for hit in hits:
+            check_cancelled(cancel)
+            # 按倒排表中记录的偏移截取上下文，最多3个；检索之后被删除的笔记跳过
+            found = vault.hit_note(hit, max_snippets=3)
+            if found is None:
+                continue
+            diary, contexts = found
+            results.append({
+                # 日记显示日期，其他笔记显示相对路径
+                "date": diary["date"] if vault.is_diary(hit["doc_id"]) else vault.rel_path(hit["doc_id"]),
+                "title": diary["metadata"].get("title", diary["date"]),
+                "score": hit["score"],
+                "contexts": contexts
+            })
+
         # 格式化结果
-        result_text = f"# 搜索结果: '{keyword}'\n\n"
-        for r in results[:limit]:
-            result_text += f"## {r['date']} - {r['title']}\n\n"
+        parts = [f"# 搜索结果: '{keyword}'\n\n"]
+        for r in results:
+            parts.append(f"## {r['date']} - {r['title']} (相关度 {r['score']:.2f})\n\n")
             for ctx in r['contexts']:
-                result_text += f"```\n{ctx}\n```\n\n"
-            result_text += "---\n\n"
-
-        result_text += f"\n共找到 {len(results)} 篇相关日记"
-        return [TextContent(type="text", text=result_text)]
+                parts.append(f"```\n{ctx}\n```\n\n")
+            parts.append("---\n\n")
+
+        # 已显示只计实际输出的结果；检索后被删除而跳过的命中只计入翻过的数量
+        shown += len(results)
+        seen += len(hits)
+        parts.append(f"\n共找到 {total} 篇相关日记，已显示 {shown} 篇")
+        if seen < total:
+            last = hits[-1]
+            next_cursor = encode_cursor({
+                "tool": "search_diaries", "keyword": keyword, "scope": scope,
+                "min_score": min_score, "score": last["score"], "doc_id": last["doc_id"],
+                "shown": shown, "seen": seen
+            })
+            parts.append(f"\n更多: cursor={next_cursor}")
+        return [TextContent(type="text", text="".join(parts))]
+
+    # ===== semantic_search: 语义检索 =====
+    elif name == "semantic_search":
+        query = arguments.get("query", "")
+        limit = max(1, int(arguments.get("limit", 5)))
+        scope = arguments.get("scope", "vault")
+
+        if not query:
+            return [TextContent(type="text", text="错误: 请提供查询内容")]
+
+        doc_filter = vault.in_diary_root if scope == "daily" else None
+        if semantic_index.available and not semantic_index.building:
+            hits = semantic_index.search(query, limit, doc_filter)
+            header = f"# 语义检索: '{query}'"
+        else:
+            # 未安装 numpy 或模型仍在后台训练：退化为关键词检索
+            hits, _ = vault.search(query, scope, limit)
+            reason = "语义模型构建中" if semantic_index.available else "未安装 numpy"
+            header = f"# 语义检索: '{query}'（{reason}，已退化为关键词检索）"
+
+        if not hits:
+            return [TextContent(type="text", text=f"未找到与 '{query}' 相关的笔记")]
+
+        parts = [header, ""]
+        for hit in hits:
+            check_cancelled(cancel)
+            note = vault.notes.get(hit["doc_id"])
+            if note is None:
+                continue
+            label = note["date"] if vault.is_diary(hit["doc_id"]) else vault.rel_path(hit["doc_id"])
+            if "span" in hit:
+                start, end = hit["span"]
+                excerpt = note["body"][start:end].strip()
+            else:
+                excerpt = "\n".join(vault.text_index.snippets(hit["doc_id"], hit["spans"], max_snippets=1)).strip()
+            if len(excerpt) > 300:
+                excerpt = excerpt[:300] + "..."
+            parts.append(f"## {label} - {note['metadata'].get('title', note['date'])} (相似度 {hit['score']:.2f})")
+            parts.append("")
+            parts.append(f"```\n{excerpt}\n```")
+            parts.append("")
+        return [TextContent(type="text", text="\n".join(parts))]
 
     # ===== get_diary_summary: 获取日记摘要 =====
     elif name == "get_diary_summary":
-        date = arguments.get("date")
-        if not date:
+        day = arguments.get("date")
+        if not day:
             return [TextContent(type="text", text="错误: 请提供日期参数")]
 
-        file_path = Path(DIARY_DIR) / f"{date}.md"
+        diary = vault.get_diary(day)
 
-        if not file_path.exists():
-            return [TextContent(type="text", text=f"错误: 日期 {date} 的日记不存在")]
+        if not diary:
+            return [TextContent(type="text", text=f"错误: 日期 {day} 的日记不存在")]
 
-        diary = parse_diary(file_path)
         metadata = diary["metadata"]
         body = diary["body"]
 
-        # 提取状态信息
-        state_match = re.search(r'精力\s+(\d+)/10.*?情绪\s+(\d+)/10', body)
-        energy = state_match.group(1) if state_match else "未知"
-        mood = state_match.group(2) if state_match else "未知"
-
-        # 提取感悟
-        insights_match = re.search(r'## 感悟\s*\n>(.*?)\n', body, re.DOTALL)
-        insight = insights_match.group(1).strip() if insights_match else "无"
+        # 状态和感悟在日记变化时已抽取到指标表
+        stats = diary_stats.get(diary["file_path"]) or {}
+        energy = stats.get("energy") if stats.get("energy") is not None else "未知"
+        mood = stats.get("mood") if stats.get("mood") is not None else "未知"
+        insight = stats.get("insight") or "无"
 
-        result = f"""# {date} 日记摘要
+        result = f"""# {day} 日记摘要
 
-**标题**: {metadata.get('title', date)}
-**日期**: {metadata.get('date', date)}
+**标题**: {metadata.get('title', day)}
+**日期**: {metadata.get('date', day)}
 **精力**: {energy}/10
 **情绪**: {mood}/10
 
@@ -382,98 +709,290 @@ async def handle_call_tool(name: str, arguments: dict) -> list[TextContent | Ima
 
     # ===== search_by_state: 按状态搜索 =====
     elif name == "search_by_state":
-        min_energy = arguments.get("min_energy", 0)
-        min_mood = arguments.get("min_mood", 0)
+        try:
+            min_energy = float(arguments.get("min_energy", 0))
+            min_mood = float(arguments.get("min_mood", 0))
+        except (TypeError, ValueError):
+            return [TextContent(type="text", text="错误: min_energy 和 min_mood 必须是数字")]
+        start_date = arguments.get("start_date")
+        end_date = arguments.get("end_date")
 
-        files = get_diary_files()
         results = []
 
-        for file in files:
-            diary = parse_diary(file)
-            body = diary["body"]
-
-            state_match = re.search(r'精力\s+(\d+)/10.*?情绪\s+(\d+)/10', body)
-            if state_match:
-                energy = int(state_match.group(1))
-                mood = int(state_match.group(2))
-
-                if energy >= min_energy and mood >= min_mood:
-                    results.append({
-                        "date": diary["date"],
-                        "title": diary["metadata"].get("title", diary["date"]),
-                        "energy": energy,
-                        "mood": mood
-                    })
+        for day, path, energy, mood in diary_stats.by_state(min_energy, min_mood, start_date, end_date):
+            diary = vault.notes.get(path)
+            if diary is None:
+                continue
+            results.append({
+                "date": day,
+                "title": diary["metadata"].get("title", day),
+                "energy": energy,
+                "mood": mood
+            })
 
         if not results:
-            return [TextContent(type="text", text=f"未找到符合条件 (精力>={min_energy}, 情绪>={min_mood}) 的日记")]
+            return [TextContent(type="text", text=f"未找到符合条件 (精力>={min_energy:g}, 情绪>={min_mood:g}) 的日记")]
 
-        result_text = f"# 按状态搜索结果 (精力>={min_energy}, 情绪>={min_mood})\n\n"
+        lines = [f"# 按状态搜索结果 (精力>={min_energy:g}, 情绪>={min_mood:g})", ""]
         for r in results:
-            result_text += f"- **{r['date']}**: {r['title']} (精力 {r['energy']}/10, 情绪 {r['mood']}/10)\n"
+            lines.append(f"- **{r['date']}**: {r['title']} (精力 {r['energy']}/10, 情绪 {r['mood']}/10)")
 
-        return [TextContent(type="text", text=result_text)]
+        return [TextContent(type="text", text="\n".join(lines) + "\n")]
 
     # ===== get_habits_summary: 习惯统计 =====
     elif name == "get_habits_summary":
-        days = arguments.get("days", 7)
-
-        files = get_diary_files()[-days:]
-
-        habits = {
-            "论文": 0,
-            "运动": 0,
-            "喝水": 0,
-            "饮食": 0
-        }
-
-        total = len(files)
+        days = max(1, int(arguments.get("days", 7)))
 
-        for file in files:
-            diary = parse_diary(file)
-            body = diary["body"]
+        dates = vault.diary_dates()[-days:]
 
-            # 简单检查习惯完成情况
-            if "论文" in body and ("✅" in body or "完成" in body):
-                habits["论文"] += 1
-            if "运动" in body or "散步" in body or "健身" in body:
-                habits["运动"] += 1
-            if "喝水" in body and ("✅" in body or "L" in body or "ml" in body):
-                habits["喝水"] += 1
-            if "饮食" in body or "午：" in body or "晚：" in body:
-                habits["饮食"] += 1
+        if dates:
+            total, habits = diary_stats.habit_counts(dates[0], dates[-1])
+        else:
+            total, habits = 0, {}
+        # 连续天数同样只在这段时间内计算
+        streaks = diary_stats.habit_streaks(dates[0], dates[-1]) if dates else {}
 
-        result = f"# 习惯打卡统计 (最近 {total} 天)\n\n"
-        result += "| 习惯 | 完成天数 | 完成率 |\n"
-        result += "|------|---------|-------|\n"
+        lines = [
+            f"# 习惯打卡统计 (最近 {total} 天)",
+            "",
+            "| 习惯 | 完成天数 | 完成率 | 当前连续 | 最长连续 |",
+            "|------|---------|-------|---------|---------|",
+        ]
 
         for habit, count in habits.items():
             rate = f"{count/total*100:.1f}%" if total > 0 else "0%"
-            result += f"| {habit} | {count}/{total} | {rate} |\n"
-
-        return [TextContent(type="text", text=result)]
+            current, longest = streaks.get(habit, (0, 0))
+            lines.append(f"| {habit} | {count}/{total} | {rate} | {current} 天 | {longest} 天 |")
+
+        return [TextContent(type="text", text="\n".join(lines) + "\n")]
+
+    # ===== get_state_trend: 状态趋势 =====
+    elif name == "get_state_trend":
+        window = int(arguments.get("window", 7))
+        days = int(arguments.get("days", 30))
+
+        rows = diary_stats.rolling_state(window)[-days:]
+        if not rows:
+            return [TextContent(type="text", text="暂无精力/情绪记录")]
+
+        lines = [
+            f"# 精力/情绪趋势 ({window} 天滑动平均)",
+            "",
+            "| 日期 | 精力 | 情绪 | 精力均值 | 情绪均值 |",
+            "|------|-----|-----|---------|---------|",
+        ]
+        for day, energy, mood, avg_energy, avg_mood in rows:
+            lines.append(f"| {day} | {energy} | {mood} | {avg_energy:.1f} | {avg_mood:.1f} |")
+
+        return [TextContent(type="text", text="\n".join(lines) + "\n")]
+
+    # ===== get_period_review: 周期复盘 =====
+    elif name == "get_period_review":
+        period = arguments.get("period", "week")
+        count = max(1, min(int(arguments.get("count", 12)), 366))
+        if period not in ("day", "week", "month"):
+            return [TextContent(type="text", text=f"错误: 未知的周期 {period}")]
+
+        end = None
+        if arguments.get("end_date"):
+            try:
+                end = date.fromisoformat(arguments["end_date"])
+            except ValueError:
+                return [TextContent(type="text", text="错误: end_date 格式应为 YYYY-MM-DD")]
+
+        rows = diary_rollups.review(period, count, end)
+        if not rows:
+            return [TextContent(type="text", text="暂无日记")]
+
+        label = {"day": "天", "week": "周", "month": "个月"}[period]
+        habits = list(rows[0]["habits"])
+        lines = [
+            f"# 最近 {count} {label}复盘 ({rows[0]['start']} ~ {rows[-1]['end']})",
+            "",
+            "| 周期 | 日记 | 字数 | 精力均值 | 情绪均值 | " + " | ".join(habits) + " |",
+            "|------|-----|-----|---------|---------|" + "-----|" * len(habits),
+        ]
+
+        def fmt(value):
+            return f"{value:.1f}" if value is not None else "-"
+
+        totals = {"diaries": 0, "words": 0, "habits": dict.fromkeys(habits, 0)}
+        for row in rows:
+            total = row["diaries"]
+            cells = [f"{row['habits'][h]}/{total}" if total else "-" for h in habits]
+            lines.append(f"| {row['key']} | {total} | {row['words']} | {fmt(row['energy'])} | "
+                         f"{fmt(row['mood'])} | " + " | ".join(cells) + " |")
+            totals["diaries"] += total
+            totals["words"] += row["words"]
+            for h in habits:
+                totals["habits"][h] += row["habits"][h]
+
+        total = totals["diaries"]
+        rates = [f"{totals['habits'][h]/total*100:.0f}%" if total else "-" for h in habits]
+        lines.append(f"| **合计** | {total} | {totals['words']} | | | " + " | ".join(rates) + " |")
+
+        return [TextContent(type="text", text="\n".join(lines) + "\n")]
+
+    # ===== backlinks: 反向链接 =====
+    elif name == "backlinks":
+        target = (arguments.get("note") or "").strip()
+        if not target:
+            return [TextContent(type="text", text="错误: 请提供 note 参数")]
+        limit = max(1, int(arguments.get("limit", 50)))
+
+        after = None
+        if arguments.get("cursor"):
+            cursor = decode_cursor(arguments["cursor"])
+            if cursor is None or cursor.get("tool") != "backlinks" or cursor.get("note") != target:
+                return [TextContent(type="text", text="错误: 无效的 cursor")]
+            after = cursor["after"]
+
+        if target.startswith("#"):
+            sources = link_graph.tagged(target)
+            header = f"# 标签 {target}"
+            stem = None
+        else:
+            found = link_graph.backlinks(target)
+            if found is None:
+                return [TextContent(type="text", text=f"错误: 找不到笔记 {target}")]
+            node, sources = found
+            suffix = "" if node["exists"] else "（未创建）"
+            header = f"# 反向链接: {node['name']}{suffix}"
+            stem = node["name"].rsplit("/", 1)[-1].removesuffix(".md").casefold()
+
+        page, has_more = page_after(sources, limit, after)
+        lines = [header, ""]
+        for path in page:
+            note = vault.notes.get(path)
+            if note is None:
+                continue
+            title = note["metadata"].get("title", note["date"])
+            lines.append(f"- **{vault.rel_path(path)}**: {title}")
+            # 附上第一处提到目标的行作为上下文
+            if stem:
+                context = next((line.strip() for line in note["body"].splitlines()
+                                if stem in line.casefold()), None)
+                if context:
+                    lines.append(f"  > {context[:200]}")
+
+        lines.append("")
+        lines.append(f"共 {len(sources)} 篇，本页 {len(page)} 篇")
+        if has_more and page:
+            next_cursor = encode_cursor({"tool": "backlinks", "note": target, "after": page[-1]})
+            lines.append(f"更多: cursor={next_cursor}")
+        return [TextContent(type="text", text="\n".join(lines))]
+
+    # ===== neighbors: 链接图邻居 =====
+    elif name == "neighbors":
+        target = (arguments.get("note") or "").strip()
+        if not target:
+            return [TextContent(type="text", text="错误: 请提供 note 参数")]
+        depth = max(1, min(int(arguments.get("depth", 1)), 3))
+        direction = arguments.get("direction", "both")
+        if direction not in ("both", "out", "in"):
+            return [TextContent(type="text", text=f"错误: 未知的方向 {direction}")]
+        limit = max(1, int(arguments.get("limit", 100)))
+
+        found = link_graph.neighbors(target, depth, direction)
+        if found is None:
+            return [TextContent(type="text", text=f"错误: 找不到笔记 {target}")]
+        node, nodes = found
+
+        lines = [f"# {node['name']} 的 {depth} 跳邻居", ""]
+        current = None
+        for item in nodes[:limit]:
+            if item["distance"] != current:
+                current = item["distance"]
+                lines.append(f"## {current} 跳")
+            if item["exists"]:
+                note = vault.notes.get(item["path"])
+                title = note["metadata"].get("title", note["date"]) if note else ""
+                lines.append(f"- **{item['name']}**: {title}")
+            else:
+                lines.append(f"- {item['name']}（未创建）")
+
+        lines.append("")
+        shown = f"，显示前 {limit} 篇" if len(nodes) > limit else ""
+        lines.append(f"共 {len(nodes)} 个节点{shown}")
+        return [TextContent(type="text", text="\n".join(lines))]
+
+    # ===== orphans: 孤立笔记 =====
+    elif name == "orphans":
+        include_diaries = bool(arguments.get("include_diaries", False))
+        limit = max(1, int(arguments.get("limit", 50)))
+
+        after = None
+        if arguments.get("cursor"):
+            cursor = decode_cursor(arguments["cursor"])
+            if cursor is None or cursor.get("tool") != "orphans":
+                return [TextContent(type="text", text="错误: 无效的 cursor")]
+            after = cursor["after"]
+            include_diaries = cursor["include_diaries"]
+
+        paths = link_graph.orphans(include_diaries)
+        page, has_more = page_after(paths, limit, after)
+
+        lines = ["# 孤立笔记", ""]
+        for path in page:
+            note = vault.notes.get(path)
+            title = note["metadata"].get("title", note["date"]) if note else ""
+            lines.append(f"- **{vault.rel_path(path)}**: {title}")
+
+        lines.append("")
+        lines.append(f"共 {len(paths)} 篇，本页 {len(page)} 篇")
+        if has_more and page:
+            next_cursor = encode_cursor({"tool": "orphans", "include_diaries": include_diaries,
+                                         "after": page[-1]})
+            lines.append(f"更多: cursor={next_cursor}")
+        return [TextContent(type="text", text="\n".join(lines))]
 
     else:
         return [TextContent(type="text", text=f"未知的工具: {name}")]
 
 # ==================== Main ====================
 
+def build_semantic_index():
+    """等待首次扫描完成后训练/载入语义模型（后台线程）"""
+    vault.wait_ready()
+    try:
+        semantic_index.build()
+    except Exception as e:
+        # stdout 是 MCP 通道，日志写到 stderr；查询时会再次尝试
+        print(f"语义模型构建失败: {e}", file=sys.stderr)
+
 async def main():
     """启动 MCP 服务器"""
+    if vault is None:
+        init_vault()
+
+    # 后台监听知识库变化，增量更新索引
+    watcher = VaultWatcher(vault)
+    watcher_task = asyncio.create_task(watcher.run())
+
+    # 首次扫描完成后在后台训练语义模型，首次 semantic_search 不必等待
+    threading.Thread(target=build_semantic_index, name="semantic-build", daemon=True).start()
+
     # 运行服务器
-    async with stdio_server() as (read_stream, write_stream):
-        await server.run(
-            read_stream,
-            write_stream,
-            InitializationOptions(
-                server_name="diary-server",
-                server_version="1.0.0",
-                capabilities=server.get_capabilities(
-                    notification_options=NotificationOptions(),
-                    experimental_capabilities={},
+    try:
+        async with stdio_server() as (read_stream, write_stream):
+            await server.run(
+                read_stream,
+                write_stream,
+                InitializationOptions(
+                    server_name="diary-server",
+                    server_version="1.0.0",
+                    capabilities=server.get_capabilities(
+                        notification_options=NotificationOptions(),
+                        experimental_capabilities={},
+                    )
                 )
             )
-        )
+    finally:
+        watcher_task.cancel()
+        try:
+            await watcher_task
+        except asyncio.CancelledError:
+            pass
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+日记结构化指标
+每篇日记变化时只抽取一次精力、情绪、感悟和习惯打卡，存入缓存数据库中的 diary_stats 表
+（每个指标一列）。按状态筛选、滑动平均、连续打卡等查询都在 SQLite 里用窗口函数完成，
+不再对全文做正则扫描。
+"""
+
+import re
+from typing import Any, Callable, Iterable
+
+from diary_cache import DiaryCache
+
+# 与原 search_by_state / get_diary_summary 的正则保持一致（. 不跨行）
+STATE_RE = re.compile(r'精力\s+(\d+)/10.*?情绪\s+(\d+)/10')
+INSIGHT_RE = re.compile(r'## 感悟\s*\n>(.*?)\n', re.DOTALL)
+
+# 习惯名 -> 列名
+HABITS = {
+    "论文": "habit_paper",
+    "运动": "habit_exercise",
+    "喝水": "habit_water",
+    "饮食": "habit_diet",
+}
+
+
+def extract_stats(body: str) -> dict[str, Any]:
+    """从日记正文抽取结构化指标"""
+    state_match = STATE_RE.search(body)
+    insight_match = INSIGHT_RE.search(body)
+    done = "✅" in body
+
+    return {
+        "energy": int(state_match.group(1)) if state_match else None,
+        "mood": int(state_match.group(2)) if state_match else None,
+        "insight": insight_match.group(1).strip() if insight_match else None,
+        # 简单检查习惯完成情况（与原 get_habits_summary 规则相同）
+        "habit_paper": int("论文" in body and (done or "完成" in body)),
+        "habit_exercise": int("运动" in body or "散步" in body or "健身" in body),
+        "habit_water": int("喝水" in body and (done or "L" in body or "ml" in body)),
+        "habit_diet": int("饮食" in body or "午：" in body or "晚：" in body),
+    }
+
+
+class DiaryStats:
+    """diary_stats 表：随 DiaryCache 增量维护"""
+
+    COLUMNS = ["energy", "mood", "insight", *HABITS.values()]
+
+    def __init__(self, cache: DiaryCache, is_diary: Callable[[str], bool]):
+        self.cache = cache
+        self.is_diary = is_diary
+        cache.register(self)
+
+    # ==================== DiaryCache 钩子 ====================
+
+    def create_tables(self, conn):
+        habit_columns = ",\n".join(f"{c} INTEGER NOT NULL" for c in HABITS.values())
+        conn.execute(
+            f"""CREATE TABLE IF NOT EXISTS diary_stats (
+                path TEXT PRIMARY KEY,
+                date TEXT NOT NULL,
+                energy INTEGER,
+                mood INTEGER,
+                insight TEXT,
+                {habit_columns}
+            )"""
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS diary_stats_date ON diary_stats (date)")
+
+    def missing(self, conn) -> list[str]:
+        rows = conn.execute(
+            "SELECT path FROM diaries WHERE path NOT IN (SELECT path FROM diary_stats)")
+        return [path for (path,) in rows if self.is_diary(path)]
+
+    def on_store(self, conn, path: str, diary: dict[str, Any]):
+        if not self.is_diary(path):
+            return
+        stats = extract_stats(diary["body"])
+        conn.execute(
+            f"INSERT OR REPLACE INTO diary_stats (path, date, {', '.join(self.COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(self.COLUMNS))})",
+            (path, diary["date"], *(stats[c] for c in self.COLUMNS))
+        )
+
+    def on_remove(self, conn, paths: Iterable[str]):
+        conn.executemany("DELETE FROM diary_stats WHERE path = ?", [(p,) for p in paths])
+
+    # ==================== 查询 ====================
+
+    def get(self, path: str) -> dict[str, Any] | None:
+        """单篇日记的指标"""
+        rows = self.cache.execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM diary_stats WHERE path = ?", (path,))
+        return dict(zip(self.COLUMNS, rows[0])) if rows else None
+
+    def by_state(self, min_energy: float = 0, min_mood: float = 0,
+                 start: str | None = None, end: str | None = None) -> list[tuple[str, str, int, int]]:
+        """按精力/情绪下限和日期范围筛选，返回 (日期, 路径, 精力, 情绪)"""
+        return self.cache.execute(
+            """SELECT date, path, energy, mood FROM diary_stats
+               WHERE energy >= :min_energy AND mood >= :min_mood
+                 AND date >= :start AND date <= :end
+               ORDER BY date""",
+            {"min_energy": min_energy, "min_mood": min_mood,
+             "start": start or "0000-00-00", "end": end or "9999-99-99"}
+        )
+
+    def habit_counts(self, start: str, end: str) -> tuple[int, dict[str, int]]:
+        """日期范围内的日记数与各习惯完成天数"""
+        sums = ", ".join(f"COALESCE(SUM({c}), 0)" for c in HABITS.values())
+        row = self.cache.execute(
+            f"SELECT COUNT(*), {sums} FROM diary_stats WHERE date >= ? AND date <= ?",
+            (start, end)
+        )[0]
+        return row[0], dict(zip(HABITS, row[1:]))
+
+    def habit_streaks(self, start: str | None = None,
+                      end: str | None = None) -> dict[str, tuple[int, int]]:
+        """日期范围内各习惯的 (当前连续天数, 最长连续天数)
+
+        连续按自然日计算：把完成的日期按 julianday - 行号 分组（gaps and islands）。
+        当前连续指以范围内最后一篇日记结尾的连续天数。
+        """
+        bounds = {"start": start or "0000-00-00", "end": end or "9999-99-99"}
+        result = {}
+        for habit, column in HABITS.items():
+            rows = self.cache.execute(
+                f"""WITH scoped AS (
+                        SELECT date, {column} AS done FROM diary_stats
+                        WHERE date >= :start AND date <= :end
+                    ), done AS (
+                        SELECT date, julianday(date) - ROW_NUMBER() OVER (ORDER BY date) AS grp
+                        FROM scoped WHERE done = 1
+                    ), islands AS (
+                        SELECT COUNT(*) AS length, MAX(date) AS last_date FROM done GROUP BY grp
+                    )
+                    SELECT
+                        COALESCE((SELECT length FROM islands
+                                  WHERE last_date = (SELECT MAX(date) FROM scoped)), 0),
+                        COALESCE((SELECT MAX(length) FROM islands), 0)""",
+                bounds
+            )
+            result[habit] = rows[0]
+        return result
+
+    def rolling_state(self, window: int = 7, start: str | None = None,
+                      end: str | None = None) -> list[tuple[str, int, int, float, float]]:
+        """精力/情绪的滑动平均，返回 (日期, 精力, 情绪, 精力均值, 情绪均值)
+
+        窗口按自然日计算：取当天及之前 window-1 天内有记录的日记求平均。
+        """
+        return self.cache.execute(
+            """SELECT date, energy, mood, avg_energy, avg_mood FROM (
+                   SELECT date, energy, mood,
+                          AVG(energy) OVER w AS avg_energy,
+                          AVG(mood) OVER w AS avg_mood
+                   FROM diary_stats WHERE energy IS NOT NULL
+                   WINDOW w AS (ORDER BY julianday(date)
+                                RANGE BETWEEN :span PRECEDING AND CURRENT ROW)
+               )
+               WHERE date >= :start AND date <= :end
+               ORDER BY date""",
+            {"span": window - 1, "start": start or "0000-00-00", "end": end or "9999-99-99"}
+        )
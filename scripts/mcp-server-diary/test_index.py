@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+测试全文倒排索引的查询语义
+不依赖知识库和 MCP，直接对 InvertedIndex 建几篇小文档并检查命中
+
+运行：
+    python test_index.py
+"""
+
+from diary_index import InvertedIndex, tokenize
+
+DOCS = {
+    "cpp": "今天学习 C++ 模板，✅ 完成小程序的登录页",
+    "disk": "清理 C盘 空间，顺便整理小论文",
+    "yolo": "跑了 YOLOX 的实验，精力 8/10，情绪 7/10",
+    "yolo2": "复现 yolo v8，效果一般",
+    "deep": "读 deep learning 的第三章\n明天继续 learning deep",
+    "spaced": "精力 8 10 情绪 7",
+}
+
+def hits(index: InvertedIndex, query: str) -> list[str]:
+    return sorted(h["doc_id"] for h in index.search(query))
+
+index = InvertedIndex()
+for doc_id, text in DOCS.items():
+    index.add(doc_id, text)
+
+print("=" * 50)
+print("倒排索引查询测试")
+print("=" * 50)
+
+# 测试 1: 切分
+print("\n1. 切分")
+terms = [t[0] for t in tokenize("小程序 YOLO v8")]
+print(f"   {terms}")
+assert terms == ["小程", "程序", "yolo", "v8"]
+
+# 测试 2: 中文子串、单字
+print("\n2. 中文子串与单字")
+assert hits(index, "小程序") == ["cpp"]
+assert hits(index, "程") == ["cpp"]
+assert hits(index, "小") == ["cpp", "disk"]
+print("   ✓ 小程序 / 程 / 小")
+
+# 测试 3: AND / OR / 短语
+print("\n3. AND / OR / 短语")
+assert hits(index, "小程序 模板") == ["cpp"]
+assert hits(index, "小程序 小论文") == []
+assert hits(index, "小程序 OR 小论文") == ["cpp", "disk"]
+assert hits(index, "小程序 | 小论文") == ["cpp", "disk"]
+assert hits(index, '"deep learning"') == ["deep"]
+assert hits(index, '"learning deep"') == ["deep"]
+assert hits(index, '"deep deep"') == []
+print("   ✓ AND、OR、短语")
+
+# 测试 4: 英文整词、词内子串与前缀
+print("\n4. 英文匹配")
+assert hits(index, "YOLO") == ["yolo", "yolo2"]   # 词内子串：YOLO 命中 YOLOX
+assert hits(index, "yolox") == ["yolo"]
+assert hits(index, "olo*") == []                  # 前缀只匹配词首
+assert hits(index, "yol*") == ["yolo", "yolo2"]
+print("   ✓ YOLO / yolox / olo* / yol*")
+
+# 测试 5: 含符号的词按原文子串匹配
+print("\n5. 符号")
+assert hits(index, "✅") == ["cpp"]
+assert hits(index, "C++") == ["cpp"]             # 不会退化成 c 而命中 C盘
+assert hits(index, "c++") == ["cpp"]
+assert hits(index, "C盘") == ["disk"]
+assert hits(index, "8/10") == ["yolo"]           # 分隔符必须一致，不命中 "8 10"
+assert hits(index, "✅ 小程序") == ["cpp"]
+assert hits(index, "???") == []
+span = index.search("C++")[0]["spans"][0]
+print(f"   C++ 命中偏移 {span}: {DOCS['cpp'][span[0]:span[1]]!r}")
+assert DOCS["cpp"][span[0]:span[1]] == "C++"
+print("   ✓ ✅ / C++ / C盘 / 8/10")
+
+# 测试 6: 排序、分页和过滤
+print("\n6. 排序与分页")
+results, total = index.search_page("小 OR yolo", limit=2)
+assert total == 4 and len(results) == 2
+last = results[-1]
+rest, _ = index.search_page("小 OR yolo", after=(last["score"], last["doc_id"]))
+assert {h["doc_id"] for h in results} | {h["doc_id"] for h in rest} == {"cpp", "disk", "yolo", "yolo2"}
+assert len(results) + len(rest) == total
+filtered, total = index.search_page("小 OR yolo", doc_filter=lambda d: d.startswith("yolo"))
+assert total == 2 and {h["doc_id"] for h in filtered} == {"yolo", "yolo2"}
+print(f"   ✓ 第一页 {[h['doc_id'] for h in results]}，之后 {[h['doc_id'] for h in rest]}")
+
+# 测试 7: 增量更新与删除
+print("\n7. 增量更新与删除")
+index.add("disk", "清理 D盘 空间")
+assert hits(index, "C盘") == [] and hits(index, "D盘") == ["disk"]
+assert hits(index, "小论文") == []
+index.remove("cpp")
+assert hits(index, "C++") == [] and hits(index, "✅") == [] and hits(index, "程") == []
+assert "cpp" not in index and len(index) == len(DOCS) - 1
+print("   ✓ 更新后旧词项不再命中，删除后所有查询都不再返回")
+
+# 测试 8: 片段
+print("\n8. 片段")
+snippet = index.snippets("deep", index.search("learning")[0]["spans"], max_snippets=1, context_lines=0)
+print(f"   {snippet}")
+assert snippet == ["读 deep learning 的第三章"]
+
+print("\n" + "=" * 50)
+print("测试完成！")
+print("=" * 50)
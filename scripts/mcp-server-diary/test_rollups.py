@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+测试日/周/月汇总表的增量维护
+日记新增、修改、删除后，diary_rollups 应与从头重算的结果一致
+
+运行：
+    python test_rollups.py
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date
+from pathlib import Path
+
+# 与 diary_server.py 共用的 frontmatter 解析（位于上级 scripts 目录）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from obsidian_frontmatter import parse_frontmatter
+
+from diary_cache import DiaryCache
+from diary_rollups import DiaryRollups, count_words
+from diary_stats import DiaryStats
+from vault_index import VaultIndex
+
+# 解析日记 frontmatter 和内容（与 diary_server.parse_diary 相同）
+def parse_diary(file_path: Path) -> dict:
+    content = file_path.read_text(encoding='utf-8')
+    metadata, body_start = parse_frontmatter(content)
+    return {
+        "metadata": metadata,
+        "body": content[body_start:],
+        "full_content": content,
+        "file_path": str(file_path),
+        "file_name": file_path.name,
+        "date": file_path.stem
+    }
+
+def diary_body(energy: int, mood: int, exercise: bool) -> str:
+    return f"精力 {energy}/10，情绪 {mood}/10\n" + ("运动 散步30分钟\n" if exercise else "")
+
+def write_diary(daily: Path, day: str, energy: int, mood: int, exercise: bool):
+    """写入一篇日记；修改时把 mtime 往后拨，保证被识别为变化"""
+    path = daily / day[:7] / f"{day}.md"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    existed = path.exists()
+    old_mtime = path.stat().st_mtime_ns if existed else 0
+    path.write_text(f"---\ntitle: {day}\n---\n{diary_body(energy, mood, exercise)}", encoding='utf-8')
+    if existed:
+        mtime = max(path.stat().st_mtime_ns, old_mtime + 1_000_000_000)
+        os.utime(path, ns=(mtime, mtime))
+    return path
+
+def snapshot(rollups: DiaryRollups, period: str, count: int, end: date) -> list[tuple]:
+    return [(r["key"], r["diaries"], r["words"], r["energy"], r["mood"], r["habits"]["运动"])
+            for r in rollups.review(period, count, end)]
+
+def open_vault(root: Path, db: str) -> tuple[VaultIndex, DiaryRollups]:
+    cache = DiaryCache(root / ".cache" / db, parse_diary)
+    vault = VaultIndex(root, cache, ["01-Daily"], [".*"], "01-Daily")
+    DiaryStats(cache, vault.is_diary)
+    rollups = DiaryRollups(cache, vault.is_diary)
+    vault.refresh(True)
+    return vault, rollups
+
+print("=" * 50)
+print("汇总表增量维护测试")
+print("=" * 50)
+
+root = Path(tempfile.mkdtemp(prefix="rollup-test-"))
+try:
+    daily = root / "01-Daily"
+    # 2026-01-04 是周日，01-05 是下一周的周一
+    write_diary(daily, "2026-01-03", 6, 7, True)
+    write_diary(daily, "2026-01-04", 8, 5, False)
+    write_diary(daily, "2026-01-05", 4, 9, True)
+    write_diary(daily, "2026-02-01", 7, 7, True)
+    end = date(2026, 2, 1)
+
+    # 测试 1: 首次汇总
+    print("\n1. 首次汇总")
+    vault, rollups = open_vault(root, "cache.sqlite3")
+    weeks = snapshot(rollups, "week", 6, end)
+    for row in weeks:
+        print(f"   {row}")
+    assert [w[0] for w in weeks] == ["2025-W52", "2026-W01", "2026-W02", "2026-W03", "2026-W04", "2026-W05"]
+    # 2026-W01 含 01-03、01-04 两篇
+    words = count_words(diary_body(6, 7, True)) + count_words(diary_body(8, 5, False))
+    assert weeks[1][1:] == (2, words, 7.0, 6.0, 1)
+    assert weeks[3] == ("2026-W03", 0, 0, None, None, 0)   # 空周期补 0
+    months = snapshot(rollups, "month", 2, end)
+    assert [(m[0], m[1], m[5]) for m in months] == [("2026-01", 3, 2), ("2026-02", 1, 1)]
+
+    # 测试 2: 修改日记：先减旧贡献再加新贡献
+    print("\n2. 修改")
+    write_diary(daily, "2026-01-04", 2, 3, True)
+    vault.update_paths([str(daily / "2026-01" / "2026-01-04.md")])
+    week = snapshot(rollups, "week", 6, end)[1]
+    print(f"   {week}")
+    assert week[1] == 2 and week[3] == 4.0 and week[4] == 5.0 and week[5] == 2
+
+    # 测试 3: 删除日记：只减去旧贡献，空周期的行被删除
+    print("\n3. 删除")
+    (daily / "2026-02" / "2026-02-01.md").unlink()
+    vault.update_paths([str(daily / "2026-02" / "2026-02-01.md")])
+    months = snapshot(rollups, "month", 2, end)
+    print(f"   {months}")
+    assert months[1][1:] == (0, 0, None, None, 0)
+    rows = vault.cache.execute("SELECT COUNT(*) FROM diary_rollups WHERE start >= '2026-01-26'")
+    assert rows[0][0] == 0
+    assert rollups.latest_date() == date(2026, 1, 5)
+
+    # 测试 4: 增量结果与从头重算一致
+    print("\n4. 与重算对比")
+    incremental = {p: snapshot(rollups, p, 10, end) for p in ("day", "week", "month")}
+    vault.cache.close()
+    rebuilt_vault, rebuilt = open_vault(root, "rebuilt.sqlite3")
+    for period, rows in incremental.items():
+        assert snapshot(rebuilt, period, 10, end) == rows, period
+    print("   ✓ 日/周/月三种周期一致")
+    rebuilt_vault.cache.close()
+finally:
+    shutil.rmtree(root, ignore_errors=True)
+
+print("\n" + "=" * 50)
+print("测试完成！")
+print("=" * 50)
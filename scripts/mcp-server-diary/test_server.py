@@ -5,10 +5,15 @@
 """
 
 import platform
+import sys
 from pathlib import Path
 from datetime import datetime
 import re
 
+# 与 diary_server.py 共用的 frontmatter 解析（位于上级 scripts 目录）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from obsidian_frontmatter import parse_frontmatter, read_metadata
+
 # WSL 路径映射
 def get_real_path(windows_path: str) -> Path:
     """将 Windows 路径转换为 WSL 路径"""
@@ -39,28 +44,11 @@ def get_diary_files() -> list[Path]:
 def parse_diary(file_path: Path) -> dict:
     """解析日记文件"""
     content = file_path.read_text(encoding='utf-8')
-    lines = content.split('\n')
-
-    metadata = {}
-    body_start = 0
-
-    # 解析 frontmatter
-    if lines and lines[0] == '---':
-        for i, line in enumerate(lines[1:], 1):
-            if line == '---':
-                body_start = i + 1
-                break
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip()
-                value = value.strip()
-                metadata[key] = value
-
-    body = '\n'.join(lines[body_start:])
+    metadata, body_start = parse_frontmatter(content)
 
     return {
         "metadata": metadata,
-        "body": body,
+        "body": content[body_start:],
         "full_content": content,
         "file_path": str(file_path),
         "file_name": file_path.name,
@@ -82,6 +70,10 @@ if files:
     print(f"   最早: {files[0].name}")
     print(f"   最新: {files[-1].name}")
 
+    # 列表只需要标题：只读取 frontmatter，不加载正文
+    for file in files[-3:]:
+        print(f"   {file.stem}: {read_metadata(file).get('title', '无')}")
+
 # 测试 3: 解析日记
 if files:
     print(f"\n3. 测试解析最新日记: {files[-1].name}")
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+测试知识库索引的增量更新与删除
+在临时目录中构造知识库，检查 refresh() / update_paths()、解析缓存复用和文件监听的失败重试
+
+运行：
+    python test_vault_update.py
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+# 与 diary_server.py 共用的 frontmatter 解析（位于上级 scripts 目录）
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from obsidian_frontmatter import parse_frontmatter
+
+from diary_cache import DiaryCache
+from vault_index import VaultIndex
+from vault_watcher import VaultWatcher
+
+# 解析日记 frontmatter 和内容（与 diary_server.parse_diary 相同）
+def parse_diary(file_path: Path) -> dict:
+    content = file_path.read_text(encoding='utf-8')
+    metadata, body_start = parse_frontmatter(content)
+    return {
+        "metadata": metadata,
+        "body": content[body_start:],
+        "full_content": content,
+        "file_path": str(file_path),
+        "file_name": file_path.name,
+        "date": file_path.stem
+    }
+
+def write_note(path: Path, title: str, body: str):
+    """写入笔记并把 mtime 往后拨，避免同一时间戳内的修改被当作未变化"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    existed = path.exists()
+    old_mtime = path.stat().st_mtime_ns if existed else 0
+    path.write_text(f"---\ntitle: {title}\n---\n{body}\n", encoding='utf-8')
+    if existed:
+        mtime = max(path.stat().st_mtime_ns, old_mtime + 1_000_000_000)
+        os.utime(path, ns=(mtime, mtime))
+
+def open_vault(root: Path) -> VaultIndex:
+    cache = DiaryCache(root / ".cache" / "cache.sqlite3", parse_diary)
+    return VaultIndex(root, cache, ["01-Daily", "02-Notes"], [".*"], "01-Daily")
+
+def found(vault: VaultIndex, query: str) -> list[str]:
+    hits, _ = vault.search(query, "vault")
+    return sorted(vault.rel_path(h["doc_id"]) for h in hits)
+
+print("=" * 50)
+print("知识库增量更新测试")
+print("=" * 50)
+
+root = Path(tempfile.mkdtemp(prefix="vault-test-"))
+try:
+    daily = root / "01-Daily" / "2026-01"
+    write_note(daily / "2026-01-20.md", "周二", "写小程序")
+    write_note(daily / "2026-01-21.md", "周三", "改小论文")
+    write_note(root / "02-Notes" / "yolo.md", "YOLO", "目标检测笔记")
+    write_note(root / "Other" / "skip.md", "不在根目录", "小程序")
+
+    # 测试 1: 首次全量扫描
+    print("\n1. 首次扫描")
+    vault = open_vault(root)
+    assert not vault.ready.is_set()
+    vault.refresh(True)
+    assert vault.ready.is_set()
+    print(f"   笔记 {len(vault.notes)} 篇，日记 {vault.diary_dates()}")
+    assert vault.diary_dates() == ["2026-01-20", "2026-01-21"]
+    assert found(vault, "小程序") == ["01-Daily/2026-01/2026-01-20.md"]
+
+    # 测试 2: update_paths 处理修改、新增和删除
+    print("\n2. update_paths")
+    write_note(daily / "2026-01-20.md", "周二", "写知识库")
+    write_note(daily / "2026-01-22.md", "周四", "小程序上线")
+    (daily / "2026-01-21.md").unlink()
+    vault.update_paths([str(daily / "2026-01-20.md"), str(daily / "2026-01-22.md"),
+                        str(daily / "2026-01-21.md")])
+    assert vault.diary_dates() == ["2026-01-20", "2026-01-22"]
+    assert found(vault, "小程序") == ["01-Daily/2026-01/2026-01-22.md"]
+    assert found(vault, "知识库") == ["01-Daily/2026-01/2026-01-20.md"]
+    assert found(vault, "小论文") == []
+    assert str(daily / "2026-01-21.md") not in vault.cache.paths()
+    print("   ✓ 修改后旧内容不再命中，新增可检索，删除后从索引和缓存中移除")
+
+    # 测试 3: 目录新增与删除
+    print("\n3. 目录")
+    feb = root / "01-Daily" / "2026-02"
+    write_note(feb / "2026-02-01.md", "二月", "小程序复盘")
+    vault.update_paths([str(feb)])
+    assert "2026-02-01" in vault.diary_dates()
+    shutil.rmtree(feb)
+    vault.update_paths([str(feb)])
+    assert "2026-02-01" not in vault.diary_dates()
+    assert found(vault, "复盘") == []
+    print("   ✓ 新目录下的笔记被扫描，删除目录后其中的笔记全部移除")
+
+    # 测试 4: 忽略根目录之外和被忽略的文件
+    print("\n4. 索引范围")
+    write_note(root / "02-Notes" / ".hidden.md", "隐藏", "小程序")
+    vault.update_paths([str(root / "Other" / "skip.md"), str(root / "02-Notes" / ".hidden.md")])
+    assert found(vault, "小程序") == ["01-Daily/2026-01/2026-01-22.md"]
+    print("   ✓ Other/ 和 .hidden.md 不进入索引")
+
+    # 测试 5: refresh 发现监听漏掉的删除；重启后解析缓存复用
+    print("\n5. 全量扫描与缓存复用")
+    (root / "02-Notes" / "yolo.md").unlink()
+    vault.refresh(True)
+    assert found(vault, "目标检测") == []
+    vault.cache.close()
+
+    parsed = []
+    def counting_parser(file_path: Path) -> dict:
+        parsed.append(file_path.name)
+        return parse_diary(file_path)
+
+    cache = DiaryCache(root / ".cache" / "cache.sqlite3", counting_parser)
+    vault = VaultIndex(root, cache, ["01-Daily", "02-Notes"], [".*"], "01-Daily")
+    vault.refresh(True)
+    print(f"   重启后重新解析: {parsed}")
+    assert parsed == [] and vault.diary_dates() == ["2026-01-20", "2026-01-22"]
+
+    # 测试 6: 文件监听更新失败时保留变化，稍后重试
+    print("\n6. 文件监听失败重试")
+
+    async def watch_with_failure():
+        watcher = VaultWatcher(vault, debounce=0.05, poll_interval=0.2)
+        task = asyncio.create_task(watcher.run())
+        await asyncio.to_thread(vault.wait_ready)
+
+        calls = []
+        update_paths = vault.update_paths
+        def flaky(paths):
+            calls.append(sorted(paths))
+            if len(calls) == 1:
+                raise OSError("模拟的读取失败")
+            update_paths(paths)
+        vault.update_paths = flaky
+
+        if watcher.mode == "polling":
+            # 轮询模式直接全量扫描，模拟一次失败的批量更新
+            watcher._pending.add(str(daily / "2026-01-23.md"))
+            watcher._schedule_flush()
+        write_note(daily / "2026-01-23.md", "周五", "小程序发版")
+        for _ in range(50):
+            await asyncio.sleep(0.1)
+            if len(calls) >= 2 and "2026-01-23" in vault.diary_dates():
+                break
+        mode = watcher.mode
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        vault.update_paths = update_paths
+        return mode, calls
+
+    mode, calls = asyncio.run(watch_with_failure())
+    print(f"   模式 {mode}，update_paths 调用 {len(calls)} 次")
+    assert len(calls) >= 2 and str(daily / "2026-01-23.md") in calls[1]
+    assert "2026-01-23" in vault.diary_dates()
+    print("   ✓ 第一次失败后变化路径放回待处理集合，重试成功")
+    vault.cache.close()
+finally:
+    shutil.rmtree(root, ignore_errors=True)
+
+print("\n" + "=" * 50)
+print("测试完成！")
+print("=" * 50)
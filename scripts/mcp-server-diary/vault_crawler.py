@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+知识库目录扫描
+多个根目录并行 os.scandir，按忽略规则跳过目录/文件，返回所有 Markdown 笔记的 stat 信息。
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import Iterable
+
+# 默认索引的顶层目录
+DEFAULT_ROOTS = [
+    "01-Daily",
+    "02-Thesis",
+    "03-Projects",
+    "04-Competitions",
+    "05-Tech",
+    "06-Growth",
+    "07-Resources",
+]
+
+# 默认忽略规则（fnmatch 通配符，匹配文件/目录名或相对路径）
+DEFAULT_IGNORE = [
+    ".*",
+    "node_modules",
+    "__pycache__",
+    "Attachments",
+    "Templates",
+]
+
+
+def is_ignored(name: str, rel_path: str, patterns: Iterable[str]) -> bool:
+    """名称或相对路径命中任一忽略规则"""
+    return any(fnmatch(name, p) or fnmatch(rel_path, p) for p in patterns)
+
+
+def _scan_dir(path: str, vault_dir: str, patterns: list[str],
+              suffix: str) -> tuple[dict[str, tuple[int, int]], list[str]]:
+    """扫描单个目录，返回 (文件 stat 信息, 子目录列表)"""
+    files: dict[str, tuple[int, int]] = {}
+    subdirs: list[str] = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                rel_path = os.path.relpath(entry.path, vault_dir).replace(os.sep, "/")
+                if is_ignored(entry.name, rel_path, patterns):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.endswith(suffix) and entry.is_file():
+                        stat = entry.stat()
+                        files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+                except OSError:
+                    continue  # 扫描过程中被删除
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def crawl_vault(vault_dir: Path, roots: Iterable[str] = DEFAULT_ROOTS,
+                ignore: Iterable[str] = DEFAULT_IGNORE, suffix: str = ".md",
+                max_workers: int = 8) -> dict[str, tuple[int, int]]:
+    """并行扫描知识库，返回 {绝对路径: (mtime_ns, size)}"""
+    vault = str(vault_dir)
+    patterns = list(ignore)
+    result: dict[str, tuple[int, int]] = {}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = set()
+        for root in roots:
+            root_path = os.path.join(vault, root)
+            if os.path.isdir(root_path):
+                pending.add(pool.submit(_scan_dir, root_path, vault, patterns, suffix))
+
+        # 每扫完一个目录就把它的子目录继续提交给线程池
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                result.update(files)
+                for subdir in subdirs:
+                    pending.add(pool.submit(_scan_dir, subdir, vault, patterns, suffix))
+
+    return result
+
+
+def list_dirs(vault_dir: Path, roots: Iterable[str] = DEFAULT_ROOTS,
+              ignore: Iterable[str] = DEFAULT_IGNORE) -> list[str]:
+    """列出根目录及其所有未被忽略的子目录（供文件监听使用）"""
+    vault = str(vault_dir)
+    patterns = list(ignore)
+    dirs = []
+
+    for root in roots:
+        root_path = os.path.join(vault, root)
+        if not os.path.isdir(root_path):
+            continue
+        for dirpath, dirnames, _ in os.walk(root_path):
+            dirs.append(dirpath)
+            dirnames[:] = [
+                d for d in dirnames
+                if not is_ignored(d, os.path.relpath(os.path.join(dirpath, d), vault).replace(os.sep, "/"), patterns)
+            ]
+
+    return dirs
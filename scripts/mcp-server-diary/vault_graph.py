@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+知识库链接图
+每篇笔记变化时只解析一次 [[双链]]、指向 .md 的 Markdown 链接和 #标签，存入缓存数据库的
+graph_notes 表（随 DiaryCache 增量维护）。
+
+查询时把链接解析为节点编号，出边和入边都以 CSR 形式存在 array('i') 中：
+    offsets[i]:offsets[i+1] 是节点 i 的邻居在 targets 中的区间
+笔记变化后只标记失效，下次查询时 O(节点 + 边) 重建一次；反链、邻居、孤立笔记查询只读数组。
+
+链接解析规则与 Obsidian 一致：[[路径/名称]] 按路径（可只写末尾几级）匹配，[[名称]] 按文件名匹配，
+重名时优先同目录、其次路径最短的笔记；大小写不敏感。找不到的链接作为"未创建"节点保留，
+便于查看哪些笔记引用了还没写的页面。
+"""
+
+import json
+import posixpath
+import re
+import threading
+from array import array
+from collections import defaultdict, deque
+from typing import Any, Callable, Iterable
+from urllib.parse import unquote
+
+from diary_cache import DiaryCache
+
+# 代码块和行内代码中的内容不算链接/标签
+CODE_RE = re.compile(r'^(```|~~~).*?^\1[^\n]*$|`[^`\n]*`', re.MULTILINE | re.DOTALL)
+# [[目标]]、[[目标|别名]]、[[目标#标题]]、![[目标]]
+WIKILINK_RE = re.compile(r'!?\[\[([^\[\]|#^\n]*)(?:[#^][^\[\]|\n]*)?(?:\|[^\[\]\n]*)?\]\]')
+# [文字](相对路径.md)
+MDLINK_RE = re.compile(r'\[[^\]\n]*\]\(<?([^)\s>]+?\.md)(?:#[^)\s>]*)?>?\)')
+# #标签（# 前不能是字母数字，排除标题 "# " 和网址锚点）
+TAG_RE = re.compile(r'(?<![\w#/&])#([^\s#\[\](){}<>,.;:!?"\'`，。；：！？、（）【】《》]+)')
+# 附件（图片、PDF 等）不是笔记
+ATTACHMENT_RE = re.compile(r'\.[A-Za-z][A-Za-z0-9]{0,4}$')
+
+
+def parse_links(body: str, metadata: dict[str, Any], rel_path: str) -> tuple[list[str], list[str]]:
+    """解析正文中的链接目标和标签（含 frontmatter 的 tags），均去重并保持出现顺序
+
+    链接目标统一为不带 .md 的形式；Markdown 相对链接转为相对知识库根目录的路径。
+    """
+    text = CODE_RE.sub(" ", body)
+    links: dict[str, None] = {}
+
+    for match in WIKILINK_RE.finditer(text):
+        target = match.group(1).strip().replace("\\", "/")
+        if target.lower().endswith(".md"):
+            target = target[:-3]
+        elif ATTACHMENT_RE.search(target):
+            continue
+        if target:
+            links.setdefault(target)
+
+    base = posixpath.dirname(rel_path)
+    for match in MDLINK_RE.finditer(text):
+        target = unquote(match.group(1))
+        if "://" in target:
+            continue
+        if target.startswith("/"):
+            target = target.lstrip("/")  # 相对知识库根目录
+        else:
+            target = posixpath.normpath(posixpath.join(base, target))
+        if not target.startswith(".."):
+            links.setdefault(target[:-3])
+
+    tags: dict[str, None] = {}
+    raw = metadata.get("tags")
+    if isinstance(raw, str):
+        raw = re.split(r'[,\s]+', raw.strip("[]"))
+    for tag in raw or []:
+        tag = str(tag).strip().strip("'\"").lstrip("#")
+        if tag:
+            tags.setdefault(tag)
+    for match in TAG_RE.finditer(text):
+        tag = match.group(1).rstrip("/")
+        if tag and not tag.isdigit():
+            tags.setdefault(tag)
+
+    return list(links), list(tags)
+
+
+class LinkGraph:
+    """graph_notes 表 + 内存中的 CSR 邻接表"""
+
+    def __init__(self, cache: DiaryCache, rel_path: Callable[[str], str],
+                 is_diary: Callable[[str], bool]):
+        self.cache = cache
+        self.rel_path = rel_path
+        self.is_diary = is_diary
+
+        self._lock = threading.Lock()
+        # path -> (链接目标, 标签)
+        self._raw: dict[str, tuple[list[str], list[str]]] = {}
+        self._dirty = True
+
+        # 以下由 _build() 生成：节点 0..n_notes-1 是笔记（按路径排序），之后是未创建的链接目标
+        self._nodes: list[str] = []
+        self._n_notes = 0
+        self._ids: dict[str, int] = {}
+        self._keys: list[str] = []  # 笔记节点的相对路径（不含 .md，小写）
+        self._out_offsets = array("i", [0])
+        self._out_targets = array("i")
+        self._in_offsets = array("i", [0])
+        self._in_sources = array("i")
+        self._by_rel: dict[str, int] = {}
+        self._by_stem: dict[str, list[int]] = {}
+        self._tags: dict[str, array] = {}
+
+        cache.register(self)
+        for path, links, tags in cache.execute("SELECT path, links, tags FROM graph_notes"):
+            self._raw[path] = (json.loads(links), json.loads(tags))
+
+    # ==================== DiaryCache 钩子 ====================
+
+    def create_tables(self, conn):
+        conn.execute(
+            """CREATE TABLE IF NOT EXISTS graph_notes (
+                path TEXT PRIMARY KEY,
+                links TEXT NOT NULL,
+                tags TEXT NOT NULL
+            )"""
+        )
+
+    def missing(self, conn) -> list[str]:
+        rows = conn.execute(
+            "SELECT path FROM diaries WHERE path NOT IN (SELECT path FROM graph_notes)")
+        return [path for (path,) in rows]
+
+    def on_store(self, conn, path: str, diary: dict[str, Any]):
+        links, tags = parse_links(diary["body"], diary["metadata"], self.rel_path(path))
+        conn.execute(
+            "INSERT OR REPLACE INTO graph_notes VALUES (?, ?, ?)",
+            (path, json.dumps(links, ensure_ascii=False), json.dumps(tags, ensure_ascii=False))
+        )
+        with self._lock:
+            self._raw[path] = (links, tags)
+            self._dirty = True
+
+    def on_remove(self, conn, paths: Iterable[str]):
+        paths = list(paths)
+        conn.executemany("DELETE FROM graph_notes WHERE path = ?", [(p,) for p in paths])
+        with self._lock:
+            for path in paths:
+                self._raw.pop(path, None)
+            self._dirty = True
+
+    # ==================== 构建 ====================
+
+    def _resolve_target(self, target: str, source: int) -> int | None:
+        """链接目标 -> 笔记节点编号"""
+        key = target.casefold()
+        if key in self._by_rel:
+            return self._by_rel[key]
+
+        stem = key.rsplit("/", 1)[-1]
+        candidates = self._by_stem.get(stem)
+        if not candidates:
+            return None
+        if "/" in key:
+            # 只写了末尾几级路径
+            candidates = [i for i in candidates if self._rel_key(i).endswith("/" + key)]
+            if not candidates:
+                return None
+        if len(candidates) == 1:
+            return candidates[0]
+
+        folder = posixpath.dirname(self._rel_key(source))
+        same_folder = [i for i in candidates if posixpath.dirname(self._rel_key(i)) == folder]
+        return min(same_folder or candidates, key=lambda i: (len(self._rel_key(i)), i))
+
+    def _rel_key(self, node: int) -> str:
+        return self._keys[node]
+
+    def _build(self):
+        """由 _raw 重建节点表和 CSR 邻接表（持有 _lock 时调用）"""
+        paths = sorted(self._raw)
+        self._nodes = list(paths)
+        self._n_notes = len(paths)
+        self._ids = {path: i for i, path in enumerate(paths)}
+        self._keys = [self.rel_path(path)[:-3].casefold() for path in paths]
+        self._by_rel, self._by_stem = {}, defaultdict(list)
+        for i, key in enumerate(self._keys):
+            self._by_rel[key] = i
+            self._by_stem[key.rsplit("/", 1)[-1]].append(i)
+
+        unresolved: dict[str, int] = {}
+        out_offsets, out_targets = array("i", [0]), array("i")
+        tag_nodes: dict[str, list[int]] = defaultdict(list)
+        for i, path in enumerate(paths):
+            links, tags = self._raw[path]
+            seen = set()
+            for target in links:
+                j = self._resolve_target(target, i)
+                if j is None:
+                    j = unresolved.get(target.casefold())
+                    if j is None:
+                        j = unresolved[target.casefold()] = len(self._nodes)
+                        self._nodes.append(target)
+                if j != i and j not in seen:
+                    seen.add(j)
+                    out_targets.append(j)
+            out_offsets.append(len(out_targets))
+            for tag in tags:
+                tag_nodes[tag.casefold()].append(i)
+
+        # 未创建的节点没有出边
+        total = len(self._nodes)
+        out_offsets.extend([len(out_targets)] * (total - self._n_notes))
+
+        # 入边：按目标计数排序（counting sort），来源天然按编号升序
+        counts = [0] * (total + 1)
+        for j in out_targets:
+            counts[j + 1] += 1
+        for j in range(total):
+            counts[j + 1] += counts[j]
+        in_offsets = array("i", counts)
+        in_sources = array("i", [0]) * len(out_targets)
+        fill = list(counts[:-1])
+        for i in range(total):
+            for k in range(out_offsets[i], out_offsets[i + 1]):
+                j = out_targets[k]
+                in_sources[fill[j]] = i
+                fill[j] += 1
+
+        self._out_offsets, self._out_targets = out_offsets, out_targets
+        self._in_offsets, self._in_sources = in_offsets, in_sources
+        self._tags = {tag: array("i", nodes) for tag, nodes in tag_nodes.items()}
+        self._by_stem = dict(self._by_stem)
+        self._dirty = False
+
+    def _ensure_built(self):
+        if self._dirty:
+            self._build()
+
+    # ==================== 查询 ====================
+
+    def _node_info(self, node: int, **extra) -> dict[str, Any]:
+        """笔记节点：path 为绝对路径；未创建的节点：path 为 None，name 为链接原文"""
+        if node < self._n_notes:
+            path = self._nodes[node]
+            return {"path": path, "name": self.rel_path(path), "exists": True, **extra}
+        return {"path": None, "name": self._nodes[node], "exists": False, **extra}
+
+    def _find(self, name: str) -> int | None:
+        """笔记路径、相对路径、文件名（如日期）或未创建的链接名 -> 节点编号"""
+        if name in self._ids:
+            return self._ids[name]
+        target = name.strip().replace("\\", "/")
+        if target.lower().endswith(".md"):
+            target = target[:-3]
+        key = target.casefold()
+        if key in self._by_rel:
+            return self._by_rel[key]
+        candidates = self._by_stem.get(key.rsplit("/", 1)[-1], [])
+        candidates = [i for i in candidates if "/" not in key or self._rel_key(i).endswith("/" + key)]
+        if candidates:
+            return min(candidates, key=lambda i: (len(self._rel_key(i)), i))
+        for j in range(self._n_notes, len(self._nodes)):
+            if self._nodes[j].casefold() == key:
+                return j
+        return None
+
+    def _out(self, node: int) -> array:
+        return self._out_targets[self._out_offsets[node]:self._out_offsets[node + 1]]
+
+    def _in(self, node: int) -> array:
+        return self._in_sources[self._in_offsets[node]:self._in_offsets[node + 1]]
+
+    def backlinks(self, name: str) -> tuple[dict[str, Any], list[str]] | None:
+        """链接到 name 的笔记路径（按路径排序）；找不到该笔记时返回 None"""
+        with self._lock:
+            self._ensure_built()
+            node = self._find(name)
+            if node is None:
+                return None
+            return self._node_info(node), [self._nodes[i] for i in self._in(node)]
+
+    def tagged(self, tag: str) -> list[str]:
+        """带有 #tag 的笔记路径（含子标签 #tag/xxx）"""
+        key = tag.lstrip("#").casefold()
+        with self._lock:
+            self._ensure_built()
+            nodes = set()
+            for name, members in self._tags.items():
+                if name == key or name.startswith(key + "/"):
+                    nodes.update(members)
+            return [self._nodes[i] for i in sorted(nodes)]
+
+    def neighbors(self, name: str, depth: int = 1,
+                  direction: str = "both") -> tuple[dict[str, Any], list[dict[str, Any]]] | None:
+        """depth 跳以内的笔记，按 (距离, 路径) 排序
+
+        direction 为 out（只沿出链）、in（只沿反链）或 both。
+        """
+        with self._lock:
+            self._ensure_built()
+            start = self._find(name)
+            if start is None:
+                return None
+
+            distance = {start: 0}
+            queue = deque([start])
+            while queue:
+                node = queue.popleft()
+                if distance[node] >= depth:
+                    continue
+                steps = []
+                if direction in ("out", "both"):
+                    steps.append(self._out(node))
+                if direction in ("in", "both"):
+                    steps.append(self._in(node))
+                for step in steps:
+                    for j in step:
+                        if j not in distance:
+                            distance[j] = distance[node] + 1
+                            queue.append(j)
+
+            start_info = self._node_info(start)
+            found = sorted((d, self._nodes[j], j) for j, d in distance.items() if j != start)
+            return start_info, [self._node_info(j, distance=d) for d, _, j in found]
+
+    def orphans(self, include_diaries: bool = False) -> list[str]:
+        """既没有反链、也没有链接到其他笔记的笔记路径（按路径排序）
+
+        只指向未创建页面的笔记也算孤立；日记默认不计入。
+        """
+        with self._lock:
+            self._ensure_built()
+            result = []
+            for i in range(self._n_notes):
+                if self._in_offsets[i] != self._in_offsets[i + 1]:
+                    continue
+                if any(j < self._n_notes for j in self._out(i)):
+                    continue
+                path = self._nodes[i]
+                if include_diaries or not self.is_diary(path):
+                    result.append(path)
+            return result
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+知识库共享索引
+把目录扫描、解析缓存和全文倒排索引组合在一起：
+- notes：路径 -> 解析后的笔记（来自 DiaryCache）
+- text_index：覆盖整个知识库的倒排索引
+- 日记日期表：01-Daily 下 YYYY-MM-DD.md 的日期 -> 路径
+
+查询只读内存结构；refresh() 按间隔节流，避免每次调用都扫描整个知识库。
+文件解析在锁外完成（变化的文件用线程池并行读取），只有把结果写入索引的一步持锁，
+查询不会被重新扫描阻塞。
+有文件监听（vault_watcher）时 watched=True，refresh() 不再主动扫描。
+服务中只有 vault_watcher 在后台线程调用 refresh()/update_paths()，工具调用直接读当前索引，
+首次全量扫描完成前用 wait_ready() 等待。
+"""
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Iterable
+
+from diary_cache import DiaryCache
+from diary_index import InvertedIndex
+from vault_crawler import DEFAULT_IGNORE, DEFAULT_ROOTS, crawl_vault, is_ignored
+
+# 日记文件名：2026-01-21.md
+DATE_RE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+
+class VaultIndex:
+    """知识库笔记的元数据 + 全文索引"""
+
+    def __init__(self, vault_dir: Path, cache: DiaryCache,
+                 roots: Iterable[str] = DEFAULT_ROOTS,
+                 ignore: Iterable[str] = DEFAULT_IGNORE,
+                 diary_root: str = "01-Daily",
+                 refresh_interval: float = 2.0,
+                 parse_workers: int = 4):
+        self.vault_dir = Path(vault_dir)
+        self.cache = cache
+        self.roots = list(roots)
+        self.ignore = list(ignore)
+        self.diary_root = diary_root.strip("/")
+        self.refresh_interval = refresh_interval
+        self.parse_workers = parse_workers
+
+        self.notes: dict[str, dict[str, Any]] = {}
+        self.text_index = InvertedIndex()
+        self._diary_dates: dict[str, str] = {}
+        self._sorted_dates: list[str] | None = None
+
+        self._lock = threading.RLock()
+        # 串行化扫描：并发请求同时触发 refresh 时，后到的等前一个完成后直接复用结果
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = 0.0
+        # 由文件监听负责增量更新时置为 True
+        self.watched = False
+        # 首次全量扫描完成后置位
+        self.ready = threading.Event()
+
+    # ==================== 路径工具 ====================
+
+    def rel_path(self, path: str) -> str:
+        """相对知识库根目录的路径（统一用 /）"""
+        try:
+            return Path(path).relative_to(self.vault_dir).as_posix()
+        except ValueError:
+            return Path(path).as_posix()
+
+    def is_diary(self, path: str) -> bool:
+        """是否为 01-Daily 下的日期日记"""
+        rel = self.rel_path(path)
+        return rel.startswith(self.diary_root + "/") and bool(DATE_RE.match(Path(path).stem))
+
+    def in_diary_root(self, path: str) -> bool:
+        """是否位于 01-Daily 目录（含周复盘、月计划等）"""
+        return self.rel_path(path).startswith(self.diary_root + "/")
+
+    def accepts(self, path: str) -> bool:
+        """路径是否属于索引范围：在某个根目录下、未被忽略的 .md 文件"""
+        if not path.endswith(".md"):
+            return False
+        rel = self.rel_path(path)
+        parts = rel.split("/")
+        if parts[0] not in self.roots:
+            return False
+        return not any(
+            is_ignored(parts[i], "/".join(parts[:i + 1]), self.ignore)
+            for i in range(len(parts))
+        )
+
+    # ==================== 增量更新 ====================
+
+    def refresh(self, force: bool = False):
+        """扫描知识库并增量更新索引；距上次扫描不足 refresh_interval 秒时跳过"""
+        if not force and self.watched:
+            return
+
+        with self._refresh_lock:
+            if not force and time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+
+            stats = crawl_vault(self.vault_dir, self.roots, self.ignore)
+            self._parse_stale(stats)
+
+            # 锁外取解析结果（缓存命中时返回同一个对象，说明内容没变）
+            changed = {}
+            for path, stat in stats.items():
+                note = self.cache.get(Path(path), stat, commit=False)
+                if self.notes.get(path) is not note:
+                    changed[path] = note
+            self.cache.commit()
+
+            with self._lock:
+                for path, note in changed.items():
+                    self._add_note(path, note)
+                for path in set(self.notes) - set(stats):
+                    self._remove_note(path)
+                self._last_refresh = time.monotonic()
+
+            self.cache.prune(stats)
+            self.ready.set()
+
+    def wait_ready(self, cancel: threading.Event | None = None, poll: float = 0.1):
+        """等待首次全量扫描完成；cancel 置位时提前返回"""
+        while not self.ready.wait(poll):
+            if cancel is not None and cancel.is_set():
+                return
+
+    def _parse_stale(self, stats: dict[str, tuple[int, int]]):
+        """用线程池并行读取/解析缓存已失效的文件"""
+        stale = [(path, stat) for path, stat in stats.items() if not self.cache.is_fresh(path, stat)]
+        if len(stale) < 2 or self.parse_workers <= 1:
+            return
+
+        def parse(item):
+            try:
+                self.cache.get(Path(item[0]), item[1], commit=False)
+            except (OSError, UnicodeDecodeError):
+                pass  # 交给后面的串行流程处理
+
+        with ThreadPoolExecutor(max_workers=self.parse_workers) as pool:
+            list(pool.map(parse, stale))
+
+    def update_paths(self, paths: Iterable[str]):
+        """只重新解析指定的文件/目录（供文件监听调用）
+
+        文件存在则更新，不存在则删除；目录存在时扫描其下所有笔记，
+        目录不存在时删除其下所有笔记。
+        """
+        changed: dict[str, dict[str, Any]] = {}
+        removed: set[str] = set()
+
+        for path in paths:
+            if os.path.isdir(path):
+                rel = self.rel_path(path)
+                if rel.split("/")[0] not in self.roots:
+                    continue
+                stats = crawl_vault(self.vault_dir, [rel], self.ignore)
+                self._parse_stale(stats)
+                for file, stat in stats.items():
+                    if self.accepts(file):
+                        changed[file] = self.cache.get(Path(file), stat, commit=False)
+                prefix = path.rstrip(os.sep) + os.sep
+                removed.update(p for p in self.notes if p.startswith(prefix) and p not in stats)
+            elif os.path.isfile(path):
+                if self.accepts(path):
+                    try:
+                        changed[path] = self.cache.get(Path(path), commit=False)
+                    except (OSError, UnicodeDecodeError):
+                        removed.add(path)  # 写入过程中被删除或内容不完整
+            else:
+                prefix = path.rstrip(os.sep) + os.sep
+                removed.add(path)
+                removed.update(p for p in self.notes if p.startswith(prefix))
+        self.cache.commit()
+
+        with self._lock:
+            for path, note in changed.items():
+                if self.notes.get(path) is not note:
+                    self._add_note(path, note)
+            for path in removed - set(changed):
+                self._remove_note(path)
+            live = set(self.notes)
+
+        self.cache.prune(live)
+
+    def _add_note(self, path: str, note: dict[str, Any]):
+        self.notes[path] = note
+        title = note["metadata"].get("title", note["date"])
+        self.text_index.add(path, f"{title}\n{note['body']}")
+        if self.is_diary(path):
+            self._diary_dates[note["date"]] = path
+            self._sorted_dates = None
+
+    def _remove_note(self, path: str):
+        note = self.notes.pop(path, None)
+        self.text_index.remove(path)
+        if note is not None and self._diary_dates.get(note["date"]) == path:
+            del self._diary_dates[note["date"]]
+            self._sorted_dates = None
+
+    # ==================== 查询 ====================
+
+    def diary_dates(self) -> list[str]:
+        """所有日记日期（升序）"""
+        with self._lock:
+            if self._sorted_dates is None:
+                self._sorted_dates = sorted(self._diary_dates)
+            return self._sorted_dates
+
+    def diaries(self, dates: Iterable[str] | None = None) -> list[dict[str, Any]]:
+        """按日期升序返回日记；dates 为空时返回全部"""
+        with self._lock:
+            if dates is None:
+                dates = self.diary_dates()
+            return [self.notes[self._diary_dates[d]] for d in dates if d in self._diary_dates]
+
+    def get_diary(self, date: str) -> dict[str, Any] | None:
+        """按日期获取日记"""
+        with self._lock:
+            path = self._diary_dates.get(date)
+            return self.notes.get(path) if path else None
+
+    def search(self, query: str, scope: str = "daily", limit: int | None = None,
+               after: tuple[float, str] | None = None,
+               min_score: float = 0.0) -> tuple[list[dict[str, Any]], int]:
+        """全文检索，返回 (本页结果, 命中总数)
+
+        scope 为 daily（01-Daily 目录）或 vault（整个知识库）；
+        limit/after/min_score 见 InvertedIndex.search_page。
+        """
+        doc_filter = self.in_diary_root if scope == "daily" else None
+        with self._lock:
+            return self.text_index.search_page(query, limit, after, min_score, doc_filter)
+
+    def hit_note(self, hit: dict[str, Any],
+                 max_snippets: int = 3) -> tuple[dict[str, Any], list[str]] | None:
+        """检索结果对应的笔记和上下文片段；笔记在检索之后已被删除时返回 None"""
+        with self._lock:
+            note = self.notes.get(hit["doc_id"])
+            if note is None:
+                return None
+            return note, self.text_index.snippets(hit["doc_id"], hit["spans"], max_snippets=max_snippets)
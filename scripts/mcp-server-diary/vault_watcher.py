@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+知识库文件监听
+在 MCP 服务的 asyncio 事件循环中运行，文件变化时增量更新 VaultIndex：
+- Linux：inotify（ctypes 调用 libc，无额外依赖），通过 loop.add_reader 接收事件
+- 其他平台或 inotify 不可用：定时轮询（mtime/size 比对）
+- Obsidian 保存时会产生一连串事件，先收集变化路径，安静 debounce 秒后批量处理
+- 解析在线程中完成，只有写入索引的一步持锁，查询不会被阻塞
+- 更新失败时变化路径放回待处理集合，poll_interval 秒后重试
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+from vault_crawler import list_dirs
+from vault_index import VaultIndex
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class _Inotify:
+    """最小化的 inotify 封装"""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        # wd -> 目录路径
+        self.watches: dict[int, str] = {}
+
+    def add_watch(self, path: str) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch 失败: {path}")
+        self.watches[wd] = path
+        return wd
+
+    def read_events(self) -> list[tuple[str, int, str]]:
+        """读取并解析事件，返回 (目录, 掩码, 文件名) 列表"""
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + name_len].rstrip(b"\0"))
+            offset += name_len
+
+            directory = self.watches.get(wd, "")
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+            events.append((directory, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class VaultWatcher:
+    """监听知识库变化并增量更新索引"""
+
+    def __init__(self, vault: VaultIndex, debounce: float = 0.5,
+                 max_delay: float = 3.0, poll_interval: float = 5.0):
+        self.vault = vault
+        self.debounce = debounce
+        self.max_delay = max_delay          # 持续有事件时最多攒这么久就处理一次
+        self.poll_interval = poll_interval
+        self.mode = "stopped"
+
+        self._inotify: _Inotify | None = None
+        self._pending: set[str] = set()
+        self._full_rescan = False
+        self._timer: asyncio.TimerHandle | None = None
+        self._first_pending = 0.0
+        self._flush_lock = asyncio.Lock()
+        self._tasks: set[asyncio.Task] = set()
+
+    async def run(self):
+        """监听主循环，作为后台任务运行直到被取消"""
+        loop = asyncio.get_running_loop()
+
+        if sys.platform.startswith("linux"):
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError, TypeError):
+                self._inotify = None
+
+        try:
+            if self._inotify is not None:
+                self.mode = "inotify"
+                # 先注册监听再全量扫描，避免扫描期间的修改被漏掉
+                await asyncio.to_thread(self._watch_all)
+                loop.add_reader(self._inotify.fd, self._on_readable)
+                self.vault.watched = True
+                self._full_rescan = True
+                await self._flush()
+                await asyncio.Event().wait()
+            else:
+                self.mode = "polling"
+                self.vault.watched = True
+                while True:
+                    # 轮询模式：在线程中全量比对 mtime/size，只解析变化的文件
+                    try:
+                        await asyncio.to_thread(self.vault.refresh, True)
+                    except Exception as e:
+                        print(f"索引更新失败: {e}", file=sys.stderr)
+                    await asyncio.sleep(self.poll_interval)
+        finally:
+            self.vault.watched = False
+            self.mode = "stopped"
+            if self._timer is not None:
+                self._timer.cancel()
+            if self._inotify is not None:
+                loop.remove_reader(self._inotify.fd)
+                self._inotify.close()
+                self._inotify = None
+
+    def _watch_all(self):
+        for directory in list_dirs(self.vault.vault_dir, self.vault.roots, self.vault.ignore):
+            self._watch_dir(directory)
+
+    def _watch_dir(self, directory: str):
+        try:
+            self._inotify.add_watch(directory)
+        except OSError:
+            pass  # 目录已被删除或超出 max_user_watches
+
+    # ==================== 事件处理 ====================
+
+    def _on_readable(self):
+        for directory, mask, name in self._inotify.read_events():
+            if mask & IN_Q_OVERFLOW:
+                # 事件队列溢出，无法知道哪些文件变了，退回全量扫描
+                self._full_rescan = True
+                continue
+            if not directory:
+                continue
+
+            path = os.path.join(directory, name) if name else directory
+            if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                # 新目录：补注册监听（含子目录），并扫描其中已有的笔记
+                for sub in list_dirs(self.vault.vault_dir, [self.vault.rel_path(path)], self.vault.ignore):
+                    self._watch_dir(sub)
+            self._pending.add(path)
+
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        """防抖：安静 debounce 秒后处理；连续有事件时最多等待 max_delay 秒"""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self._timer is None:
+            self._first_pending = now
+        else:
+            self._timer.cancel()
+
+        delay = min(self.debounce, max(0.0, self._first_pending + self.max_delay - now))
+        self._timer = loop.call_later(delay, self._start_flush)
+
+    def _start_flush(self):
+        self._timer = None
+        task = asyncio.ensure_future(self._flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self):
+        async with self._flush_lock:
+            paths, self._pending = self._pending, set()
+            full_rescan, self._full_rescan = self._full_rescan, False
+
+            try:
+                if full_rescan:
+                    await asyncio.to_thread(self.vault.refresh, True)
+                elif paths:
+                    await asyncio.to_thread(self.vault.update_paths, paths)
+            except Exception as e:
+                # stdout 是 MCP 通道，日志写到 stderr
+                print(f"索引更新失败: {e}", file=sys.stderr)
+                # 放回待处理集合（期间新到的事件会合并进来），稍后重试
+                self._pending |= paths
+                self._full_rescan |= full_rescan
+                if self._timer is None:
+                    loop = asyncio.get_running_loop()
+                    self._first_pending = loop.time()
+                    self._timer = loop.call_later(self.poll_interval, self._start_flush)
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Obsidian frontmatter 解析
+diary_server.py、test_server.py 和 sync_diary_to_hexo.py 共用。
+
+只支持 Obsidian 属性面板写出的 YAML 子集，单次遍历、读到结束的 --- 即停止：
+    key: value          值按原样保留为字符串（去掉首尾空白）
+    key:                值为空；紧跟 "- 项" 行时为列表
+      - item
+不处理嵌套映射、多行字符串等完整 YAML 语法。
+
+    metadata, offset = parse_frontmatter(content)   # 正文为 content[offset:]
+    metadata, body = split_frontmatter(content)
+    metadata = read_metadata(path)                   # 只读取文件开头的 frontmatter
+"""
+
+import re
+from pathlib import Path
+from typing import Any
+
+FENCE = "---"
+
+# 结束分隔行（read_metadata 按字节查找）
+_CLOSING_FENCE_RE = re.compile(rb"\n---\r?\n")
+
+
+def parse_frontmatter(content: str) -> tuple[dict[str, Any], int]:
+    """解析 frontmatter，返回 (元数据, 正文起始偏移)
+
+    没有 frontmatter 或缺少结束的 --- 时返回 ({}, 0)，即整个文件都是正文。
+    """
+    if not content.startswith(FENCE):
+        return {}, 0
+
+    length = len(content)
+    end = content.find("\n")
+    if end < 0 or content[:end].rstrip("\r") != FENCE:
+        return {}, 0
+
+    metadata: dict[str, Any] = {}
+    list_key = None  # 值为空的键，后面的 "- 项" 归入它
+    pos = end + 1
+
+    while pos < length:
+        end = content.find("\n", pos)
+        if end < 0:
+            end = length
+        line = content[pos:end].rstrip("\r")
+        pos = end + 1
+
+        if line == FENCE:
+            return metadata, min(pos, length)
+
+        stripped = line.strip()
+        if list_key is not None and stripped.startswith("-"):
+            value = metadata[list_key]
+            if not isinstance(value, list):
+                value = metadata[list_key] = []
+            value.append(stripped[1:].strip())
+        elif ":" in line:
+            key, value = line.split(":", 1)
+            key = key.strip()
+            value = value.strip()
+            metadata[key] = value
+            list_key = key if value == "" else None
+        else:
+            list_key = None
+
+    return {}, 0
+
+
+def split_frontmatter(content: str) -> tuple[dict[str, Any], str]:
+    """解析 frontmatter，返回 (元数据, 正文)"""
+    metadata, offset = parse_frontmatter(content)
+    return metadata, content[offset:]
+
+
+def read_metadata(file_path: Path, chunk_size: int = 512) -> dict[str, Any]:
+    """只读取并解析 frontmatter，不加载正文
+
+    按块读取，找到结束的 --- 就停止；日记的 frontmatter 通常一块就能读完。
+    """
+    with open(file_path, "rb") as f:
+        data = f.read(chunk_size)
+        if not data.startswith(FENCE.encode()):
+            return {}
+
+        search_from = 0
+        while True:
+            match = _CLOSING_FENCE_RE.search(data, search_from)
+            if match:
+                data = data[:match.end()]
+                break
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break  # 读到文件末尾（结束行后没有换行，或没有结束行）
+            # 分隔行可能被块边界截断，从上一块末尾附近继续找
+            search_from = max(0, len(data) - 5)
+            data += chunk
+
+    return parse_frontmatter(data.decode("utf-8"))[0]
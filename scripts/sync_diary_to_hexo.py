@@ -7,10 +7,34 @@
     python sync_diary_to_hexo.py              # 同步今天
     python sync_diary_to_hexo.py --all        # 同步所有
     python sync_diary_to_hexo.py --date 2026-01-21  # 指定日期
+    python sync_diary_to_hexo.py --all --force      # 忽略清单，全部重新生成
+    python sync_diary_to_hexo.py --all --jobs 8     # 8 个线程并行转换
+    python sync_diary_to_hexo.py --all --report timing.json  # 输出逐篇耗时
+
+增量同步：
+    清单文件 .cache/hexo_sync_manifest.json 记录每篇日记的源文件哈希和输出哈希，
+    源文件和已生成的文章都没变时跳过，不改动 Hexo 文件的 mtime；
+    --all 时源文件已删除的日记，其生成的文章也会被删除。
+
+批量同步：
+    --all 扫描 01-Daily 下所有月份文件夹中的 YYYY-MM-DD.md，--jobs N 时用线程池并行转换；
+    文章先写入同目录的临时文件再重命名，中断时不会留下写了一半的文章。
+    单篇失败只记入报告，清单总会保存；不同文件夹中的同名日记会写到同一篇文章，
+    只同步月份文件夹中的那篇，其余报告为失败。
+
+附件：
+    日记中的 ![[图片.png]] 从 Attachments/ 中查找，按内容哈希复制到 Hexo 的 images/diary/
+    并改写为 Markdown 图片链接；安装了 Pillow 时生成缩放后的 WebP（见 hexo_assets.py）。
 """
 
+import hashlib
+import json
 import os
 import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 import argparse
@@ -18,6 +42,9 @@ import argparse
 # 路径配置（自动检测 WSL/Windows）
 import platform
 
+from hexo_assets import AssetPipeline
+from obsidian_frontmatter import split_frontmatter
+
 # WSL 路径映射
 def get_real_path(windows_path: str) -> Path:
     """将 Windows 路径转换为 WSL 路径"""
@@ -34,44 +61,30 @@ def get_real_path(windows_path: str) -> Path:
         return Path(path)
     return Path(windows_path)
 
-OBSIDIAN_DIARY_WIN = r"E:\000\knowledge\01-Daily\2026-02"
+OBSIDIAN_DAILY_WIN = r"E:\000\knowledge\01-Daily"  # 其下按月份分文件夹（2026-01、2026-02 ...）
 HEXO_DIARY_WIN = r"E:\000\Hexo\source\_posts\日记"
+OBSIDIAN_VAULT_WIN = r"E:\000\knowledge"
+ATTACHMENTS_WIN = r"E:\000\knowledge\Attachments"
+HEXO_ASSET_WIN = r"E:\000\Hexo\source\images\diary"
+HEXO_ASSET_URL = "/images/diary/"
 
-OBSIDIAN_DIARY_DIR = get_real_path(OBSIDIAN_DIARY_WIN)
+OBSIDIAN_DAILY_DIR = get_real_path(OBSIDIAN_DAILY_WIN)
 HEXO_DIARY_DIR = get_real_path(HEXO_DIARY_WIN)
+OBSIDIAN_VAULT_DIR = get_real_path(OBSIDIAN_VAULT_WIN)
+ATTACHMENTS_DIR = get_real_path(ATTACHMENTS_WIN)
+HEXO_ASSET_DIR = get_real_path(HEXO_ASSET_WIN)
+
+# 日记文件名：2026-01-21.md（排除周复盘、月计划等）
+DIARY_NAME_RE = re.compile(r'^\d{4}-\d{2}-\d{2}\.md$')
+
+# 增量同步清单
+MANIFEST_PATH = Path(__file__).resolve().parent / ".cache" / "hexo_sync_manifest.json"
+# 转换规则变化时递增，已同步的日记会全部重新生成
+CONVERTER_VERSION = 4
 
-def parse_obsidian_frontmatter(content: str) -> dict:
-    """解析 Obsidian YAML frontmatter"""
-    lines = content.split('\n')
-    metadata = {}
-    body_start = 0
-
-    if lines[0] == '---':
-        for i, line in enumerate(lines[1:], 1):
-            if line == '---':
-                body_start = i + 1
-                break
-            # 解析 key: value 格式
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip()
-                value = value.strip()
-                # 处理列表格式 (tags: \n  - 日记)
-                if value == '' and i + 1 < len(lines) and lines[i + 1].strip().startswith('-'):
-                    # 这是一个列表
-                    list_values = []
-                    j = i + 1
-                    while j < len(lines) and not lines[j].startswith('---') and lines[j].strip().startswith('-'):
-                        list_values.append(lines[j].strip()[2:].strip())
-                        j += 1
-                    metadata[key] = list_values
-                else:
-                    metadata[key] = value
-
-    # 提取正文
-    body = '\n'.join(lines[body_start:])
-
-    return metadata, body
+def parse_obsidian_frontmatter(content: str) -> tuple[dict, str]:
+    """解析 Obsidian YAML frontmatter，返回 (元数据, 正文)"""
+    return split_frontmatter(content)
 
 def convert_to_hexo_frontmatter(metadata: dict, body: str, date_str: str) -> str:
     """转换为 Hexo frontmatter 格式"""
@@ -107,13 +120,135 @@ cover: {cover}"""
 
     return hexo_fm + body
 
-def sync_diary(diary_path: Path, hexo_dir: Path):
-    """同步单篇日记"""
+def file_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def atomic_write(path: Path, data: bytes):
+    """先写同目录临时文件再重命名，读者只会看到旧文件或完整的新文件"""
+    # 点开头的临时文件 Hexo 不会处理
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)  # mkstemp 创建的文件是 0600
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def find_diaries(daily_dir: Path) -> list[Path]:
+    """所有月份文件夹下的日期日记，按日期排序"""
+    diaries = [p for p in daily_dir.rglob("*.md") if DIARY_NAME_RE.match(p.name)]
+    return sorted(diaries, key=lambda p: p.name)
+
+def split_duplicates(diaries: list[Path], daily_dir: Path) -> tuple[list[Path], list[tuple[Path, Path]]]:
+    """同名日记会写到同一篇文章：每个文件名只保留一篇（优先月份文件夹中的），
+    返回 (保留的日记, [(被跳过的日记, 保留的日记)...])"""
+    by_name: dict[str, list[Path]] = {}
+    for diary in diaries:
+        by_name.setdefault(diary.name, []).append(diary)
+
+    kept, skipped = [], []
+    for name, paths in by_name.items():
+        preferred = daily_dir / name[:7] / name
+        keep = preferred if preferred in paths else sorted(paths)[0]
+        kept.append(keep)
+        skipped.extend((p, keep) for p in sorted(paths) if p != keep)
+    return kept, skipped
+
+def find_diary(daily_dir: Path, date_str: str) -> Path:
+    """按日期定位日记：先找月份文件夹，再在整个 01-Daily 下查找"""
+    diary_path = daily_dir / date_str[:7] / f"{date_str}.md"
+    if diary_path.exists():
+        return diary_path
+    return next(daily_dir.rglob(f"{date_str}.md"), diary_path)
+
+class SyncManifest:
+    """增量同步清单：日记文件名 -> {source: 源文件哈希, output: 输出哈希}
+
+    assets 为附件哈希缓存：绝对路径 -> [mtime_ns, size, sha256]
+    """
+
+    def __init__(self, path: Path, hexo_dir: Path, force: bool = False):
+        self.path = path
+        self.hexo_dir = Path(hexo_dir)
+        self.force = force  # 为 True 时所有日记都视为已变化（清单仍用于清理）
+        self.entries: dict[str, dict[str, str]] = {}
+        self.assets: dict[str, list] = {}
+        self._lock = threading.Lock()  # 并行同步时多个线程同时记录
+
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                data = {}
+            # 输出目录或转换规则变了，旧清单作废
+            if data.get("version") == CONVERTER_VERSION and data.get("hexo_dir") == str(self.hexo_dir):
+                self.entries = data.get("entries", {})
+                self.assets = data.get("assets", {})
+
+    def is_current(self, name: str, source_hash: str) -> bool:
+        """源文件没变，且生成的文章仍是上次写入的内容"""
+        entry = self.entries.get(name)
+        if self.force or entry is None or entry["source"] != source_hash:
+            return False
+        try:
+            return file_hash((self.hexo_dir / name).read_bytes()) == entry["output"]
+        except OSError:
+            return False
+
+    def record(self, name: str, source_hash: str, output_hash: str):
+        with self._lock:
+            self.entries[name] = {"source": source_hash, "output": output_hash}
+
+    def prune(self, live_names: set[str]) -> list[str]:
+        """删除源文件已不存在的日记对应的文章，返回被删除的文件名"""
+        removed = []
+        for name in sorted(set(self.entries) - live_names):
+            entry = self.entries.pop(name)
+            output_path = self.hexo_dir / name
+            try:
+                # 文章在 Hexo 侧被手动改过时保留，只从清单中移除
+                if file_hash(output_path.read_bytes()) == entry["output"]:
+                    output_path.unlink()
+                    removed.append(name)
+            except OSError:
+                pass
+        return removed
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": CONVERTER_VERSION, "hexo_dir": str(self.hexo_dir),
+                "entries": self.entries, "assets": self.assets}
+        atomic_write(self.path, json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8'))
+
+def new_asset_pipeline(manifest: SyncManifest) -> AssetPipeline:
+    return AssetPipeline(OBSIDIAN_VAULT_DIR, ATTACHMENTS_DIR, HEXO_ASSET_DIR, HEXO_ASSET_URL, manifest.assets)
+
+def sync_diary(diary_path: Path, hexo_dir: Path, manifest: SyncManifest | None = None,
+               assets: AssetPipeline | None = None) -> str:
+    """同步单篇日记，返回 created / updated / unchanged"""
     # 读取内容
-    content = diary_path.read_text(encoding='utf-8')
+    raw = diary_path.read_bytes()
+    filename = diary_path.name  # 保持原文件名，如 2026-01-21.md
+
+    # 解析 Obsidian 格式（换行统一为 \n，与 read_text 的行为一致）
+    text = raw.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+    metadata, body = parse_obsidian_frontmatter(text)
 
-    # 解析 Obsidian 格式
-    metadata, body = parse_obsidian_frontmatter(content)
+    # 附件嵌入改写为 Hexo 链接；引用的附件内容变了，文章也要重新生成
+    outputs = []
+    if assets is not None:
+        body, outputs = assets.rewrite(body)
+    source_hash = file_hash(raw + "\n".join(outputs).encode('utf-8'))
+
+    if manifest is not None and manifest.is_current(filename, source_hash):
+        return "unchanged"
 
     # 解析日期
     date_match = re.search(r'(\d{4}-\d{2}-\d{2})', diary_path.stem)
@@ -125,67 +260,178 @@ def sync_diary(diary_path: Path, hexo_dir: Path):
     # 转换为 Hexo 格式
     hexo_content = convert_to_hexo_frontmatter(metadata, body, date_str)
 
-    # 写入 Hexo 目录（文件名保持不变）
-    filename = diary_path.name  # 保持原文件名，如 2026-01-21.md
+    # 写入 Hexo 目录（文件名保持不变）；内容相同时不重写，保留 mtime
     output_path = hexo_dir / filename
-    output_path.write_text(hexo_content, encoding='utf-8')
-
-    print(f"  ✓ {date_str} → {output_path.name}")
-
-def sync_all():
-    """同步所有日记"""
-    obsidian_dir = Path(OBSIDIAN_DIARY_DIR)
+    output = hexo_content.encode('utf-8')
+    try:
+        existing = output_path.read_bytes()
+    except OSError:
+        existing = None
+
+    if existing == output:
+        status = "unchanged"
+    else:
+        atomic_write(output_path, output)
+        status = "created" if existing is None else "updated"
+
+    if manifest is not None:
+        manifest.record(filename, source_hash, file_hash(output))
+    return status
+
+def timed_sync(diary_path: Path, hexo_dir: Path, manifest: SyncManifest,
+               assets: AssetPipeline) -> dict:
+    """同步单篇日记并计时（供线程池调用），异常记录在结果中"""
+    start = time.perf_counter()
+    try:
+        status, error = sync_diary(diary_path, hexo_dir, manifest, assets), None
+    except Exception as e:
+        # 单篇失败（包括附件处理中的意外错误）不影响其他日记
+        status, error = "failed", f"{type(e).__name__}: {e}"
+    return {
+        "file": diary_path.name,
+        "status": status,
+        "seconds": time.perf_counter() - start,
+        "error": error
+    }
+
+def print_report(results: list[dict], wall_seconds: float, jobs: int, top: int = 10):
+    """汇总耗时：总耗时、逐篇累计耗时和最慢的几篇"""
+    busy = sum(r["seconds"] for r in results)
+    print(f"\n⏱ 总耗时 {wall_seconds:.2f}s（{jobs} 个线程，逐篇累计 {busy:.2f}s）")
+    slowest = sorted(results, key=lambda r: r["seconds"], reverse=True)[:top]
+    if slowest:
+        print(f"   最慢的 {len(slowest)} 篇：")
+        for r in slowest:
+            print(f"   {r['seconds'] * 1000:8.1f} ms  {r['status']:<9}  {r['file']}")
+
+def sync_all(force: bool = False, jobs: int = 1, report_path: Path | None = None):
+    """同步所有日记（增量：只转换有变化的日记，并清理已删除日记的文章）"""
+    daily_dir = Path(OBSIDIAN_DAILY_DIR)
     hexo_dir = Path(HEXO_DIARY_DIR)
 
     hexo_dir.mkdir(parents=True, exist_ok=True)
+    manifest = SyncManifest(MANIFEST_PATH, hexo_dir, force)
 
     # 只同步日期格式的日记，排除周复盘等
-    diaries = sorted(obsidian_dir.glob("2026-01-*.md"))
+    diaries = find_diaries(daily_dir)
+    unique, duplicates = split_duplicates(diaries, daily_dir)
     print(f"找到 {len(diaries)} 篇日记，开始同步...\n")
 
-    for diary in diaries:
-        sync_diary(diary, hexo_dir)
+    start = time.perf_counter()
+    assets = new_asset_pipeline(manifest)
+    results = [{"file": path.name, "status": "failed", "seconds": 0.0,
+                "error": f"与 {kept} 同名，输出文件冲突，已跳过 {path}"}
+               for path, kept in duplicates]
+    removed = []
+    try:
+        if jobs > 1:
+            with ThreadPoolExecutor(max_workers=jobs) as pool:
+                results += pool.map(lambda d: timed_sync(d, hexo_dir, manifest, assets), unique)
+        else:
+            results += [timed_sync(d, hexo_dir, manifest, assets) for d in unique]
+        asset_counts = sync_assets(assets, jobs)
+
+        # 读取失败的日记不算删除，保留它们的文章；
+        # 旧版本按 2026-01-*.md 同步过的周复盘等文章也不在这里删除
+        live = {diary.name for diary in diaries}
+        live.update(name for name in manifest.entries if not DIARY_NAME_RE.match(name))
+        removed = manifest.prune(live)
+    finally:
+        # 中途出错或被中断时，已完成的日记也记入清单
+        manifest.save()
+
+    counts = {"created": 0, "updated": 0, "unchanged": 0, "failed": 0}
+    for r in results:
+        counts[r["status"]] += 1
+        if r["status"] in ("created", "updated"):
+            print(f"  ✓ {r['file']}")
+        elif r["status"] == "failed":
+            print(f"  ❌ {r['file']}: {r['error']}")
+    for name in removed:
+        print(f"  ✗ {name}（源日记已删除）")
+    wall_seconds = time.perf_counter() - start
+
+    print(f"\n✅ 同步完成！共 {len(diaries)} 篇："
+          f"新增 {counts['created']}，更新 {counts['updated']}，"
+          f"未变化 {counts['unchanged']}，删除 {len(removed)}"
+          + (f"，失败 {counts['failed']}" if counts['failed'] else ""))
+    if assets.pending:
+        print(f"   附件：生成 {asset_counts['generated']}，已存在 {asset_counts['cached']}"
+              + (f"，失败 {asset_counts['failed']}" if asset_counts['failed'] else ""))
+    print_report(results, wall_seconds, jobs)
+
+    if report_path is not None:
+        report = {
+            "jobs": jobs,
+            "wall_seconds": wall_seconds,
+            "counts": counts,
+            "removed": removed,
+            "assets": asset_counts,
+            "files": results
+        }
+        Path(report_path).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"   逐篇耗时已写入 {report_path}")
+
+def sync_assets(assets: AssetPipeline, jobs: int = 1) -> dict[str, int]:
+    """生成日记引用的附件，并提示找不到的嵌入"""
+    for target in sorted(assets.missing):
+        print(f"  ⚠ 找不到附件: {target}")
+    if not assets.pending:
+        return {"generated": 0, "cached": 0, "failed": 0}
+    return assets.process(jobs)
+
+def sync_single(diary_path: Path, force: bool = False):
+    """同步单篇日记并更新清单"""
+    hexo_dir = Path(HEXO_DIARY_DIR)
+    hexo_dir.mkdir(parents=True, exist_ok=True)
 
-    print(f"\n✅ 同步完成！共 {len(diaries)} 篇")
+    manifest = SyncManifest(MANIFEST_PATH, hexo_dir, force)
+    assets = new_asset_pipeline(manifest)
+    try:
+        status = sync_diary(diary_path, hexo_dir, manifest, assets)
+        sync_assets(assets)
+    finally:
+        manifest.save()
+    if status == "unchanged":
+        print(f"  - {diary_path.stem} 未变化，跳过")
+    else:
+        print(f"  ✓ {diary_path.stem} → {diary_path.name}")
 
-def sync_today():
+def sync_today(force: bool = False):
     """同步今天的日记"""
     today = datetime.now().strftime("%Y-%m-%d")
-    diary_path = Path(OBSIDIAN_DIARY_DIR) / f"{today}.md"
+    diary_path = find_diary(Path(OBSIDIAN_DAILY_DIR), today)
 
     if not diary_path.exists():
         print(f"❌ 今天的日记不存在: {diary_path}")
         return
 
-    hexo_dir = Path(HEXO_DIARY_DIR)
-    hexo_dir.mkdir(parents=True, exist_ok=True)
-
-    sync_diary(diary_path, hexo_dir)
+    sync_single(diary_path, force)
     print("\n✅ 今日日记同步完成！")
 
-def sync_date(date_str: str):
+def sync_date(date_str: str, force: bool = False):
     """同步指定日期的日记"""
-    diary_path = Path(OBSIDIAN_DIARY_DIR) / f"{date_str}.md"
+    diary_path = find_diary(Path(OBSIDIAN_DAILY_DIR), date_str)
 
     if not diary_path.exists():
         print(f"❌ 日记不存在: {diary_path}")
         return
 
-    hexo_dir = Path(HEXO_DIARY_DIR)
-    hexo_dir.mkdir(parents=True, exist_ok=True)
-
-    sync_diary(diary_path, hexo_dir)
+    sync_single(diary_path, force)
     print("\n✅ 指定日记同步完成！")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='同步日记到 Hexo')
     parser.add_argument('--all', action='store_true', help='同步所有日记')
     parser.add_argument('--date', type=str, help='指定日期 (YYYY-MM-DD)')
+    parser.add_argument('--force', action='store_true', help='忽略增量清单，全部重新生成')
+    parser.add_argument('--jobs', type=int, default=1, help='--all 时并行转换的线程数')
+    parser.add_argument('--report', type=Path, help='--all 时把逐篇耗时写入 JSON 文件')
     args = parser.parse_args()
 
     if args.all:
-        sync_all()
+        sync_all(args.force, max(1, args.jobs), args.report)
     elif args.date:
-        sync_date(args.date)
+        sync_date(args.date, args.force)
     else:
-        sync_today()
+        sync_today(args.force)
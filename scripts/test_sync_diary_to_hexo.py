@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+测试日记到 Hexo 的增量同步
+在临时目录中构造 01-Daily 和 Hexo 目录，检查清单命中时不改动文章、源日记删除后清理文章，
+以及单篇失败、CRLF 换行、同名日记和附件嵌入的处理
+
+运行：
+    python test_sync_diary_to_hexo.py
+"""
+
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+import sync_diary_to_hexo as sync
+
+def write_diary(path: Path, title: str, body: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"---\ntitle: {title}\ntags:\n  - 日记\n---\n{body}\n", encoding='utf-8')
+
+def run_sync(root: Path, **kwargs) -> dict:
+    """同步一次，返回 --report 写出的报告"""
+    report = root / "report.json"
+    sync.sync_all(report_path=report, **kwargs)
+    return json.loads(report.read_text(encoding='utf-8'))
+
+def mtimes(directory: Path) -> dict[str, int]:
+    return {p.name: p.stat().st_mtime_ns for p in directory.glob("*.md")}
+
+root = Path(tempfile.mkdtemp(prefix="hexo-sync-test-"))
+# 指向临时目录，不碰真实的知识库、Hexo 和清单
+sync.OBSIDIAN_DAILY_DIR = root / "knowledge" / "01-Daily"
+sync.OBSIDIAN_VAULT_DIR = root / "knowledge"
+sync.ATTACHMENTS_DIR = root / "knowledge" / "Attachments"
+sync.HEXO_DIARY_DIR = root / "hexo" / "日记"
+sync.HEXO_ASSET_DIR = root / "hexo" / "images"
+sync.MANIFEST_PATH = root / "manifest.json"
+daily, hexo = sync.OBSIDIAN_DAILY_DIR, sync.HEXO_DIARY_DIR
+
+print("=" * 50)
+print("Hexo 增量同步测试")
+print("=" * 50)
+
+try:
+    write_diary(daily / "2026-01" / "2026-01-20.md", "周二", "写小程序")
+    write_diary(daily / "2026-01" / "2026-01-21.md", "周三", "改小论文")
+    write_diary(daily / "2026-01" / "周复盘.md", "周复盘", "不是日期日记")
+
+    # 测试 1: 首次同步
+    print("\n1. 首次同步")
+    report = run_sync(root)
+    assert report["counts"] == {"created": 2, "updated": 0, "unchanged": 0, "failed": 0}
+    assert sorted(p.name for p in hexo.glob("*.md")) == ["2026-01-20.md", "2026-01-21.md"]
+    post = (hexo / "2026-01-20.md").read_text(encoding='utf-8')
+    assert post.startswith("---\ntitle: 周二\ntags: 日记\n") and post.endswith("写小程序\n")
+
+    # 测试 2: 什么都没变时不重写文章
+    print("\n2. 无变化")
+    before = mtimes(hexo)
+    report = run_sync(root, jobs=4)
+    assert report["counts"]["unchanged"] == 2 and report["counts"]["created"] == 0
+    assert mtimes(hexo) == before
+    print("   ✓ 全部跳过，文章 mtime 不变")
+
+    # 测试 3: 修改源日记、或文章在 Hexo 侧丢失时重新生成
+    print("\n3. 修改与补写")
+    write_diary(daily / "2026-01" / "2026-01-20.md", "周二", "写知识库")
+    (hexo / "2026-01-21.md").unlink()
+    report = run_sync(root)
+    assert report["counts"] == {"created": 1, "updated": 1, "unchanged": 0, "failed": 0}
+    assert "写知识库" in (hexo / "2026-01-20.md").read_text(encoding='utf-8')
+
+    # 测试 4: 源日记删除后清理文章；Hexo 侧手动改过的文章保留
+    print("\n4. 清理")
+    write_diary(daily / "2026-01" / "2026-01-22.md", "周四", "开会")
+    run_sync(root)
+    with open(hexo / "2026-01-22.md", "a", encoding='utf-8') as f:
+        f.write("\n手动补充\n")
+    (daily / "2026-01" / "2026-01-21.md").unlink()
+    (daily / "2026-01" / "2026-01-22.md").unlink()
+    report = run_sync(root)
+    print(f"   删除: {report['removed']}")
+    assert report["removed"] == ["2026-01-21.md"]
+    assert not (hexo / "2026-01-21.md").exists() and (hexo / "2026-01-22.md").exists()
+    manifest = json.loads(sync.MANIFEST_PATH.read_text(encoding='utf-8'))
+    assert sorted(manifest["entries"]) == ["2026-01-20.md"]
+
+    # 测试 5: --force 忽略清单，但内容相同的文章仍不重写
+    print("\n5. --force")
+    before = mtimes(hexo)
+    report = run_sync(root, force=True)
+    assert report["counts"]["unchanged"] == 1 and mtimes(hexo) == before
+
+    # 测试 6: 单篇失败不影响其他日记，清单照常保存
+    print("\n6. 单篇失败")
+    (daily / "2026-01" / "2026-01-23.md").write_bytes(b"\xff\xfe not utf-8")
+    write_diary(daily / "2026-01" / "2026-01-24.md", "周六", "休息")
+    real_convert = sync.convert_to_hexo_frontmatter
+    def broken_convert(metadata, body, date_str):
+        if date_str == "2026-01-24":
+            raise KeyError("模拟的转换错误")
+        return real_convert(metadata, body, date_str)
+    sync.convert_to_hexo_frontmatter = broken_convert
+    try:
+        report = run_sync(root, jobs=2)
+    finally:
+        sync.convert_to_hexo_frontmatter = real_convert
+    errors = {f["file"]: f["error"] for f in report["files"] if f["status"] == "failed"}
+    print(f"   {errors}")
+    assert set(errors) == {"2026-01-23.md", "2026-01-24.md"}
+    assert errors["2026-01-24.md"].startswith("KeyError")
+    manifest = json.loads(sync.MANIFEST_PATH.read_text(encoding='utf-8'))
+    assert "2026-01-20.md" in manifest["entries"] and "2026-01-24.md" not in manifest["entries"]
+    (daily / "2026-01" / "2026-01-23.md").unlink()
+
+    # 测试 7: CRLF 换行统一为 LF
+    print("\n7. CRLF")
+    (daily / "2026-01" / "2026-01-24.md").write_bytes(
+        "---\r\ntitle: 周六\r\n---\r\n第一行\r\n第二行\r\n".encode('utf-8'))
+    run_sync(root)
+    post = (hexo / "2026-01-24.md").read_bytes()
+    assert b"\r" not in post and post.endswith("第一行\n第二行\n".encode('utf-8'))
+    assert "title: 周六\n".encode('utf-8') in post
+
+    # 测试 8: 不同文件夹中的同名日记只同步月份文件夹中的那篇
+    print("\n8. 同名日记")
+    write_diary(daily / "归档" / "2026-01-20.md", "旧版", "归档内容")
+    report = run_sync(root)
+    clashes = [f for f in report["files"] if f["status"] == "failed"]
+    print(f"   {clashes[0]['error']}")
+    assert len(clashes) == 1 and "归档" in clashes[0]["error"]
+    assert "写知识库" in (hexo / "2026-01-20.md").read_text(encoding='utf-8')
+    (daily / "归档" / "2026-01-20.md").unlink()
+
+    # 测试 9: GIF/SVG 作为图片按哈希复制，笔记嵌入不算缺失的附件
+    print("\n9. 附件")
+    sync.ATTACHMENTS_DIR.mkdir(parents=True)
+    (sync.ATTACHMENTS_DIR / "动图.gif").write_bytes(b"GIF89a")
+    (sync.ATTACHMENTS_DIR / "图标.svg").write_text("<svg/>", encoding='utf-8')
+    write_diary(daily / "2026-01" / "2026-01-25.md", "周日",
+                "![[动图.gif|300]]\n![[图标.svg]]\n![[某篇笔记]]\n![[丢失.png]]")
+    report = run_sync(root)
+    post = (hexo / "2026-01-25.md").read_text(encoding='utf-8')
+    print(f"   {post.split('---')[-1].strip()}")
+    assert "![动图](/images/diary/" in post and "![图标](/images/diary/" in post
+    assert "![[某篇笔记]]" in post and "![[丢失.png]]" in post
+    copied = sorted(p.suffix for p in sync.HEXO_ASSET_DIR.iterdir())
+    assert copied == [".gif", ".svg"] and report["assets"]["generated"] == 2
+finally:
+    shutil.rmtree(root, ignore_errors=True)
+
+print("\n" + "=" * 50)
+print("测试完成！")
+print("=" * 50)